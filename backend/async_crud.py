@@ -0,0 +1,230 @@
+"""
+Async counterparts of the crud functions used on the hot request paths.
+
+Each function runs the same statement builder as its crud twin on an
+AsyncSession, so the two paths cannot drift apart. Everything a response
+serializes must be eagerly loaded: lazy loads are not possible under
+AsyncSession.
+"""
+
+from datetime import date, datetime
+from typing import Optional
+
+from sqlalchemy import tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import crud, models, hierarchy, rollups, schemas, search, stats, principals, query_cache, sync, versions
+from database import AsyncSessionLocal
+from tag_registry import tag_registry
+
+
+async def get_user_by_email(db: AsyncSession, email: str):
+    return (await db.scalars(crud.user_by_email_query(email))).first()
+
+async def create_user(db: AsyncSession, user: schemas.UserCreate, hashed_password: str):
+    db_user = models.User(
+        email=user.email,
+        name=user.name,
+        hashed_password=hashed_password,
+        role=user.role,
+        manager_id=user.manager_id
+    )
+    db.add(db_user)
+    await db.flush()
+    await db.run_sync(hierarchy.add_user, db_user.id, user.manager_id)
+    if user.manager_id:
+        await db.run_sync(versions.bump, versions.team(user.manager_id))
+    await db.commit()
+    await db.refresh(db_user)
+    principals.invalidate(db_user.email)
+    query_cache.invalidate(*crud.user_listing_tags(db_user))
+    return db_user
+
+async def update_user_password(db: AsyncSession, user: models.User, hashed_password: str):
+    user.hashed_password = hashed_password
+    await db.commit()
+    principals.invalidate(user.email)
+    return user
+
+# Listings below are served from query_cache as response models, so a hit needs no session
+async def get_team_members(db: AsyncSession, manager_id: str, version: Optional[int] = None):
+    """With the team `version` an ETag was built from, the cached list is keyed by it, so a
+    worker whose copy has not been invalidated yet can never send it under a newer ETag"""
+    async def load():
+        users = (await db.scalars(crud.team_members_query(manager_id))).all()
+        return [schemas.UserOut.model_validate(user, from_attributes=True) for user in users]
+    key = f"team_members:{manager_id}" if version is None else f"team_members:{manager_id}@{version}"
+    return await query_cache.get_or_load(key, [query_cache.team(manager_id)], load)
+
+async def get_org_members(db: AsyncSession, manager_id: str):
+    """Employees anywhere below the manager; not cached, since any reassignment in the subtree changes it"""
+    users = (await db.scalars(hierarchy.subtree_members_query(manager_id))).all()
+    return [schemas.UserOut.model_validate(user, from_attributes=True) for user in users]
+
+async def get_subtree_ids(db: AsyncSession, manager_id: str) -> set:
+    return set(await db.scalars(hierarchy.subtree_query(manager_id)))
+
+async def get_available_employees(db: AsyncSession):
+    async def load():
+        users = (await db.scalars(crud.available_employees_query())).all()
+        return [schemas.UserOut.model_validate(user, from_attributes=True) for user in users]
+    return await query_cache.get_or_load("available_employees", [query_cache.AVAILABLE], load)
+
+async def get_open_feedback_requests(db: AsyncSession, manager_id: str):
+    async def load():
+        requests = (await db.scalars(crud.open_feedback_requests_query(manager_id))).all()
+        return [schemas.FeedbackRequestOut.model_validate(request, from_attributes=True) for request in requests]
+    return await query_cache.get_or_load(
+        f"open_requests:{manager_id}", [query_cache.open_requests(manager_id)], load
+    )
+
+async def get_feedback_timeline(
+    db: AsyncSession,
+    manager_id: Optional[str] = None,
+    employee_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    fields: Optional[list[str]] = None,
+    include_subtree: bool = False
+):
+    """See crud.get_feedback_timeline. Returns (items, next_cursor)."""
+    stmt = crud.feedback_timeline_query(db, manager_id, employee_id, cursor, limit, fields, include_subtree)
+    return crud.paginate_timeline((await db.execute(stmt)).all(), limit)
+
+async def get_feedback_timeline_rows(
+    db: AsyncSession,
+    manager_id: Optional[str] = None,
+    employee_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    include_subtree: bool = False
+):
+    """See crud.get_feedback_timeline_rows. Returns (items, next_cursor)."""
+    stmt = crud.feedback_timeline_rows_query(db, manager_id, employee_id, cursor, limit, include_subtree)
+    rows, next_cursor = crud.paginate_rows((await db.execute(stmt)).all(), limit, lambda row: row.id)
+    ids = [row.id for row in rows]
+    tag_rows = []
+    for chunk in crud.id_chunks(ids):
+        tag_rows.extend((await db.execute(crud.feedback_tags_query(chunk))).all())
+    return crud.feedback_out_dicts(rows, tag_rows), next_cursor
+
+async def get_feedback_details(db: AsyncSession, feedback_id: str):
+    return (await db.scalars(crud.feedback_details_query().where(models.Feedback.id == feedback_id))).first()
+
+async def get_feedback_owners(db: AsyncSession, feedback_id: str):
+    return (await db.execute(crud.feedback_owners_query(feedback_id))).first()
+
+async def get_feedback_details_bulk(
+    db: AsyncSession,
+    feedback_ids: Optional[list[str]] = None,
+    manager_id: Optional[str] = None,
+    employee_id: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    include_subtree: bool = False
+):
+    stmt = crud.feedback_details_bulk_query(feedback_ids, manager_id, employee_id, start, end, include_subtree)
+    return (await db.scalars(stmt)).all()
+
+async def get_feedback_access(db: AsyncSession, **filters):
+    return (await db.execute(crud.feedback_access_query(**filters))).all()
+
+async def count_feedback(db: AsyncSession, **filters) -> int:
+    return await db.scalar(crud.feedback_count_query(**filters))
+
+async def iter_feedback_details(batch_size: int, **filters):
+    """Fully loaded feedback matching `filters`, oldest first, read in keyset batches of
+    `batch_size` so memory stays flat however many match. Uses a session of its own, so
+    it can feed a streaming response after the request's session has closed; take what
+    you need from each row before asking for the next."""
+    feedback = models.Feedback
+    async with AsyncSessionLocal() as db:
+        after = None
+        while True:
+            stmt = crud.feedback_details_bulk_query(**filters).limit(batch_size)
+            if after is not None:
+                stmt = stmt.where(tuple_(feedback.created_at, feedback.id) > tuple_(*after))
+            rows = (await db.scalars(stmt)).all()
+            for row in rows:
+                yield row
+            if len(rows) < batch_size:
+                return
+            after = (rows[-1].created_at, rows[-1].id)
+            db.expunge_all()
+
+async def get_manager_dashboard_stats(db: AsyncSession, manager_id: str, include_subtree: bool = False) -> dict:
+    if include_subtree:
+        if not stats.USE_STATS_COUNTERS:
+            return stats.stats_from_rows((await db.execute(stats.subtree_aggregate_query(manager_id))).all())
+        return stats.stats_from_subtree(
+            (await db.execute(stats.subtree_counters_query(manager_id))).one(),
+            (await db.execute(stats.uncounted_subtree_query(manager_id))).all(),
+        )
+    if stats.USE_STATS_COUNTERS:
+        counters = await db.get(models.ManagerStats, manager_id)
+        if counters is not None:
+            return stats.stats_from_counters(counters)
+    return stats.stats_from_rows((await db.execute(stats.aggregate_counts_query(manager_id))).all())
+
+async def get_trends(
+    db: AsyncSession,
+    grain: str,
+    start: date,
+    end: date,
+    manager_id: Optional[str] = None,
+    employee_id: Optional[str] = None,
+    tag_id: Optional[int] = None,
+    sentiment: Optional[models.SentimentEnum] = None,
+    by_tag: bool = False
+) -> list[dict]:
+    stmt = rollups.trends_query(grain, start, end, manager_id, employee_id, tag_id, sentiment, by_tag)
+    return rollups.trends_from_rows((await db.execute(stmt)).all(), by_tag)
+
+async def get_digest(db: AsyncSession, user_id: str) -> Optional[models.Digest]:
+    return await db.get(models.Digest, user_id)
+
+async def get_tags(db: AsyncSession):
+    # The registry is almost always served from memory; run_sync covers its occasional reload
+    return await db.run_sync(tag_registry.all)
+
+async def get_changes(db: AsyncSession, user: schemas.UserOut, watermark: Optional[str] = None) -> dict:
+    """Rows changed since `watermark` (see sync.py). Raises ValueError for a malformed watermark."""
+    positions = sync.decode_watermark(watermark)
+    settle = sync.settle_point(db)
+    entity_rows = {
+        name: (await db.execute(stmt)).all()
+        for name, stmt in sync.entity_queries(db, user, positions).items()
+    }
+    return sync.changes_response(entity_rows, positions, settle)
+
+async def search_feedback(
+    db: AsyncSession,
+    q: str,
+    manager_id: Optional[str] = None,
+    employee_id: Optional[str] = None,
+    tag_id: Optional[int] = None,
+    sentiment: Optional[models.SentimentEnum] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = search.SEARCH_PAGE_SIZE,
+) -> dict:
+    """Ranked full-text search (see search.py). Raises ValueError for an empty query or bad cursor."""
+    stmt = search.search_query(db, q, manager_id, employee_id, tag_id, sentiment, start, end, cursor, limit)
+    rows, next_cursor = search.page((await db.execute(stmt)).all(), limit)
+    ids = [row.feedback_id for row in rows]
+    if not ids:
+        return {"results": [], "next_cursor": None}
+    feedbacks = {fb.id: fb for fb in await get_feedback_details_bulk(db, feedback_ids=ids)}
+    marked = {row[0]: search.highlights(row) for row in await db.execute(search.highlights_query(db, q, ids))}
+    return {
+        "results": [
+            {
+                "feedback": schemas.FeedbackOut.model_validate(feedbacks[row.feedback_id], from_attributes=True),
+                "score": -row.rank,
+                "highlights": marked.get(row.feedback_id, {}),
+            }
+            for row in rows if row.feedback_id in feedbacks
+        ],
+        "next_cursor": next_cursor,
+    }
@@ -1,30 +1,35 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from typing import Optional
+import hmac
+import os
 
-import crud, models, schemas
-from database import SessionLocal
+import async_crud, crud, models, schemas, principals
+from database import get_async_db, get_db
 
 # --- Configuration ---
 SECRET_KEY = "your_super_secret_key"  # It's better to load this from an environment variable
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Put id/role/manager_id in the token so authenticated requests need no user lookup.
+# Claims reflect the user as of login, so team changes show up on the next login.
+TOKEN_EMBED_CLAIMS = os.getenv("TOKEN_EMBED_CLAIMS", "false").lower() in ("1", "true", "yes")
+# Shared secret that lets analytics tools export the whole org (X-Export-Key); unset disables it
+EXPORT_API_KEY = os.getenv("EXPORT_API_KEY")
+# Lifetime of the tickets that open the event stream; they end up in URLs, so keep it short
+STREAM_TICKET_SECONDS = int(os.getenv("STREAM_TICKET_SECONDS", "60"))
+STREAM_SCOPE = "stream"
 
 # --- Password Hashing ---
 # Use the same pwd_context as in crud.py for consistency
 pwd_context = crud.pwd_context
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -43,23 +48,109 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-# --- Current User Dependency ---
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
+def token_claims(user: models.User) -> dict:
+    """Claims for a user's access token"""
+    claims = {"sub": user.email}
+    if TOKEN_EMBED_CLAIMS:
+        claims.update({
+            "uid": user.id,
+            "name": user.name,
+            "role": user.role.value,
+            "manager_id": user.manager_id,
+        })
+    return claims
+
+def principal_from_claims(payload: dict) -> schemas.UserOut:
+    return schemas.UserOut(
+        id=payload["uid"],
+        name=payload["name"],
+        email=payload["sub"],
+        role=payload["role"],
+        manager_id=payload.get("manager_id"),
     )
+
+# --- Current User Dependency ---
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+def decode_token(token: str, scope: Optional[str] = None) -> dict:
+    """Validated token payload. Raises credentials_exception.
+
+    Access tokens have no scope; a scoped token (a stream ticket) is only
+    accepted where that scope is asked for, and never as an access token.
+    """
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
-        if email is None:
+        if email is None or payload.get("scope") != scope:
             raise credentials_exception
-        token_data = schemas.TokenData(email=email)
+        schemas.TokenData(email=email)
     except JWTError:
         raise credentials_exception
-    
-    user = crud.get_user_by_email(db, email=token_data.email)
+    return payload
+
+def cached_principal(payload: dict) -> Optional[schemas.UserOut]:
+    """The principal for a token without touching the database, if it is known"""
+    if TOKEN_EMBED_CLAIMS and "uid" in payload:
+        return principal_from_claims(payload)
+    return principals.get(payload["sub"])
+
+def remember_principal(user: Optional[models.User]) -> schemas.UserOut:
     if user is None:
         raise credentials_exception
-    return user 
\ No newline at end of file
+    principal = schemas.UserOut.model_validate(user, from_attributes=True)
+    principals.put(user.email, principal)
+    return principal
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    payload = decode_token(token)
+    principal = cached_principal(payload)
+    if principal is None:
+        principal = remember_principal(crud.get_user_by_email(db, email=payload["sub"]))
+    return principal
+
+async def principal_async(payload: dict, db: AsyncSession) -> schemas.UserOut:
+    principal = cached_principal(payload)
+    if principal is None:
+        principal = remember_principal(await async_crud.get_user_by_email(db, email=payload["sub"]))
+    return principal
+
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    """get_current_user for async handlers; the fallback lookup runs on the async engine"""
+    return await principal_async(decode_token(token), db)
+
+def create_stream_ticket(user: schemas.UserOut) -> str:
+    """Short-lived token that can only open the event stream"""
+    return create_access_token(
+        {"sub": user.email, "scope": STREAM_SCOPE}, expires_delta=timedelta(seconds=STREAM_TICKET_SECONDS)
+    )
+
+async def get_stream_user(
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    ticket: Optional[str] = Query(None, description="From POST /events/ticket"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """get_current_user_async that also accepts a stream ticket in ?ticket=, since
+    EventSource cannot send headers. Access tokens are never taken from the URL."""
+    if token:
+        return await get_current_user_async(token, db)
+    if not ticket:
+        raise credentials_exception
+    return await principal_async(decode_token(ticket, scope=STREAM_SCOPE), db)
+
+async def get_export_user(
+    export_key: Optional[str] = Header(None, alias="X-Export-Key"),
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
+) -> Optional[schemas.UserOut]:
+    """None for a caller holding EXPORT_API_KEY (the whole org); otherwise the signed-in user"""
+    if export_key is not None:
+        if EXPORT_API_KEY and hmac.compare_digest(export_key.encode(), EXPORT_API_KEY.encode()):
+            return None
+        raise credentials_exception
+    if not token:
+        raise credentials_exception
+    return await get_current_user_async(token, db)
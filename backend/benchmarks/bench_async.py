@@ -0,0 +1,182 @@
+"""
+Requests per second and tail latency of the same reads served by a sync
+handler (threadpool + Session) and an async handler (event loop + AsyncSession).
+
+A seeded database is served by uvicorn in a subprocess; the app below exposes
+each scenario twice, /sync/... and /async/..., running the same crud
+statement builders. A client keeps `--concurrency` requests in flight for
+`--seconds` per scenario.
+
+    cd backend
+    python -m benchmarks.bench_async --concurrency 200 --seconds 15
+    python -m benchmarks.bench_async --feedback 200000 --json async_results.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+from fastapi import Depends, FastAPI
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+import async_crud, crud, schemas
+
+# Served by the uvicorn subprocess; DATABASE_URL points it at the benchmark database
+from database import get_async_db, get_db
+
+app = FastAPI()
+
+
+@app.get("/sync/timeline/{manager_id}")
+def sync_timeline(manager_id: str, db: Session = Depends(get_db)):
+    items, _ = crud.get_feedback_timeline(db, manager_id=manager_id, limit=50)
+    return [schemas.FeedbackOut.model_validate(fb, from_attributes=True) for fb in items]
+
+
+@app.get("/async/timeline/{manager_id}")
+async def async_timeline(manager_id: str, db: AsyncSession = Depends(get_async_db)):
+    items, _ = await async_crud.get_feedback_timeline(db, manager_id=manager_id, limit=50)
+    return [schemas.FeedbackOut.model_validate(fb, from_attributes=True) for fb in items]
+
+
+@app.get("/sync/stats/{manager_id}")
+def sync_stats(manager_id: str, db: Session = Depends(get_db)):
+    return crud.get_manager_dashboard_stats(db, manager_id)
+
+
+@app.get("/async/stats/{manager_id}")
+async def async_stats(manager_id: str, db: AsyncSession = Depends(get_async_db)):
+    return await async_crud.get_manager_dashboard_stats(db, manager_id)
+
+
+@app.get("/sync/team/{manager_id}")
+def sync_team(manager_id: str, db: Session = Depends(get_db)):
+    return [schemas.UserOut.model_validate(u, from_attributes=True) for u in crud.get_team_members(db, manager_id)]
+
+
+@app.get("/async/team/{manager_id}")
+async def async_team(manager_id: str, db: AsyncSession = Depends(get_async_db)):
+    return [schemas.UserOut.model_validate(u, from_attributes=True)
+            for u in await async_crud.get_team_members(db, manager_id)]
+
+
+SCENARIOS = ["timeline", "stats", "team"]
+
+
+async def load(base_url: str, path: str, manager_ids: list, concurrency: int, seconds: float) -> dict:
+    import httpx
+
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + seconds
+    rng = random.Random(0)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        async def user():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(f"{path}/{rng.choice(manager_ids)}")
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - start)
+                except httpx.HTTPError:
+                    errors += 1
+
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+
+    latencies.sort()
+    ms = lambda s: round(s * 1000, 2)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / seconds, 1),
+        "p50_ms": ms(statistics.median(latencies)) if latencies else None,
+        "p99_ms": ms(latencies[max(0, int(len(latencies) * 0.99) - 1)]) if latencies else None,
+    }
+
+
+def wait_until_up(base_url: str, server: subprocess.Popen, timeout: float = 30):
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("uvicorn exited during startup")
+        try:
+            httpx.get(f"{base_url}/docs", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError("uvicorn did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="bench_async.db")
+    parser.add_argument("--managers", type=int, default=200)
+    parser.add_argument("--employees-per-manager", type=int, default=10)
+    parser.add_argument("--feedback", type=int, default=100_000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--keep", action="store_true", help="Keep the seeded database file")
+    args = parser.parse_args()
+
+    from database import Base
+    from benchmarks.seed import seed, sqlite_engine
+
+    if os.path.exists(args.db):
+        os.remove(args.db)
+    engine = sqlite_engine(args.db)
+    Base.metadata.create_all(bind=engine)
+    ids = seed(engine, managers=args.managers, employees_per_manager=args.employees_per_manager,
+               feedback=args.feedback)
+    engine.dispose()
+    manager_ids = ids["manager_ids"]
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{os.path.abspath(args.db)}"}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.bench_async:app", "--port", str(args.port),
+         "--log-level", "warning"],
+        env=env,
+    )
+    results = {}
+    try:
+        wait_until_up(base_url, server)
+        for scenario in SCENARIOS:
+            for model in ("sync", "async"):
+                path = f"/{model}/{scenario}"
+                asyncio.run(load(base_url, path, manager_ids, min(args.concurrency, 10), 1))  # warm up
+                results[f"{model}_{scenario}"] = asyncio.run(
+                    load(base_url, path, manager_ids, args.concurrency, args.seconds)
+                )
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"concurrency {args.concurrency}, {args.seconds:g}s per run\n")
+    print(f"{'scenario':18} {'rps':>8} {'p50':>10} {'p99':>10} {'errors':>7}")
+    for name, r in results.items():
+        print(f"{name:18} {r['rps']:>8} {r['p50_ms']:>8}ms {r['p99_ms']:>8}ms {r['errors']:>7}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"benchmark": "async", "params": vars(args), "results": results}, f, indent=2)
+    if not args.keep:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.db + suffix):
+                os.remove(args.db + suffix)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+Micro-benchmarks of the crud functions against a seeded database.
+
+Each scenario calls one crud function with a fresh Session per call (as a
+request would), after a few warm-up calls, and records its latency and the
+number of SQL statements it sent. Write scenarios change the database, so
+run them on a throwaway copy rather than a --reuse database you care about.
+
+    cd backend
+    python -m benchmarks.bench_crud --feedback 200000 --json crud.json
+    python -m benchmarks.bench_crud --db bench.db --reuse --only timeline --only stats
+    python -m benchmarks.compare crud_before.json crud.json
+"""
+
+import argparse
+import itertools
+import random
+import time
+from collections import defaultdict
+
+from sqlalchemy import event, exists, select
+from sqlalchemy.orm import sessionmaker
+
+import crud, models, schemas
+from benchmarks import report
+from benchmarks.seed import add_seed_arguments, prepare, seed_arguments
+
+
+class Targets:
+    """Random but reproducible arguments for the scenarios"""
+
+    def __init__(self, engine, ids: dict, seed_value: int):
+        self.rng = random.Random(seed_value)
+        self.manager_ids = [m for m in ids["manager_ids"] if ids["teams"][m]]
+        self.teams = ids["teams"]
+        self.unassigned_ids = ids["unassigned_ids"]
+        self.tag_ids = ids["tag_ids"]
+        self.sequence = itertools.count()
+        feedback, ack = models.Feedback, models.Acknowledgement
+        with engine.connect() as conn:
+            self.feedback = conn.execute(
+                select(feedback.id, feedback.manager_id, feedback.employee_id).order_by(feedback.id).limit(5_000)
+            ).all()
+            unacknowledged = conn.execute(
+                select(feedback.id, feedback.employee_id)
+                .where(~exists().where(ack.feedback_id == feedback.id))
+                .order_by(feedback.id).limit(50_000)
+            ).all()
+            self.open_requests = list(conn.scalars(
+                select(models.FeedbackRequest.id).where(models.FeedbackRequest.is_open.is_(True)).limit(20_000)
+            ))
+            self.emails = list(conn.scalars(select(models.User.email).limit(5_000)))
+        self.pending = defaultdict(list)
+        for feedback_id, employee_id in unacknowledged:
+            self.pending[employee_id].append(feedback_id)
+        self.rng.shuffle(self.open_requests)
+
+    def manager(self):
+        return self.rng.choice(self.manager_ids)
+
+    def employee(self):
+        return self.rng.choice(self.teams[self.manager()])
+
+    def feedback_row(self):
+        return self.rng.choice(self.feedback)
+
+    def feedback_ids(self, n: int):
+        return [row.id for row in self.rng.sample(self.feedback, n)]
+
+    def unacknowledged_feedback(self, n: int = 1):
+        """(employee_id, up to n of their unacknowledged feedback ids), from the employee with the most pending"""
+        if not self.pending:
+            raise RuntimeError("Ran out of unacknowledged feedback; lower --repeat or seed more")
+        employee_id = max(self.pending, key=lambda e: len(self.pending[e]))
+        taken = self.pending[employee_id][:n]
+        del self.pending[employee_id][:n]
+        if not self.pending[employee_id]:
+            del self.pending[employee_id]
+        return employee_id, taken
+
+    def open_request(self):
+        if not self.open_requests:
+            raise RuntimeError("Ran out of open feedback requests; lower --repeat or seed more")
+        return self.open_requests.pop()
+
+    def new_feedback(self, manager_id: str):
+        return schemas.FeedbackCreate(
+            strengths="Benchmarked strengths.", improvements="Benchmarked improvements.",
+            sentiment=self.rng.choice(list(models.SentimentEnum)),
+            employee_id=self.rng.choice(self.teams[manager_id]),
+            tag_ids=self.rng.sample(self.tag_ids, min(2, len(self.tag_ids))),
+        )
+
+
+def read_scenarios(t: Targets) -> dict:
+    return {
+        "get_user_by_email": lambda db: crud.get_user_by_email(db, t.rng.choice(t.emails)),
+        "get_team_members": lambda db: crud.get_team_members(db, t.manager()),
+        "get_available_employees": lambda db: crud.get_available_employees(db),
+        "get_feedback_by_manager": lambda db: crud.get_feedback_by_manager(db, t.manager()),
+        "get_feedback_for_employee": lambda db: crud.get_feedback_for_employee(db, t.employee()),
+        "get_feedback_for_manager": lambda db: crud.get_feedback_for_manager(db, t.manager()),
+        "get_feedback_timeline_manager_page": lambda db: crud.get_feedback_timeline(db, manager_id=t.manager(), limit=50),
+        "get_feedback_timeline_employee_page": lambda db: crud.get_feedback_timeline(db, employee_id=t.employee(), limit=50),
+        "get_feedback_timeline_manager_full": lambda db: crud.get_feedback_timeline(db, manager_id=t.manager()),
+        "get_feedback_timeline_sparse_fields": lambda db: crud.get_feedback_timeline(
+            db, manager_id=t.manager(), limit=50, fields=["id", "sentiment", "created_at"]),
+        "get_employee_feedback_with_acknowledgements":
+            lambda db: crud.get_employee_feedback_with_acknowledgements(db, t.employee()),
+        "get_feedback_by_id": lambda db: crud.get_feedback_by_id(db, t.feedback_row().id),
+        "get_feedback_details": lambda db: crud.get_feedback_details(db, t.feedback_row().id),
+        "get_feedback_details_bulk_50": lambda db: crud.get_feedback_details_bulk(db, feedback_ids=t.feedback_ids(50)),
+        "get_manager_dashboard_stats": lambda db: crud.get_manager_dashboard_stats(db, t.manager()),
+        "get_open_feedback_requests": lambda db: crud.get_open_feedback_requests(db, t.manager()),
+        "get_tags": lambda db: crud.get_tags(db),
+    }
+
+
+def write_scenarios(t: Targets, hashed_password: str) -> dict:
+    def create_feedback(db):
+        manager_id = t.manager()
+        return crud.create_feedback(db, t.new_feedback(manager_id), manager_id)
+
+    def create_feedback_batch_50(db):
+        manager_id = t.manager()
+        return crud.create_feedback_batch(db, [t.new_feedback(manager_id) for _ in range(50)], manager_id)
+
+    def acknowledge_feedback(db):
+        employee_id, (feedback_id,) = t.unacknowledged_feedback()
+        return crud.acknowledge_feedback(db, feedback_id, employee_id, "Thanks")
+
+    def acknowledge_feedback_batch(db):
+        # A batch is acknowledged by one employee: all of their pending feedback, up to 50
+        employee_id, feedback_ids = t.unacknowledged_feedback(50)
+        items = [schemas.AcknowledgementBatchItem(feedback_id=feedback_id, comment="Thanks") for feedback_id in feedback_ids]
+        return crud.acknowledge_feedback_batch(db, items, employee_id)
+
+    def update_feedback(db):
+        row = t.feedback_row()
+        update = schemas.FeedbackUpdate(sentiment=t.rng.choice(list(models.SentimentEnum)))
+        return crud.update_feedback(db, row.id, update)
+
+    def create_user(db):
+        n = next(t.sequence)
+        user = schemas.UserCreate(name=f"Bench {n}", email=f"bench{n}-{time.time_ns()}@example.com",
+                                  role=schemas.RoleEnum.employee, password="unused", manager_id=t.manager())
+        return crud.create_user(db, user, hashed_password)
+
+    def assign_employee_to_manager(db):
+        return crud.assign_employee_to_manager(db, t.employee(), t.manager())
+
+    def assign_employees_to_manager_20(db):
+        return crud.assign_employees_to_manager(db, [t.employee() for _ in range(20)], t.manager())
+
+    def create_feedback_request(db):
+        manager_id = t.manager()
+        return crud.create_feedback_request(db, t.rng.choice(t.teams[manager_id]), manager_id, "How am I doing?")
+
+    def close_feedback_request(db):
+        return crud.close_feedback_request(db, t.open_request())
+
+    return {
+        "create_feedback": create_feedback,
+        "create_feedback_batch_50": create_feedback_batch_50,
+        "acknowledge_feedback": acknowledge_feedback,
+        "acknowledge_feedback_batch": acknowledge_feedback_batch,
+        "update_feedback": update_feedback,
+        "create_user": create_user,
+        "assign_employee_to_manager": assign_employee_to_manager,
+        "assign_employees_to_manager_20": assign_employees_to_manager_20,
+        "create_feedback_request": create_feedback_request,
+        "close_feedback_request": close_feedback_request,
+        "get_or_create_tags": lambda db: crud.get_or_create_tags(db, [f"Bench tag {next(t.sequence) % 50}"]),
+    }
+
+
+def measure(engine, Session, fn, repeat: int, warmup: int) -> dict:
+    statements = 0
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        nonlocal statements
+        statements += 1
+
+    for _ in range(warmup):
+        with Session() as db:
+            fn(db)
+    latencies = []
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        for _ in range(repeat):
+            with Session() as db:
+                start = time.perf_counter()
+                fn(db)
+                latencies.append(time.perf_counter() - start)
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    result = report.summarize(latencies)
+    result["statements_per_call"] = round(statements / repeat, 2)
+    result["ops_per_second"] = round(repeat / sum(latencies), 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_seed_arguments(parser)
+    parser.add_argument("--repeat", type=int, default=100)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--only", action="append", help="Run scenarios whose name contains this (repeatable)")
+    parser.add_argument("--reads-only", action="store_true", help="Skip the write scenarios")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    engine, ids = prepare(args.db, reuse=args.reuse, **seed_arguments(args))
+    print(f"Database ready in {time.perf_counter() - start:.1f}s")
+    Session = sessionmaker(bind=engine)
+    targets = Targets(engine, ids, args.seed_value)
+
+    scenarios = read_scenarios(targets)
+    if not args.reads_only:
+        scenarios.update(write_scenarios(targets, hashed_password=""))
+    if args.only:
+        scenarios = {name: fn for name, fn in scenarios.items() if any(part in name for part in args.only)}
+
+    results = {}
+    print(f"{'scenario':44} {'median':>10} {'p95':>10} {'p99':>10} {'stmts':>6}")
+    for name, fn in scenarios.items():
+        r = results[name] = measure(engine, Session, fn, args.repeat, args.warmup)
+        print(f"{name:44} {r['median_ms']:>8.2f}ms {r['p95_ms']:>8.2f}ms {r['p99_ms']:>8.2f}ms {r['statements_per_call']:>6}")
+
+    if args.json:
+        report.write(args.json, "crud", vars(args), results)
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Query plans and latency of the hot crud queries before and after the
+indexes the migrations add (the composite/partial indexes from migration 2
+and every later one).
+
+The database is seeded once with only the schema migration 1 had, measured,
+then upgraded through migrations.upgrade() (the same path an existing
+feedback.db takes) and measured again.
+
+    cd backend
+    python -m benchmarks.bench_indexes --feedback 2000000
+    python -m benchmarks.bench_indexes --feedback 50000 --json index_results.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+from datetime import datetime
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import sessionmaker
+
+import crud, migrations, stats
+from database import Base
+from benchmarks.seed import seed, sqlite_engine
+
+# Tables of the schema migration 1 created; later tables come with their indexes
+MIGRATION_1_TABLES = {"users", "feedback", "feedback_tags", "acknowledgements", "tags", "feedback_requests"}
+
+
+def migration_index_names() -> set:
+    """Indexes later migrations add to migration 1's tables: all but the per-column ones it created"""
+    return {
+        index.name
+        for table in Base.metadata.sorted_tables if table.name in MIGRATION_1_TABLES
+        for index in table.indexes
+        if not (len(index.columns) == 1 and next(iter(index.columns)).index)
+    }
+
+
+def scenarios(manager_id: str, employee_id: str):
+    return {
+        "manager_timeline_page": lambda db: crud.get_feedback_timeline(db, manager_id=manager_id, limit=50),
+        "employee_timeline_page": lambda db: crud.get_feedback_timeline(db, employee_id=employee_id, limit=50),
+        "manager_stats_aggregate": lambda db: stats.compute_manager_stats(db, manager_id),
+        "team_members": lambda db: crud.get_team_members(db, manager_id),
+        "available_employees": lambda db: crud.get_available_employees(db),
+        "open_feedback_requests": lambda db: crud.get_open_feedback_requests(db, manager_id),
+    }
+
+
+def capture_statements(engine, fn, Session):
+    """Run fn once and return the (sql, params) it sent to the database"""
+    captured = []
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before)
+    try:
+        with Session() as db:
+            fn(db)
+    finally:
+        event.remove(engine, "before_cursor_execute", before)
+    return captured
+
+
+def query_plans(engine, fn, Session):
+    plans = []
+    with engine.connect() as conn:
+        for statement, parameters in capture_statements(engine, fn, Session):
+            rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+            plans.append([row[-1] for row in rows])
+    return plans
+
+
+def time_scenario(fn, Session, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        with Session() as db:
+            start = time.perf_counter()
+            fn(db)
+            samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "median_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[max(0, int(len(samples) * 0.95) - 1)], 3),
+        "max_ms": round(samples[-1], 3),
+    }
+
+
+def measure(engine, Session, manager_id, employee_id, repeat):
+    results = {}
+    for name, fn in scenarios(manager_id, employee_id).items():
+        with Session() as db:
+            fn(db)  # warm the page cache
+        results[name] = {"plan": query_plans(engine, fn, Session), **time_scenario(fn, Session, repeat)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="bench_indexes.db")
+    parser.add_argument("--managers", type=int, default=1_000)
+    parser.add_argument("--employees-per-manager", type=int, default=20)
+    parser.add_argument("--feedback", type=int, default=2_000_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--keep", action="store_true", help="Keep the seeded database file")
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        os.remove(args.db)
+    engine = sqlite_engine(args.db)
+    Session = sessionmaker(bind=engine)
+
+    # Build the pre-migration schema: tables without any index a migration adds
+    index_names = migration_index_names()
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                if index.name in index_names:
+                    index.drop(bind=conn)
+
+    start = time.perf_counter()
+    ids = seed(engine, managers=args.managers, employees_per_manager=args.employees_per_manager,
+               feedback=args.feedback)
+    seed_seconds = time.perf_counter() - start
+    manager_id = ids["manager_ids"][0]
+    employee_id = ids["teams"][manager_id][0]
+    print(f"Seeded {args.feedback} feedback rows in {seed_seconds:.1f}s")
+
+    before = measure(engine, Session, manager_id, employee_id, args.repeat)
+
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        migrations.migration_metadata.create_all(bind=conn)
+        # Pretend the database predates migration 2, like an existing feedback.db
+        conn.execute(migrations.schema_migrations.insert().values(
+            version=1, description="Create tables", applied_at=datetime.utcnow()
+        ))
+    applied = migrations.upgrade(engine)
+    migrate_seconds = time.perf_counter() - start
+    existing = {ix["name"] for t in inspect(engine).get_table_names() for ix in inspect(engine).get_indexes(t)}
+    assert index_names <= existing, f"migrations did not create {sorted(index_names - existing)}"
+    print(f"Applied migrations {applied} in {migrate_seconds:.1f}s")
+
+    after = measure(engine, Session, manager_id, employee_id, args.repeat)
+
+    print(f"\n{'scenario':28} {'before med':>11} {'after med':>10} {'before p95':>11} {'after p95':>10}")
+    for name in before:
+        b, a = before[name], after[name]
+        print(f"{name:28} {b['median_ms']:>9.2f}ms {a['median_ms']:>8.2f}ms {b['p95_ms']:>9.2f}ms {a['p95_ms']:>8.2f}ms")
+    for name in before:
+        print(f"\n{name}\n  before: {before[name]['plan']}\n  after:  {after[name]['plan']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "benchmark": "indexes",
+                "params": vars(args),
+                "seed_seconds": round(seed_seconds, 2),
+                "migrate_seconds": round(migrate_seconds, 2),
+                "before": before,
+                "after": after,
+            }, f, indent=2)
+
+    engine.dispose()
+    if not args.keep:
+        os.remove(args.db)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+HTTP load against the real app, served in-process over ASGI.
+
+main.app runs inside this process (lifespan included) on a seeded database
+and is driven through httpx.ASGITransport, so every request goes through
+routing, auth, validation, the handlers and serialization, but no sockets.
+For each scenario `--concurrency` virtual users send requests back to back
+for `--seconds`:
+
+    login              POST /token (bcrypt on the password pool)
+    manager_dashboard  GET /dashboard/manager/{id}
+    manager_timeline   GET /feedback/manager/?limit=50
+    employee_timeline  GET /feedback/employee/?limit=50
+    acknowledge        POST /feedback/{id}/acknowledge on the user's pending feedback
+    pdf_export         POST /feedback/export of 5 reports as a ZIP
+    mixed              all of the above but login, weighted like dashboard traffic
+
+    cd backend
+    python -m benchmarks.bench_load --feedback 200000 --json load.json
+    python -m benchmarks.bench_load --db bench.db --reuse --scenario mixed --concurrency 100
+
+The client shares the event loop with the app, so rps is a relative number
+for comparing runs (benchmarks.compare), not a capacity figure.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from datetime import timedelta
+
+from sqlalchemy import exists, select
+
+from benchmarks import report
+
+MIX = {
+    "manager_dashboard": 3,
+    "manager_timeline": 3,
+    "employee_timeline": 4,
+    "acknowledge": 1,
+    "pdf_export": 0.2,
+}
+
+
+def virtual_users(engine, ids: dict, count: int, seed_value: int) -> dict:
+    """`count` managers and `count` employees with tokens, their feedback and their pending feedback"""
+    import auth, models
+
+    rng = random.Random(seed_value)
+    manager_ids = rng.sample([m for m in ids["manager_ids"] if ids["teams"][m]], min(count, len(ids["manager_ids"])))
+    employee_ids = rng.sample([e for team in ids["teams"].values() for e in team], count)
+    feedback, ack = models.Feedback, models.Acknowledgement
+    users = {"manager": [], "employee": []}
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(models.User.id, models.User.email).where(models.User.id.in_(manager_ids + employee_ids))
+        ).all()
+        emails = dict(rows)
+        for manager_id in manager_ids:
+            users["manager"].append({
+                "id": manager_id, "email": emails[manager_id],
+                "feedback_ids": list(conn.scalars(
+                    select(feedback.id).where(feedback.manager_id == manager_id).limit(50)
+                )),
+            })
+        for employee_id in employee_ids:
+            users["employee"].append({
+                "id": employee_id, "email": emails[employee_id],
+                "pending": list(conn.scalars(
+                    select(feedback.id)
+                    .where(feedback.employee_id == employee_id, ~exists().where(ack.feedback_id == feedback.id))
+                )),
+            })
+    for user in users["manager"] + users["employee"]:
+        token = auth.create_access_token({"sub": user["email"]}, expires_delta=timedelta(hours=12))
+        user["headers"] = {"Authorization": f"Bearer {token}"}
+    return users
+
+
+def scenarios(password: str) -> dict:
+    """name -> (role, request); a request returns None when the user has nothing left to do"""
+
+    async def login(client, user, rng):
+        return await client.post("/token", data={"username": user["email"], "password": password})
+
+    async def manager_dashboard(client, user, rng):
+        return await client.get(f"/dashboard/manager/{user['id']}", headers=user["headers"])
+
+    async def manager_timeline(client, user, rng):
+        return await client.get("/feedback/manager/", params={"limit": 50}, headers=user["headers"])
+
+    async def employee_timeline(client, user, rng):
+        return await client.get("/feedback/employee/", params={"limit": 50}, headers=user["headers"])
+
+    async def acknowledge(client, user, rng):
+        if not user["pending"]:
+            return None
+        feedback_id = user["pending"].pop()
+        return await client.post(f"/feedback/{feedback_id}/acknowledge", json={"comment": "Thanks"},
+                                 headers=user["headers"])
+
+    async def pdf_export(client, user, rng):
+        if not user["feedback_ids"]:
+            return None
+        feedback_ids = rng.sample(user["feedback_ids"], min(5, len(user["feedback_ids"])))
+        return await client.post("/feedback/export", json={"feedback_ids": feedback_ids, "format": "zip"},
+                                 headers=user["headers"])
+
+    return {
+        "login": ("any", login),
+        "manager_dashboard": ("manager", manager_dashboard),
+        "manager_timeline": ("manager", manager_timeline),
+        "employee_timeline": ("employee", employee_timeline),
+        "acknowledge": ("employee", acknowledge),
+        "pdf_export": ("manager", pdf_export),
+    }
+
+
+async def run(client, plan, users: dict, concurrency: int, seconds: float, seed_value: int) -> dict:
+    """Drive `plan` (a list of (weight, role, request)) for `seconds` and summarize the responses"""
+    import httpx
+
+    latencies, statuses = [], Counter()
+    weights = [weight for weight, _, _ in plan]
+    deadline = time.perf_counter() + seconds
+
+    async def virtual_user(n: int):
+        rng = random.Random(seed_value * 1_000 + n)
+        while time.perf_counter() < deadline:
+            _, role, request = rng.choices(plan, weights)[0]
+            user = rng.choice(users["manager"] + users["employee"] if role == "any" else users[role])
+            start = time.perf_counter()
+            try:
+                response = await request(client, user, rng)
+            except httpx.HTTPError:
+                statuses["transport_error"] += 1
+                continue
+            if response is None:
+                statuses["skipped"] += 1
+                await asyncio.sleep(0)
+                continue
+            statuses[str(response.status_code)] += 1
+            if response.status_code < 400:
+                latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(virtual_user(n) for n in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    result = report.summarize(latencies)
+    result["rps"] = round(len(latencies) / elapsed, 1)
+    result["errors"] = sum(count for status, count in statuses.items() if not status.startswith(("2", "3", "s")))
+    result["statuses"] = dict(statuses)
+    return result
+
+
+async def run_all(args, users: dict) -> dict:
+    import httpx
+    import database, main
+
+    defined = scenarios(args.password)
+    plans = {name: [(1, role, request)] for name, (role, request) in defined.items()}
+    plans["mixed"] = [(MIX[name], *defined[name]) for name in MIX]
+    selected = args.scenario or list(plans)
+
+    results = {}
+    # An exception in a handler becomes a 500 that counts as an error, instead of
+    # escaping into the virtual user and ending the whole run
+    transport = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            for name in selected:
+                # The app prints on every login; keep the report readable
+                with open(os.devnull, "w") as quiet, contextlib.redirect_stdout(quiet):
+                    await run(client, plans[name], users, min(args.concurrency, 5), 1, args.seed_value)  # warm up
+                    r = results[name] = await run(client, plans[name], users, args.concurrency, args.seconds,
+                                                  args.seed_value)
+                print(f"{name:18} {r['rps']:>8} {r['median_ms'] or 0:>8.2f}ms {r['p95_ms'] or 0:>8.2f}ms "
+                      f"{r['p99_ms'] or 0:>8.2f}ms {r['errors']:>7}")
+    await database.async_engine.dispose()
+    return results
+
+
+def main():
+    # database reads DATABASE_URL when it is first imported (the seed helpers import it too),
+    # so point it at the benchmark database before anything else
+    early = argparse.ArgumentParser(add_help=False)
+    early.add_argument("--db", default="bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(early.parse_known_args()[0].db)}"
+    os.environ.setdefault("PDF_CACHE_DIR", tempfile.mkdtemp(prefix="bench_pdf_"))
+
+    from benchmarks.seed import add_seed_arguments, prepare, seed_arguments
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_seed_arguments(parser)
+    parser.add_argument("--password", default="benchmark", help="Password of every seeded user")
+    parser.add_argument("--users", type=int, default=50, help="Virtual managers and employees to draw from")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--scenario", action="append",
+                        choices=[*scenarios("").keys(), "mixed"], help="Run only these (repeatable)")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    engine, ids = prepare(args.db, reuse=args.reuse, password=args.password, **seed_arguments(args))
+    users = virtual_users(engine, ids, args.users, args.seed_value)
+    engine.dispose()
+    print(f"Database ready in {time.perf_counter() - start:.1f}s")
+
+    print(f"concurrency {args.concurrency}, {args.seconds:g}s per scenario\n")
+    print(f"{'scenario':18} {'rps':>8} {'p50':>10} {'p95':>10} {'p99':>10} {'errors':>7}")
+    results = asyncio.run(run_all(args, users))
+
+    if args.json:
+        report.write(args.json, "load", vars(args), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Cost of turning a timeline page into a JSON body, before and after the row fast path.
+
+Each scenario loads `--rows` feedback (newest first, with employee,
+acknowledgement and tags, i.e. a full FeedbackOut timeline) in a fresh
+Session and encodes it, timing three stages:
+
+    query    executing the statements and building ORM objects or row tuples
+    build    FeedbackOut.model_validate per row, or crud.feedback_out_dicts
+    encode   FastAPI's response-model validation and jsonable_encoder (ORM paths),
+             then rendering the body
+
+Scenarios:
+
+    orm_pydantic_json     the old path: ORM objects, pydantic, starlette's JSONResponse
+    orm_pydantic_orjson   the same with FastJSONResponse (what the default response class alone buys)
+    rows_orjson           column tuples, plain dicts, FastJSONResponse (the timeline endpoints now)
+    rows_json             the same with the stdlib encoder, as when orjson is not installed
+
+Every scenario must produce the same JSON; the run stops if one does not.
+
+    cd backend
+    python -m benchmarks.bench_serialization --rows 10000 --json serialization.json
+    python -m benchmarks.bench_serialization --db bench.db --reuse --rows 50000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from sqlalchemy.orm import sessionmaker
+
+import crud, schemas, serialization
+from benchmarks import report
+from benchmarks.seed import add_seed_arguments, prepare, seed_arguments
+
+# As FastAPI builds it for response_model=List[schemas.FeedbackOut]
+RESPONSE_FIELD = create_model_field(name="Response", type_=List[schemas.FeedbackOut], mode="serialization")
+
+
+def orm_path(render):
+    def run(db, rows: int, loop) -> tuple[dict, bytes]:
+        times = {}
+        start = time.perf_counter()
+        feedbacks, _ = crud.get_feedback_timeline(db, limit=rows)
+        times["query"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        items = [schemas.FeedbackOut.model_validate(fb, from_attributes=True) for fb in feedbacks]
+        times["build"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        content = loop.run_until_complete(serialize_response(field=RESPONSE_FIELD, response_content=items))
+        body = render(content)
+        times["encode"] = time.perf_counter() - start
+        return times, body
+    return run
+
+
+def rows_path(use_orjson: bool):
+    def run(db, rows: int, loop) -> tuple[dict, bytes]:
+        times = {}
+        start = time.perf_counter()
+        fetched, _ = crud.paginate_rows(
+            db.execute(crud.feedback_timeline_rows_query(db, limit=rows)).all(), rows, lambda row: row.id
+        )
+        ids = [row.id for row in fetched]
+        tag_rows = [tag_row for chunk in crud.id_chunks(ids) for tag_row in db.execute(crud.feedback_tags_query(chunk))]
+        times["query"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        items = crud.feedback_out_dicts(fetched, tag_rows)
+        times["build"] = time.perf_counter() - start
+
+        encoder = serialization.orjson
+        if not use_orjson:
+            serialization.orjson = None
+        try:
+            start = time.perf_counter()
+            body = serialization.FastJSONResponse(items).body
+            times["encode"] = time.perf_counter() - start
+        finally:
+            serialization.orjson = encoder
+        return times, body
+    return run
+
+
+def scenarios() -> dict:
+    selected = {
+        "orm_pydantic_json": orm_path(lambda content: JSONResponse(content).body),
+        "orm_pydantic_orjson": orm_path(lambda content: serialization.FastJSONResponse(content).body),
+        "rows_orjson": rows_path(use_orjson=True),
+        "rows_json": rows_path(use_orjson=False),
+    }
+    if serialization.orjson is None:
+        # Without orjson both encoders are the stdlib one
+        del selected["orm_pydantic_orjson"], selected["rows_orjson"]
+    return selected
+
+
+def measure(Session, fn, rows: int, repeat: int, loop) -> tuple[dict, bytes]:
+    with Session() as db:
+        _, body = fn(db, rows, loop)  # warm up
+    totals, stages = [], {"query": [], "build": [], "encode": []}
+    for _ in range(repeat):
+        with Session() as db:
+            times, _ = fn(db, rows, loop)
+        totals.append(sum(times.values()))
+        for stage, seconds in times.items():
+            stages[stage].append(seconds)
+    result = report.summarize(totals)
+    for stage, values in stages.items():
+        result[f"{stage}_ms"] = report.summarize(values)["median_ms"]
+    result["per_10k_rows_ms"] = round(result["median_ms"] * 10_000 / rows, 2)
+    result["bytes"] = len(body)
+    return result, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_seed_arguments(parser, feedback=50_000)
+    parser.add_argument("--rows", type=int, default=10_000, help="Feedback rows per response")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    engine, _ = prepare(args.db, reuse=args.reuse, **seed_arguments(args))
+    print(f"Database ready in {time.perf_counter() - start:.1f}s")
+    Session = sessionmaker(bind=engine)
+    loop = asyncio.new_event_loop()
+
+    results, reference = {}, None
+    print(f"{args.rows} rows per response\n")
+    print(f"{'scenario':22} {'total':>10} {'query':>10} {'build':>10} {'encode':>10} {'per 10k':>10}")
+    for name, fn in scenarios().items():
+        r, body = measure(Session, fn, args.rows, args.repeat, loop)
+        if reference is None:
+            reference = json.loads(body)
+        elif json.loads(body) != reference:
+            raise SystemExit(f"{name} produced different JSON than the first scenario")
+        results[name] = r
+        print(f"{name:22} {r['median_ms']:>8.1f}ms {r['query_ms']:>8.1f}ms {r['build_ms']:>8.1f}ms "
+              f"{r['encode_ms']:>8.1f}ms {r['per_10k_rows_ms']:>8.1f}ms")
+
+    loop.close()
+    if args.json:
+        report.write(args.json, "serialization", vars(args), results)
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Cold-start cost of a worker: how long `import main` takes and how long a
+freshly started uvicorn worker needs before it answers its first request.
+
+Workers are started the way a rolling restart starts them: `--workers` uvicorn
+processes at once, each on its own port, all on the same database, so they
+also contend for the migration lock. Two databases are measured:
+
+    current   an up-to-date seeded database (the usual restart)
+    empty     a new database, so one worker applies every migration while the others wait
+
+Runs that exceed the budgets exit with status 1, so CI can gate on them.
+
+    cd backend
+    python -m benchmarks.bench_startup --workers 4 --json startup.json
+    python -m benchmarks.bench_startup --budget-import-ms 1500 --budget-first-request-ms 4000
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import report
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+
+
+def measure_import(env: dict, repeat: int) -> dict:
+    """Seconds spent in `import main`, and in the whole process, per fresh interpreter"""
+    imports, processes = [], []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], env=env, capture_output=True, text=True, check=True)
+        processes.append(time.perf_counter() - started)
+        imports.append(float(out.stdout.strip().splitlines()[-1]))
+    return {
+        "import_median_ms": round(statistics.median(imports) * 1000, 1),
+        "import_max_ms": round(max(imports) * 1000, 1),
+        "process_median_ms": round(statistics.median(processes) * 1000, 1),
+    }
+
+
+def first_request(env: dict, workers: int, base_port: int, timeout: float) -> dict:
+    """Start `workers` uvicorn processes together; seconds until each answers GET / with 200"""
+    import httpx
+
+    started = time.perf_counter()
+    servers = [
+        subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(base_port + i), "--log-level", "warning"],
+            env=env, stdout=subprocess.DEVNULL,
+        )
+        for i in range(workers)
+    ]
+    ready = {}
+    try:
+        deadline = started + timeout
+        while len(ready) < workers and time.perf_counter() < deadline:
+            for i, server in enumerate(servers):
+                if i in ready:
+                    continue
+                if server.poll() is not None:
+                    raise RuntimeError(f"worker {i} exited during startup")
+                try:
+                    if httpx.get(f"http://127.0.0.1:{base_port + i}/", timeout=0.5).status_code == 200:
+                        ready[i] = time.perf_counter() - started
+                except httpx.HTTPError:
+                    pass
+            time.sleep(0.01)
+    finally:
+        for server in servers:
+            server.terminate()
+        for server in servers:
+            server.wait()
+    if len(ready) < workers:
+        raise RuntimeError(f"only {len(ready)} of {workers} workers answered within {timeout:g}s")
+    times = [ready[i] for i in range(workers)]
+    return {
+        "first_request_per_worker_ms": [round(t * 1000, 1) for t in times],
+        "first_request_median_ms": round(statistics.median(times) * 1000, 1),
+        "first_request_max_ms": round(max(times) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="bench_startup.db")
+    parser.add_argument("--feedback", type=int, default=20_000, help="Rows in the up-to-date database")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters timed for the import")
+    parser.add_argument("--port", type=int, default=8800, help="First of --workers consecutive ports")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--budget-import-ms", type=float, default=2000)
+    parser.add_argument("--budget-first-request-ms", type=float, default=5000)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    from benchmarks.seed import prepare
+
+    engine, _ = prepare(args.db, managers=50, employees_per_manager=10,
+                        unassigned_employees=20, feedback=args.feedback)
+    engine.dispose()
+    empty_db = os.path.join(tempfile.mkdtemp(prefix="bench_startup_"), "empty.db")
+
+    results = {}
+    for name, path in (("current", args.db), ("empty", empty_db)):
+        env = {**os.environ, "DATABASE_URL": f"sqlite:///{os.path.abspath(path)}",
+               "PDF_CACHE_DIR": tempfile.mkdtemp(prefix="bench_pdf_")}
+        result = {}
+        if name == "current":
+            result.update(measure_import(env, args.repeat))
+        result.update(first_request(env, args.workers, args.port, args.timeout))
+        results[name] = result
+
+    print(f"{args.workers} workers per start\n")
+    print(f"{'database':10} {'import':>10} {'first request (median)':>24} {'(slowest)':>12}")
+    for name, r in results.items():
+        import_ms = f"{r['import_median_ms']}ms" if "import_median_ms" in r else "-"
+        print(f"{name:10} {import_ms:>10} {r['first_request_median_ms']:>22}ms {r['first_request_max_ms']:>10}ms")
+
+    over = []
+    if results["current"]["import_median_ms"] > args.budget_import_ms:
+        over.append(f"import {results['current']['import_median_ms']}ms > {args.budget_import_ms:g}ms")
+    for name, r in results.items():
+        if r["first_request_max_ms"] > args.budget_first_request_ms:
+            over.append(f"{name} first request {r['first_request_max_ms']}ms > {args.budget_first_request_ms:g}ms")
+
+    if args.json:
+        report.write(args.json, "startup", vars(args), results, over_budget=over)
+    for path in (args.db, empty_db):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    if over:
+        print("\nOver budget: " + "; ".join(over))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
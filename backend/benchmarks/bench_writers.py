@@ -0,0 +1,142 @@
+"""
+Write throughput with several worker processes writing at once, the way
+gunicorn runs the app.
+
+Each writer process opens its own engine and creates feedback through
+crud.create_feedback (so stats counters and tag links are written too) for a
+fixed duration. Configurations:
+
+    sqlite-default   rollback journal, driver defaults (the old database.py)
+    sqlite-wal       database.build_engine(): WAL, synchronous=NORMAL, busy_timeout, mmap
+    postgresql       only with --postgres-url
+
+    cd backend
+    python -m benchmarks.bench_writers --writers 8 --seconds 10
+    python -m benchmarks.bench_writers --postgres-url postgresql+psycopg2://feedback@localhost/feedback_bench
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import time
+
+from sqlalchemy.orm import sessionmaker
+
+import crud, models, schemas
+from database import Base, build_engine
+from benchmarks.seed import seed
+
+
+def make_engine(config: str, url: str):
+    if config == "sqlite-default":
+        return build_engine(url, tune_sqlite=False, connect_args={"check_same_thread": False})
+    return build_engine(url)
+
+
+def writer(config: str, url: str, team: dict, seconds: float, seed_value: int, results):
+    engine = make_engine(config, url)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    rng = random.Random(seed_value)
+    sentiments = list(models.SentimentEnum)
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        manager_id = rng.choice(list(team))
+        feedback = schemas.FeedbackCreate(
+            strengths="Ships reliably.", improvements="Write more docs.",
+            sentiment=rng.choice(sentiments), employee_id=rng.choice(team[manager_id]),
+            tag_ids=rng.sample(range(1, 6), 2),
+        )
+        start = time.perf_counter()
+        with Session() as db:
+            try:
+                crud.create_feedback(db, feedback, manager_id)
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                db.rollback()
+                errors += 1
+    engine.dispose()
+    results.put((latencies, errors))
+
+
+def prepare(config: str, url: str, managers: int, employees_per_manager: int, feedback: int) -> dict:
+    engine = make_engine(config, url)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    ids = seed(engine, managers=managers, employees_per_manager=employees_per_manager,
+               unassigned_employees=0, feedback=feedback)
+    with engine.begin() as conn:
+        conn.execute(models.Tag.__table__.insert(), [{"id": i, "name": f"Tag {i}"} for i in range(1, 6)])
+    engine.dispose()
+    return ids["teams"]
+
+
+def run(config: str, url: str, args) -> dict:
+    team = prepare(config, url, args.managers, args.employees_per_manager, args.feedback)
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    processes = [
+        ctx.Process(target=writer, args=(config, url, team, args.seconds, i, results))
+        for i in range(args.writers)
+    ]
+    for p in processes:
+        p.start()
+    latencies, errors = [], 0
+    for _ in processes:
+        worker_latencies, worker_errors = results.get()
+        latencies.extend(worker_latencies)
+        errors += worker_errors
+    for p in processes:
+        p.join()
+    latencies.sort()
+    ms = lambda s: round(s * 1000, 2)
+    return {
+        "commits": len(latencies),
+        "errors": errors,
+        "commits_per_second": round(len(latencies) / args.seconds, 1),
+        "median_ms": ms(statistics.median(latencies)) if latencies else None,
+        "p95_ms": ms(latencies[max(0, int(len(latencies) * 0.95) - 1)]) if latencies else None,
+        "max_ms": ms(latencies[-1]) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--managers", type=int, default=50)
+    parser.add_argument("--employees-per-manager", type=int, default=10)
+    parser.add_argument("--feedback", type=int, default=50_000, help="Rows seeded before the run")
+    parser.add_argument("--postgres-url", help="Also run against this (disposable) PostgreSQL database")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    targets = [("sqlite-default", "bench_writers_default.db"), ("sqlite-wal", "bench_writers_wal.db")]
+    results = {}
+    for config, path in targets:
+        for suffix in ("", "-wal", "-shm", "-journal"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        results[config] = run(config, f"sqlite:///{path}", args)
+        for suffix in ("", "-wal", "-shm", "-journal"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    if args.postgres_url:
+        results["postgresql"] = run("postgresql", args.postgres_url, args)
+
+    print(f"{args.writers} writers for {args.seconds:g}s\n")
+    print(f"{'config':16} {'commits/s':>10} {'errors':>7} {'median':>9} {'p95':>9} {'max':>9}")
+    for config, r in results.items():
+        print(f"{config:16} {r['commits_per_second']:>10} {r['errors']:>7} "
+              f"{r['median_ms']:>7}ms {r['p95_ms']:>7}ms {r['max_ms']:>7}ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"benchmark": "writers", "params": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
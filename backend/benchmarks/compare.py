@@ -0,0 +1,70 @@
+"""
+Compare two benchmark result files scenario by scenario.
+
+    cd backend
+    python -m benchmarks.compare baseline.json candidate.json
+    python -m benchmarks.compare baseline.json candidate.json --metric p95_ms --fail-over 10
+
+Latencies (*_ms) that grow and throughput (rps) that drops by more than
+--fail-over percent are flagged as regressions, and the exit status is 1 so a
+CI job can gate on it.
+"""
+
+import argparse
+import json
+import sys
+
+DEFAULT_METRICS = ["median_ms", "p95_ms", "rps"]
+
+
+def higher_is_better(metric: str) -> bool:
+    return not metric.endswith("_ms")
+
+
+def compare(baseline: dict, candidate: dict, metrics: list, fail_over: float) -> tuple[list, list]:
+    """Rows of (scenario, metric, old, new, change %) and the subset that regressed"""
+    rows, regressions = [], []
+    for scenario, old in baseline["results"].items():
+        new = candidate["results"].get(scenario)
+        if new is None:
+            continue
+        for metric in metrics:
+            a, b = old.get(metric), new.get(metric)
+            if not isinstance(a, (int, float)) or not isinstance(b, (int, float)) or a == 0:
+                continue
+            change = (b - a) / a * 100
+            row = (scenario, metric, a, b, change)
+            rows.append(row)
+            worse = -change if higher_is_better(metric) else change
+            if worse > fail_over:
+                regressions.append(row)
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--metric", action="append", dest="metrics", help=f"Metric to compare (default {DEFAULT_METRICS})")
+    parser.add_argument("--fail-over", type=float, default=10, help="Regression threshold in percent")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    if baseline.get("benchmark") != candidate.get("benchmark"):
+        sys.exit(f"Cannot compare a {baseline.get('benchmark')} run with a {candidate.get('benchmark')} run")
+
+    rows, regressions = compare(baseline, candidate, args.metrics or DEFAULT_METRICS, args.fail_over)
+    print(f"{'scenario':34} {'metric':10} {'baseline':>10} {'candidate':>10} {'change':>8}")
+    for scenario, metric, a, b, change in rows:
+        flag = "  REGRESSION" if (scenario, metric, a, b, change) in regressions else ""
+        print(f"{scenario:34} {metric:10} {a:>10} {b:>10} {change:>+7.1f}%{flag}")
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.fail_over:g}%")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
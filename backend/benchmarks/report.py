@@ -0,0 +1,63 @@
+"""
+Machine-readable benchmark results.
+
+Every benchmark writes one JSON document:
+
+    {"benchmark": "crud", "params": {...}, "environment": {...}, "results": {scenario: {metric: value}}}
+
+Latency metrics end in _ms, throughput is rps. benchmarks.compare diffs two
+documents scenario by scenario.
+"""
+
+import json
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+
+def percentile(sorted_values: list, fraction: float):
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, int(len(sorted_values) * fraction + 0.5) - 1)]
+
+
+def summarize(latencies: list) -> dict:
+    """count/mean/median/p95/p99/max of latencies given in seconds"""
+    values = sorted(latencies)
+    ms = lambda s: round(s * 1000, 3) if s is not None else None
+    return {
+        "count": len(values),
+        "mean_ms": ms(statistics.fmean(values)) if values else None,
+        "median_ms": ms(statistics.median(values)) if values else None,
+        "p95_ms": ms(percentile(values, 0.95)),
+        "p99_ms": ms(percentile(values, 0.99)),
+        "max_ms": ms(values[-1]) if values else None,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def environment() -> dict:
+    import sqlalchemy
+    return {
+        "python": sys.version.split()[0],
+        "sqlalchemy": sqlalchemy.__version__,
+        "platform": platform.platform(),
+        "commit": _git_commit(),
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+def write(path: str, benchmark: str, params: dict, results: dict, **extra):
+    document = {"benchmark": benchmark, "params": params, "environment": environment(), **extra, "results": results}
+    with open(path, "w") as f:
+        json.dump(document, f, indent=2, default=str)
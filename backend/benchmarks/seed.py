@@ -0,0 +1,252 @@
+"""
+Synthetic data generator for benchmarks.
+
+Rows are written with bulk Core inserts straight into the tables (bypassing
+crud and the ORM unit of work), so multi-million row databases can be built
+in minutes. Generation is seeded, so the same arguments give the same data.
+
+seed() fills the base tables only. prepare() builds a complete database the
+way the app would see it: the schema from migrations.upgrade(), the seeded
+rows, then the derived tables (stats counters, rollups, org closure) rebuilt
+from them. It can also be run on its own to build a database once and reuse
+it across benchmark runs with --reuse:
+
+    cd backend
+    python -m benchmarks.seed --db bench.db --feedback 1000000 --password secret
+"""
+
+import argparse
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import create_engine, event, insert, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+import hierarchy, migrations, models, rollups, search, stats
+
+CHUNK_SIZE = 10_000
+
+DEFAULT_TAGS = [
+    "Leadership", "Communication", "Teamwork", "Technical Skills", "Problem Solving",
+    "Ownership", "Mentoring", "Delivery",
+]
+
+STRENGTHS = [
+    "Consistently delivers well-tested work.",
+    "Keeps the team unblocked with clear reviews.",
+    "Took ownership of the release and communicated every risk early.",
+    "Explains complex designs patiently to new joiners.",
+]
+IMPROVEMENTS = [
+    "Could share progress earlier.",
+    "Needs to push back on scope creep.",
+    "Documentation lags behind the code.",
+    "Should delegate more of the routine work.",
+]
+COMMENTS = ["Thanks, agreed.", "Will work on it this quarter.", "Can we discuss this in our 1:1?"]
+
+
+def sqlite_engine(path: str) -> Engine:
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def _fast_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=OFF")
+        cursor.close()
+
+    return engine
+
+
+def _insert_chunked(conn, table, rows):
+    for start in range(0, len(rows), CHUNK_SIZE):
+        conn.execute(insert(table), rows[start:start + CHUNK_SIZE])
+
+
+def seed(
+    engine: Engine,
+    managers: int = 1_000,
+    employees_per_manager: int = 20,
+    unassigned_employees: int = 500,
+    feedback: int = 2_000_000,
+    ack_ratio: float = 0.6,
+    comment_ratio: float = 0.3,
+    request_ratio: float = 0.1,
+    max_tags: int = 2,
+    tags: list[str] = DEFAULT_TAGS,
+    days: int = 3 * 365,
+    password: Optional[str] = None,
+    seed_value: int = 42,
+) -> dict:
+    """Fill an empty schema with a synthetic org. Returns ids useful for picking benchmark targets.
+
+    Users are manager<i>@example.com, employee<n>@example.com and
+    unassigned<i>@example.com. With `password` every user can log in with it
+    (it is hashed once); otherwise logins fail.
+    """
+    rng = random.Random(seed_value)
+    now = datetime.utcnow()
+    sentiments = list(models.SentimentEnum)
+    hashed_password = ""
+    if password:
+        from hashing import pwd_context
+        hashed_password = pwd_context.hash(password)
+
+    manager_ids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(managers)]
+    teams = {
+        manager_id: [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(employees_per_manager)]
+        for manager_id in manager_ids
+    }
+    users = [
+        {"id": manager_id, "name": f"Manager {i}", "email": f"manager{i}@example.com",
+         "hashed_password": hashed_password, "role": models.RoleEnum.manager, "manager_id": None}
+        for i, manager_id in enumerate(manager_ids)
+    ]
+    n = 0
+    for manager_id, team in teams.items():
+        for employee_id in team:
+            users.append({"id": employee_id, "name": f"Employee {n}", "email": f"employee{n}@example.com",
+                          "hashed_password": hashed_password, "role": models.RoleEnum.employee, "manager_id": manager_id})
+            n += 1
+    unassigned_ids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(unassigned_employees)]
+    for i, employee_id in enumerate(unassigned_ids):
+        users.append({"id": employee_id, "name": f"Unassigned {i}",
+                      "email": f"unassigned{i}@example.com", "hashed_password": hashed_password,
+                      "role": models.RoleEnum.employee, "manager_id": None})
+
+    with engine.begin() as conn:
+        _insert_chunked(conn, models.User.__table__, users)
+        # The migrations already seed the default tags
+        existing = set(conn.scalars(select(models.Tag.name)))
+        _insert_chunked(conn, models.Tag.__table__, [{"name": name} for name in tags if name not in existing])
+        tag_ids = list(conn.scalars(select(models.Tag.id).where(models.Tag.name.in_(tags)).order_by(models.Tag.id)))
+
+    feedback_rows, tag_rows, ack_rows, request_rows = [], [], [], []
+
+    def flush():
+        with engine.begin() as conn:
+            _insert_chunked(conn, models.Feedback.__table__, feedback_rows)
+            _insert_chunked(conn, models.feedback_tags, tag_rows)
+            _insert_chunked(conn, models.Acknowledgement.__table__, ack_rows)
+            _insert_chunked(conn, models.FeedbackRequest.__table__, request_rows)
+        for rows in (feedback_rows, tag_rows, ack_rows, request_rows):
+            rows.clear()
+
+    for _ in range(feedback):
+        manager_id = rng.choice(manager_ids)
+        employee_id = rng.choice(teams[manager_id])
+        created_at = now - timedelta(seconds=rng.randrange(days * 86400))
+        feedback_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        feedback_rows.append({
+            "id": feedback_id, "employee_id": employee_id, "manager_id": manager_id,
+            "strengths": rng.choice(STRENGTHS),
+            "improvements": rng.choice(IMPROVEMENTS),
+            "sentiment": rng.choice(sentiments), "created_at": created_at, "updated_at": created_at,
+        })
+        for tag_id in rng.sample(tag_ids, rng.randint(0, min(max_tags, len(tag_ids)))):
+            tag_rows.append({"feedback_id": feedback_id, "tag_id": tag_id})
+        if rng.random() < ack_ratio:
+            ack_rows.append({
+                "feedback_id": feedback_id, "employee_id": employee_id, "acknowledged": True,
+                "comment": rng.choice(COMMENTS) if rng.random() < comment_ratio else None,
+                "acknowledged_at": created_at + timedelta(hours=rng.randrange(1, 240)),
+            })
+        if rng.random() < request_ratio:
+            request_rows.append({
+                "employee_id": employee_id, "manager_id": manager_id, "message": "Any feedback on my last sprint?",
+                "created_at": created_at, "is_open": rng.random() < 0.3,
+            })
+        if len(feedback_rows) >= CHUNK_SIZE * 10:
+            flush()
+    flush()
+
+    return {"manager_ids": manager_ids, "teams": teams, "unassigned_ids": unassigned_ids, "tag_ids": tag_ids}
+
+
+def build_derived(engine: Engine):
+    """Recompute the tables crud maintains on every write, and the search index with its triggers"""
+    with engine.begin() as conn:
+        search.install(conn)
+    with Session(bind=engine) as db:
+        stats.rebuild_manager_stats(db)
+        rollups.rebuild(db)
+        hierarchy.rebuild(db)
+
+
+def load_ids(engine: Engine) -> dict:
+    """The ids seed() returned, read back from an existing database"""
+    users = models.User.__table__
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(users.c.id, users.c.role, users.c.manager_id).order_by(users.c.email)
+        ).all()
+        tag_ids = list(conn.scalars(select(models.Tag.id).order_by(models.Tag.id)))
+    manager_ids = [row.id for row in rows if row.role == models.RoleEnum.manager]
+    teams = {manager_id: [] for manager_id in manager_ids}
+    unassigned_ids = []
+    for row in rows:
+        if row.role != models.RoleEnum.employee:
+            continue
+        if row.manager_id in teams:
+            teams[row.manager_id].append(row.id)
+        else:
+            unassigned_ids.append(row.id)
+    return {"manager_ids": manager_ids, "teams": teams, "unassigned_ids": unassigned_ids, "tag_ids": tag_ids}
+
+
+def prepare(path: str, reuse: bool = False, **seed_args) -> tuple[Engine, dict]:
+    """A migrated, seeded SQLite database at `path` with its derived tables built.
+
+    With `reuse` an existing file is opened as it is and its ids are read back.
+    """
+    if reuse and os.path.exists(path):
+        engine = sqlite_engine(path)
+        return engine, load_ids(engine)
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    engine = sqlite_engine(path)
+    migrations.upgrade(engine)
+    with engine.begin() as conn:
+        # Indexing row by row dominates a bulk load; build_derived() indexes everything at once
+        search.drop_triggers(conn)
+    ids = seed(engine, **seed_args)
+    build_derived(engine)
+    return engine, ids
+
+
+def add_seed_arguments(parser: argparse.ArgumentParser, feedback: int = 100_000):
+    parser.add_argument("--db", default="bench.db")
+    parser.add_argument("--reuse", action="store_true", help="Use an existing --db as it is instead of reseeding")
+    parser.add_argument("--managers", type=int, default=200)
+    parser.add_argument("--employees-per-manager", type=int, default=10)
+    parser.add_argument("--feedback", type=int, default=feedback)
+    parser.add_argument("--seed", type=int, default=42, dest="seed_value")
+
+
+def seed_arguments(args: argparse.Namespace) -> dict:
+    return {"managers": args.managers, "employees_per_manager": args.employees_per_manager,
+            "feedback": args.feedback, "seed_value": args.seed_value}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a seeded benchmark database")
+    add_seed_arguments(parser, feedback=1_000_000)
+    parser.add_argument("--unassigned", type=int, default=500)
+    parser.add_argument("--password", help="Let every user log in with this password")
+    args = parser.parse_args()
+    args.reuse = False
+
+    start = time.perf_counter()
+    engine, ids = prepare(args.db, unassigned_employees=args.unassigned, password=args.password,
+                          **seed_arguments(args))
+    engine.dispose()
+    print(f"Seeded {args.db}: {len(ids['manager_ids'])} managers, "
+          f"{sum(map(len, ids['teams'].values())) + len(ids['unassigned_ids'])} employees, "
+          f"{args.feedback} feedback in {time.perf_counter() - start:.1f}s")
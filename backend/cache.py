@@ -0,0 +1,193 @@
+"""
+In-process caches, and a tagged cache that can also sit on a shared server.
+"""
+
+import math
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after `ttl` seconds"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl: float = None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class LocalClient:
+    """In-process stand-in for a redis-py client, with just what SharedBackend uses.
+
+    Two SharedBackends on one LocalClient behave like two workers sharing a
+    server, which is how `python query_cache.py check` exercises invalidation.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, raw = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            return raw
+
+    def set(self, key, value, ex: int = None):
+        if not isinstance(value, bytes):
+            raise TypeError(f"LocalClient stores bytes, not {type(value).__name__}")
+        with self._lock:
+            self._data[key] = (None if ex is None else time.monotonic() + ex, value)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class SharedBackend:
+    """Cache storage on a shared key-value server, through a redis-py compatible client.
+
+    Anything with get(key), set(key, value, ex=seconds) and delete(key) works:
+    redis.Redis in production, LocalClient in checks.
+    """
+
+    def __init__(self, client, prefix: str = "feedback:"):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key, default=None):
+        raw = self.client.get(self.prefix + key)
+        return default if raw is None else pickle.loads(raw)
+
+    def set(self, key, value, ttl: float):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=max(1, math.ceil(ttl)))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def stats(self) -> dict:
+        return {}
+
+
+class TaggedCache:
+    """Cache whose entries are invalidated by tag.
+
+    Each tag has a token in the backend. An entry remembers the tokens of its
+    tags when it is stored and is only served while they are all unchanged, so
+    invalidating a tag is a single write however many entries carry it, and
+    works the same on a per-process TTLCache or a SharedBackend. A token that
+    has been evicted or expired is replaced, which only costs a miss.
+
+    Take the tokens with tokens() before loading a value and store it under
+    them, so an invalidation that lands during the load leaves the entry stale
+    rather than labelling old data with the new token.
+    """
+
+    def __init__(self, backend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _token(self, tag: str, create: bool):
+        token = self.backend.get("tag:" + tag, _MISSING)
+        if token is _MISSING and create:
+            token = uuid.uuid4().hex
+            # Outlive the entries that depend on the token
+            self.backend.set("tag:" + tag, token, ttl=self.ttl * 10)
+        return token
+
+    def get(self, key: str, tags, default=None):
+        entry = self.backend.get("entry:" + key, _MISSING)
+        if entry is not _MISSING:
+            tokens, value = entry
+            if all(self._token(tag, create=False) == token for tag, token in zip(tags, tokens)):
+                with self._lock:
+                    self.hits += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return default
+
+    def tokens(self, tags) -> tuple:
+        """Current tokens of `tags`, created where missing"""
+        return tuple(self._token(tag, create=True) for tag in tags)
+
+    def set(self, key: str, tokens: tuple, value):
+        """Store `value` under the `tokens` taken before it was loaded"""
+        self.backend.set("entry:" + key, (tokens, value), ttl=self.ttl)
+
+    def invalidate(self, *tags: str):
+        for tag in tags:
+            self.backend.set("tag:" + tag, uuid.uuid4().hex, ttl=self.ttl * 10)
+        with self._lock:
+            self.invalidations += len(tags)
+
+    def stats(self) -> dict:
+        backend = self.backend.stats()
+        return {
+            "backend": type(self.backend).__name__,
+            "ttl": self.ttl,
+            "size": backend.get("size"),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": backend.get("evictions"),
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,218 @@
+"""
+Response compression.
+
+CompressionMiddleware compresses API responses on the fly with brotli (when
+the brotli package is installed) or gzip, whichever the client's
+Accept-Encoding prefers. It only compresses text-like content types. A
+complete body below COMPRESSION_MIN_BYTES is sent as it is. Streamed bodies
+(exports, ZIPs of text) are compressed chunk by chunk and flushed, so clients
+still receive each chunk as soon as it is produced. Event streams, PDFs and
+ZIPs are left alone.
+
+PrecompressedStaticFiles serves the frontend build. When the client accepts
+it, `app.js` is answered with the `app.js.br` or `app.js.gz` written next to
+it at build time (see frontend/scripts/precompress.mjs), so nothing is
+compressed per request. Hashed files under assets/ never change, so they are
+cached for a year as immutable; everything else (index.html) is revalidated.
+
+Settings:
+
+    COMPRESSION                   false disables the middleware
+    COMPRESSION_MIN_BYTES         smallest body worth compressing (default 1024)
+    COMPRESSION_GZIP_LEVEL        1-9 (default 6)
+    COMPRESSION_BROTLI_QUALITY    0-11 (default 4; higher is much slower for on-the-fly use)
+"""
+
+import os
+import re
+import zlib
+from mimetypes import guess_type
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION = os.getenv("COMPRESSION", "true").lower() in ("1", "true", "yes")
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+# Server preference when the client weighs several encodings equally
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+COMPRESSIBLE_TYPES = (
+    "application/json", "application/x-ndjson", "application/javascript", "application/xml",
+    "image/svg+xml", "text/html", "text/css", "text/csv", "text/javascript", "text/plain", "text/xml",
+)
+
+# Files precompressed at build time, by encoding
+PRECOMPRESSED_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+# Vite writes assets/<name>-<hash>.<ext>; a changed file gets a new name
+HASHED_ASSET = re.compile(r"(^|/)assets/.+[.-][A-Za-z0-9_-]{8,}\.[A-Za-z0-9]+$")
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+
+def negotiate(accept_encoding: str, encodings=ENCODINGS) -> list[str]:
+    """`encodings` the client accepts, best first: by its q-values, then by our order"""
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name] = q
+    ranked = [(weights.get(encoding, weights.get("*", 0.0)), -i, encoding) for i, encoding in enumerate(encodings)]
+    return [encoding for q, _, encoding in sorted(ranked, reverse=True) if q > 0]
+
+
+def _compressible(headers: MutableHeaders) -> bool:
+    content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+    return content_type in COMPRESSIBLE_TYPES and "no-transform" not in headers.get("cache-control", "")
+
+
+def _add_vary(headers: MutableHeaders):
+    vary = headers.get("vary")
+    if not vary:
+        headers["Vary"] = "Accept-Encoding"
+    elif "accept-encoding" not in vary.lower():
+        headers["Vary"] = f"{vary}, Accept-Encoding"
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+        else:
+            self._brotli = None
+            self._zlib = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        """Compress `data`; with `flush` everything so far is emitted so the client can decode it now"""
+        if self._brotli is not None:
+            out = self._brotli.process(data)
+            return out + self._brotli.flush() if flush else out
+        out = self._zlib.compress(data)
+        return out + self._zlib.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self._brotli is not None:
+            return self._brotli.process(data) + self._brotli.finish()
+        return self._zlib.compress(data) + self._zlib.flush()
+
+
+class CompressionMiddleware:
+    """ASGI middleware that compresses responses the client accepts compressed"""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        accepted = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if not accepted:
+            return await self.app(scope, receive, send)
+
+        encoding = accepted[0]
+        start = None
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, compressor, passthrough
+            if passthrough:
+                return await send(message)
+            if message["type"] == "http.response.start":
+                # Held back until the first body chunk shows how large the response is
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                return await send(message)
+
+            body, more_body = message.get("body", b""), message.get("more_body", False)
+            if compressor is None:
+                headers = MutableHeaders(raw=start["headers"])
+                if not _compressible(headers) or "content-encoding" in headers or start["status"] in (204, 304):
+                    passthrough = True
+                    await send(start)
+                    return await send(message)
+                _add_vary(headers)
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start)
+                    return await send(message)
+
+                compressor = _Compressor(encoding)
+                headers["Content-Encoding"] = encoding
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    # Same resource, different bytes: a strong validator no longer holds
+                    headers["ETag"] = f"W/{etag}"
+                if more_body:
+                    del headers["Content-Length"]
+                    await send(start)
+                    return await send({"type": "http.response.body", "body": compressor.compress(body, flush=True),
+                                       "more_body": True})
+                body = compressor.finish(body)
+                headers["Content-Length"] = str(len(body))
+                await send(start)
+                return await send({"type": "http.response.body", "body": body})
+
+            if more_body:
+                body = compressor.compress(body, flush=True)
+            else:
+                body = compressor.finish(body)
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that prefers build-time .br/.gz siblings and sets long-lived cache headers on hashed assets"""
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        full_path = os.fspath(full_path)
+        media_type = guess_type(full_path)[0] or "text/plain"
+
+        response = None
+        candidates = negotiate(request_headers.get("accept-encoding", ""), tuple(PRECOMPRESSED_SUFFIXES))
+        for encoding in candidates:
+            compressed = full_path + PRECOMPRESSED_SUFFIXES[encoding]
+            try:
+                compressed_stat = os.stat(compressed)
+            except OSError:
+                continue
+            response = FileResponse(compressed, status_code=status_code, stat_result=compressed_stat,
+                                    media_type=media_type, headers={"Content-Encoding": encoding})
+            break
+        if response is None:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, media_type=media_type)
+
+        relative = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+        response.headers["Cache-Control"] = IMMUTABLE if HASHED_ASSET.search(relative) else REVALIDATE
+        if any(os.path.exists(full_path + suffix) for suffix in PRECOMPRESSED_SUFFIXES.values()):
+            _add_vary(response.headers)
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def install(app):
+    """Compress `app`'s responses unless COMPRESSION is off"""
+    if COMPRESSION:
+        app.add_middleware(CompressionMiddleware)
@@ -1,16 +1,117 @@
-from sqlalchemy.orm import Session, joinedload
-import models, schemas
-from passlib.context import CryptContext
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session, aliased, joinedload, load_only, make_transient_to_detached, selectinload
+import models, hierarchy, schemas, stats, rollups, pagination, principals, query_cache, versions, events
+from database import dialect_insert
+from tag_registry import tag_registry
+from hashing import pwd_context
+from collections import Counter
 from datetime import datetime
-from typing import Optional
+from typing import Iterable, Optional
+import uuid
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# --- Statement builders ---
+# Shared by the functions below and by async_crud, so both paths run the same SQL.
+
+def user_by_email_query(email: str):
+    return select(models.User).where(models.User.email == email)
+
+def team_members_query(manager_id: str):
+    return select(models.User).where(
+        models.User.role == models.RoleEnum.employee,
+        models.User.manager_id == manager_id
+    )
+
+def available_employees_query():
+    return select(models.User).where(
+        models.User.role == models.RoleEnum.employee,
+        models.User.manager_id.is_(None)
+    )
+
+def open_feedback_requests_query(manager_id: str):
+    return select(models.FeedbackRequest).options(
+        joinedload(models.FeedbackRequest.employee)
+    ).where(
+        models.FeedbackRequest.manager_id == manager_id,
+        models.FeedbackRequest.is_open == True
+    )
+
+def feedback_details_query():
+    """Feedback with everything FeedbackOut and the PDF report read"""
+    return select(models.Feedback).options(
+        joinedload(models.Feedback.employee),
+        joinedload(models.Feedback.manager),
+        selectinload(models.Feedback.tags),
+        joinedload(models.Feedback.acknowledgment)
+    )
+
+def feedback_owners_query(feedback_id: str):
+    """Just enough of a feedback row to build its HTTP validator"""
+    return select(models.Feedback.manager_id, models.Feedback.employee_id).where(models.Feedback.id == feedback_id)
+
+def given_by(manager_id: str, include_subtree: bool = False):
+    """Feedback given by the manager or, with include_subtree, by them or anyone below them"""
+    if include_subtree:
+        return models.Feedback.manager_id.in_(hierarchy.subtree_query(manager_id))
+    return models.Feedback.manager_id == manager_id
+
+def feedback_filters(
+    feedback_ids: Optional[list[str]] = None,
+    manager_id: Optional[str] = None,
+    employee_id: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    include_subtree: bool = False
+) -> list:
+    """WHERE clauses for feedback matching all given filters"""
+    clauses = []
+    if feedback_ids is not None:
+        clauses.append(models.Feedback.id.in_(feedback_ids))
+    if manager_id is not None:
+        clauses.append(given_by(manager_id, include_subtree))
+    if employee_id is not None:
+        clauses.append(models.Feedback.employee_id == employee_id)
+    if start is not None:
+        clauses.append(models.Feedback.created_at >= start)
+    if end is not None:
+        clauses.append(models.Feedback.created_at < end)
+    return clauses
+
+def feedback_details_bulk_query(
+    feedback_ids: Optional[list[str]] = None,
+    manager_id: Optional[str] = None,
+    employee_id: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    include_subtree: bool = False
+):
+    """Fully loaded feedback matching all given filters, oldest first"""
+    return (
+        feedback_details_query()
+        .where(*feedback_filters(feedback_ids, manager_id, employee_id, start, end, include_subtree))
+        .order_by(models.Feedback.created_at, models.Feedback.id)
+    )
+
+def feedback_access_query(**filters):
+    """(id, manager_id, employee_id) of the feedback matching `filters`, for access checks"""
+    feedback = models.Feedback
+    return select(feedback.id, feedback.manager_id, feedback.employee_id).where(*feedback_filters(**filters))
+
+def feedback_count_query(**filters):
+    return select(func.count()).select_from(models.Feedback).where(*feedback_filters(**filters))
+
+def user_listing_tags(user) -> tuple:
+    """query_cache tags of the listings a new or reassigned user appears in"""
+    if user.role != models.RoleEnum.employee:
+        return ()
+    return query_cache.team(user.manager_id), query_cache.AVAILABLE
 
 def get_user_by_email(db: Session, email: str):
-    return db.query(models.User).filter(models.User.email == email).first()
+    return db.scalars(user_by_email_query(email)).first()
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = pwd_context.hash(user.password)
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: Optional[str] = None):
+    """Create a user. Pass `hashed_password` when the password was already hashed off the request path."""
+    if hashed_password is None:
+        hashed_password = pwd_context.hash(user.password)
     db_user = models.User(
         email=user.email, 
         name=user.name, 
@@ -19,33 +120,47 @@ def create_user(db: Session, user: schemas.UserCreate):
         manager_id=user.manager_id
     )
     db.add(db_user)
+    db.flush()
+    hierarchy.add_user(db, db_user.id, user.manager_id)
+    if user.manager_id:
+        versions.bump(db, versions.team(user.manager_id))
     db.commit()
     db.refresh(db_user)
+    principals.invalidate(db_user.email)
+    query_cache.invalidate(*user_listing_tags(db_user))
     return db_user
 
+def update_user_password(db: Session, user: models.User, hashed_password: str):
+    user.hashed_password = hashed_password
+    db.commit()
+    db.refresh(user)
+    principals.invalidate(user.email)
+    return user
+
 def get_team_members(db: Session, manager_id: str):
     """Get all employees assigned to a specific manager"""
-    return db.query(models.User).filter(
-        models.User.role == models.RoleEnum.employee,
-        models.User.manager_id == manager_id
-    ).all()
+    return db.scalars(team_members_query(manager_id)).all()
 
 def assign_employee_to_manager(db: Session, employee_id: str, manager_id: str):
     """Assign an employee to a manager"""
     employee = db.query(models.User).filter(models.User.id == employee_id).first()
     if employee and employee.role == models.RoleEnum.employee:
+        if hierarchy.would_create_cycle(db, [employee_id], manager_id):
+            return None
+        hierarchy.move(db, [employee_id], manager_id)
+        versions.bump(db, versions.team(manager_id), versions.team(employee.manager_id), versions.employee(employee_id))
+        previous_manager_id = employee.manager_id
         employee.manager_id = manager_id
         db.commit()
         db.refresh(employee)
+        principals.invalidate(employee.email)
+        query_cache.invalidate(query_cache.team(manager_id), query_cache.team(previous_manager_id), query_cache.AVAILABLE)
         return employee
     return None
 
 def get_available_employees(db: Session):
     """Get all employees not assigned to any manager"""
-    return db.query(models.User).filter(
-        models.User.role == models.RoleEnum.employee,
-        models.User.manager_id.is_(None)
-    ).all()
+    return db.scalars(available_employees_query()).all()
 
 def get_feedback_by_manager(db: Session, manager_id: str):
     return db.query(models.Feedback).filter(models.Feedback.manager_id == manager_id).all()
@@ -53,22 +168,40 @@ def get_feedback_by_manager(db: Session, manager_id: str):
 def get_feedback_for_employee(db: Session, employee_id: str):
     return db.query(models.Feedback).filter(models.Feedback.employee_id == employee_id).options(joinedload(models.Feedback.tags)).all()
 
+def _registered_tags(db: Session, tag_ids) -> list[models.Tag]:
+    """Tag instances for the known ids, attached to the session without querying the tags table"""
+    tags = []
+    for tag_id, name in tag_registry.resolve(db, tag_ids).items():
+        tag = models.Tag(id=tag_id, name=name)
+        make_transient_to_detached(tag)
+        tags.append(db.merge(tag, load=False))
+    return tags
+
 def create_feedback(db: Session, feedback: schemas.FeedbackCreate, manager_id: str):
+    now = datetime.utcnow()
     db_feedback = models.Feedback(
         strengths=feedback.strengths,
         improvements=feedback.improvements,
         sentiment=feedback.sentiment,
         employee_id=feedback.employee_id,
-        manager_id=manager_id
+        manager_id=manager_id,
+        created_at=now,
+        updated_at=now
     )
     
     if feedback.tag_ids:
-        tags = db.query(models.Tag).filter(models.Tag.id.in_(feedback.tag_ids)).all()
-        db_feedback.tags.extend(tags)
+        db_feedback.tags.extend(_registered_tags(db, feedback.tag_ids))
 
     db.add(db_feedback)
+    stats.record_feedback_created(db, manager_id, feedback.sentiment)
+    rollups.record_feedback_created(db, [{
+        "manager_id": manager_id, "employee_id": feedback.employee_id, "sentiment": feedback.sentiment,
+        "created_at": now, "tag_ids": [tag.id for tag in db_feedback.tags],
+    }])
+    versions.bump(db, *versions.feedback_keys(manager_id, feedback.employee_id))
     db.commit()
     db.refresh(db_feedback)
+    events.feedback_changed(events.FEEDBACK_CREATED, db_feedback)
     return db_feedback
 
 def get_feedback_for_manager(db: Session, manager_id: str):
@@ -78,8 +211,187 @@ def get_feedback_for_manager(db: Session, manager_id: str):
         joinedload(models.Feedback.acknowledgment)
     ).all()
 
+_feedback_relationship_loaders = {
+    "employee": lambda: joinedload(models.Feedback.employee),
+    "acknowledgment": lambda: joinedload(models.Feedback.acknowledgment),
+    "tags": lambda: selectinload(models.Feedback.tags),
+}
+
+def feedback_timeline_query(
+    db: Session,
+    manager_id: Optional[str] = None,
+    employee_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    fields: Optional[list[str]] = None,
+    include_subtree: bool = False
+):
+    """Build the newest-first timeline statement; rows are (Feedback, sort_key).
+
+    One extra row beyond `limit` is fetched so callers can tell whether there is a next page.
+    """
+    sort_key = pagination.sort_key_column(db, models.Feedback.created_at)
+    stmt = select(models.Feedback, sort_key.label("sort_key"))
+
+    relationships = schemas.FEEDBACK_RELATIONSHIP_FIELDS if fields is None else [
+        name for name in fields if name in schemas.FEEDBACK_RELATIONSHIP_FIELDS
+    ]
+    if fields is not None:
+        columns = {"id", "created_at"} | {name for name in fields if name not in schemas.FEEDBACK_RELATIONSHIP_FIELDS}
+        stmt = stmt.options(load_only(*(getattr(models.Feedback, name) for name in sorted(columns))))
+    stmt = stmt.options(*(_feedback_relationship_loaders[name]() for name in relationships))
+    return _timeline_page(stmt, sort_key, manager_id, employee_id, cursor, limit, include_subtree)
+
+def _timeline_page(stmt, sort_key, manager_id, employee_id, cursor, limit, include_subtree):
+    """Filter a timeline statement to its owner and cursor, newest first, one row past `limit`"""
+    if manager_id is not None:
+        stmt = stmt.where(given_by(manager_id, include_subtree))
+    if employee_id is not None:
+        stmt = stmt.where(models.Feedback.employee_id == employee_id)
+    if cursor:
+        stmt = stmt.where(pagination.older_than(sort_key, models.Feedback.id, cursor))
+
+    stmt = stmt.order_by(sort_key.desc(), models.Feedback.id.desc())
+    if limit is not None:
+        stmt = stmt.limit(limit + 1)
+    return stmt
+
+def paginate_rows(rows, limit: Optional[int], last_id):
+    """Drop the look-ahead row; returns (rows, next_cursor). `last_id(row)` is the feedback id of a row."""
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = pagination.encode_cursor(last.sort_key, last_id(last))
+    return rows, next_cursor
+
+def paginate_timeline(rows, limit: Optional[int]):
+    """Split fetched (Feedback, sort_key) rows into (items, next_cursor)"""
+    rows, next_cursor = paginate_rows(rows, limit, lambda row: row.Feedback.id)
+    return [row.Feedback for row in rows], next_cursor
+
+# --- Timeline rows without ORM objects ---
+# Full timelines can be thousands of rows. Building Feedback, User and
+# Acknowledgement objects for each and validating them through FeedbackOut
+# costs far more than the query, so this path selects the FeedbackOut columns
+# as plain tuples and builds the response dicts directly. The output matches
+# FeedbackOut's JSON exactly; keep the two in step when FeedbackOut changes.
+_timeline_employee = aliased(models.User)
+
+def feedback_timeline_rows_query(
+    db: Session,
+    manager_id: Optional[str] = None,
+    employee_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    include_subtree: bool = False
+):
+    """feedback_timeline_query with every FeedbackOut field as a labelled column"""
+    feedback, employee, ack = models.Feedback, _timeline_employee, models.Acknowledgement
+    sort_key = pagination.sort_key_column(db, feedback.created_at)
+    stmt = (
+        select(
+            feedback.id, feedback.employee_id, feedback.manager_id, feedback.strengths, feedback.improvements,
+            feedback.sentiment, feedback.created_at, feedback.updated_at,
+            employee.id.label("employee__id"), employee.name.label("employee__name"),
+            employee.email.label("employee__email"), employee.role.label("employee__role"),
+            employee.manager_id.label("employee__manager_id"),
+            ack.id.label("ack__id"), ack.acknowledged.label("ack__acknowledged"),
+            ack.comment.label("ack__comment"), ack.acknowledged_at.label("ack__acknowledged_at"),
+            sort_key.label("sort_key"),
+        )
+        .outerjoin(employee, employee.id == feedback.employee_id)
+        .outerjoin(ack, ack.feedback_id == feedback.id)
+    )
+    return _timeline_page(stmt, sort_key, manager_id, employee_id, cursor, limit, include_subtree)
+
+def feedback_tags_query(feedback_ids: list[str]):
+    """(feedback_id, tag id, tag name) for `feedback_ids`, in the order the tags relationship loads them"""
+    link = models.feedback_tags
+    return (
+        select(link.c.feedback_id, models.Tag.id, models.Tag.name)
+        .join(models.Tag, models.Tag.id == link.c.tag_id)
+        .where(link.c.feedback_id.in_(feedback_ids))
+        .order_by(link.c.feedback_id, link.c.tag_id)
+    )
+
+def id_chunks(ids: list, size: int = 500):
+    # Keep IN lists well under SQLite's bound-parameter limit on whole-history timelines
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+def feedback_out_dicts(rows, tag_rows) -> list[dict]:
+    """FeedbackOut-shaped dicts from feedback_timeline_rows_query and feedback_tags_query rows"""
+    tags = {}
+    for feedback_id, tag_id, name in tag_rows:
+        tags.setdefault(feedback_id, []).append({"name": name, "id": tag_id})
+    items = []
+    # Positional unpacking is several times faster than Row attribute access at this volume
+    for (feedback_id, employee_id, manager_id, strengths, improvements, sentiment, created_at, updated_at,
+         employee__id, employee__name, employee__email, employee__role, employee__manager_id,
+         ack__id, ack__acknowledged, ack__comment, ack__acknowledged_at, _) in rows:
+        items.append({
+            "strengths": strengths,
+            "improvements": improvements,
+            "sentiment": sentiment.value,
+            "id": feedback_id,
+            "employee_id": employee_id,
+            "manager_id": manager_id,
+            "created_at": created_at,
+            "updated_at": updated_at,
+            "employee": None if employee__id is None else {
+                "name": employee__name,
+                "email": employee__email,
+                "role": employee__role.value,
+                "id": employee__id,
+                "manager_id": employee__manager_id,
+            },
+            "acknowledgment": None if ack__id is None else {
+                "acknowledged": ack__acknowledged,
+                "comment": ack__comment,
+                "acknowledged_at": ack__acknowledged_at,
+            },
+            "tags": tags.get(feedback_id, []),
+        })
+    return items
+
+def get_feedback_timeline_rows(
+    db: Session,
+    manager_id: Optional[str] = None,
+    employee_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    include_subtree: bool = False
+):
+    """get_feedback_timeline as FeedbackOut-shaped dicts. Returns (items, next_cursor)."""
+    stmt = feedback_timeline_rows_query(db, manager_id, employee_id, cursor, limit, include_subtree)
+    rows, next_cursor = paginate_rows(db.execute(stmt).all(), limit, lambda row: row.id)
+    ids = [row.id for row in rows]
+    tag_rows = [tag_row for chunk in id_chunks(ids) for tag_row in db.execute(feedback_tags_query(chunk))]
+    return feedback_out_dicts(rows, tag_rows), next_cursor
+
+def get_feedback_timeline(
+    db: Session,
+    manager_id: Optional[str] = None,
+    employee_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    fields: Optional[list[str]] = None,
+    include_subtree: bool = False
+):
+    """Get a page of feedback ordered newest-first. Returns (items, next_cursor).
+
+    `limit=None` returns the whole history. `fields` restricts which columns and
+    relationships are loaded. `include_subtree` adds feedback given by everyone
+    below `manager_id`. Raises ValueError for an invalid cursor.
+    """
+    stmt = feedback_timeline_query(db, manager_id, employee_id, cursor, limit, fields, include_subtree)
+    return paginate_timeline(db.execute(stmt).all(), limit)
+
 def acknowledge_feedback(db: Session, feedback_id: str, employee_id: str, comment: Optional[str] = None):
     db_acknowledgement = db.query(models.Acknowledgement).filter_by(feedback_id=feedback_id, employee_id=employee_id).first()
+    manager_id = db.query(models.Feedback.manager_id).filter(models.Feedback.id == feedback_id).scalar()
+    now = datetime.utcnow()
 
     if not db_acknowledgement:
         db_acknowledgement = models.Acknowledgement(
@@ -87,18 +399,23 @@ def acknowledge_feedback(db: Session, feedback_id: str, employee_id: str, commen
             employee_id=employee_id
         )
         db.add(db_acknowledgement)
+        if manager_id:
+            stats.record_acknowledged(db, manager_id)
+        rollups.record_acknowledged(db, [feedback_id], now)
+    versions.bump(db, *versions.feedback_keys(manager_id, employee_id))
 
     db_acknowledgement.acknowledged = True
     db_acknowledgement.comment = comment
-    db_acknowledgement.acknowledged_at = datetime.utcnow()
+    db_acknowledgement.acknowledged_at = now
     db.commit()
     db.refresh(db_acknowledgement)
+    events.acknowledged(db_acknowledgement, manager_id)
     return db_acknowledgement
 
 def get_employee_feedback_with_acknowledgements(db: Session, employee_id: str):
     """Get feedback with acknowledgment information for employees"""
     return db.query(models.Feedback).options(
-        joinedload(models.Feedback.acknowledgements)
+        joinedload(models.Feedback.acknowledgment)
     ).filter(models.Feedback.employee_id == employee_id).all()
 
 def get_feedback_by_id(db: Session, feedback_id: str):
@@ -110,51 +427,43 @@ def get_feedback_by_id(db: Session, feedback_id: str):
 def update_feedback(db: Session, feedback_id: str, feedback_update: schemas.FeedbackUpdate):
     db_feedback = db.query(models.Feedback).filter(models.Feedback.id == feedback_id).first()
     if db_feedback:
+        old_sentiment = db_feedback.sentiment
         update_data = feedback_update.model_dump(exclude_unset=True)
         for key, value in update_data.items():
             setattr(db_feedback, key, value)
         db_feedback.updated_at = datetime.utcnow()
+        if db_feedback.sentiment != old_sentiment:
+            stats.record_sentiment_changed(db, db_feedback.manager_id, old_sentiment, db_feedback.sentiment)
+            rollups.record_sentiment_changed(db, feedback_id, old_sentiment, db_feedback.sentiment)
+        versions.bump(db, *versions.feedback_keys(db_feedback.manager_id, db_feedback.employee_id))
         db.commit()
         db.refresh(db_feedback)
+        events.feedback_changed(events.FEEDBACK_UPDATED, db_feedback)
     return db_feedback
 
 def get_manager_dashboard_stats(db: Session, manager_id: str):
     """Get comprehensive dashboard statistics including acknowledgments"""
-    feedbacks = db.query(models.Feedback).options(
-        joinedload(models.Feedback.acknowledgment)
-    ).filter(models.Feedback.manager_id == manager_id).all()
-    
-    count = len(feedbacks)
-    sentiments = {s.value: 0 for s in models.SentimentEnum}
-    acknowledged_count = 0
-    
-    for fb in feedbacks:
-        sentiments[fb.sentiment.value] += 1
-        if fb.acknowledgment:
-            acknowledged_count += 1
-    
-    return {
-        "feedback_count": count,
-        "acknowledged_count": acknowledged_count,
-        "pending_acknowledgment": count - acknowledged_count,
-        "acknowledgment_rate": round((acknowledged_count / count * 100) if count > 0 else 0, 1),
-        "sentiment_trends": sentiments
-    }
+    return stats.get_manager_dashboard_stats(db, manager_id)
 
 def get_tags(db: Session):
-    return db.query(models.Tag).all()
+    return tag_registry.all(db)
 
 def get_or_create_tags(db: Session, tag_names: list[str]) -> list[models.Tag]:
-    created_tags = []
-    for name in tag_names:
-        tag = db.query(models.Tag).filter(models.Tag.name == name).first()
-        if not tag:
-            tag = models.Tag(name=name)
-            db.add(tag)
-            db.commit()
-            db.refresh(tag)
-        created_tags.append(tag)
-    return created_tags
+    """Create any missing tags with one INSERT ... ON CONFLICT DO NOTHING, then fetch them all"""
+    names = list(dict.fromkeys(tag_names))
+    if not names:
+        return []
+    result = db.execute(
+        dialect_insert(db.get_bind(), models.Tag.__table__)
+        .values([{"name": name} for name in names])
+        .on_conflict_do_nothing(index_elements=["name"])
+    )
+    if result.rowcount:
+        versions.bump(db, versions.TAGS)
+    db.commit()
+    tag_registry.invalidate()
+    tags = {tag.name: tag for tag in db.query(models.Tag).filter(models.Tag.name.in_(names))}
+    return [tags[name] for name in names]
 
 def create_feedback_request(db: Session, employee_id: str, manager_id: str, message: Optional[str] = None):
     db_request = models.FeedbackRequest(
@@ -165,15 +474,12 @@ def create_feedback_request(db: Session, employee_id: str, manager_id: str, mess
     db.add(db_request)
     db.commit()
     db.refresh(db_request)
+    query_cache.invalidate(query_cache.open_requests(manager_id))
+    events.feedback_request_changed(events.REQUEST_CREATED, db_request)
     return db_request
 
 def get_open_feedback_requests(db: Session, manager_id: str):
-    return db.query(models.FeedbackRequest).options(
-        joinedload(models.FeedbackRequest.employee)
-    ).filter(
-        models.FeedbackRequest.manager_id == manager_id,
-        models.FeedbackRequest.is_open == True
-    ).all()
+    return db.scalars(open_feedback_requests_query(manager_id)).all()
 
 def close_feedback_request(db: Session, request_id: int):
     db_request = db.query(models.FeedbackRequest).filter(models.FeedbackRequest.id == request_id).first()
@@ -181,12 +487,188 @@ def close_feedback_request(db: Session, request_id: int):
         db_request.is_open = False
         db.commit()
         db.refresh(db_request)
+        query_cache.invalidate(query_cache.open_requests(db_request.manager_id))
+        events.feedback_request_changed(events.REQUEST_CLOSED, db_request)
     return db_request
 
 def get_feedback_details(db: Session, feedback_id: str):
-    return db.query(models.Feedback).options(
-        joinedload(models.Feedback.employee),
-        joinedload(models.Feedback.manager),
-        joinedload(models.Feedback.tags),
-        joinedload(models.Feedback.acknowledgment)
-    ).filter(models.Feedback.id == feedback_id).first()
\ No newline at end of file
+    return db.scalars(feedback_details_query().where(models.Feedback.id == feedback_id)).first()
+
+def can_view_feedback(feedback: models.Feedback, user_id: str, managers: Iterable[str] = ()) -> bool:
+    """Only the manager who gave the feedback and the employee who received it may view it.
+
+    Pass the ids of the managers below `user_id` as `managers` to let them see their org's feedback too.
+    """
+    return user_id in (feedback.manager_id, feedback.employee_id) or feedback.manager_id in managers
+
+def get_feedback_details_bulk(
+    db: Session,
+    feedback_ids: Optional[list[str]] = None,
+    manager_id: Optional[str] = None,
+    employee_id: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    include_subtree: bool = False
+):
+    """Fully loaded feedback matching all given filters, oldest first"""
+    return db.scalars(
+        feedback_details_bulk_query(feedback_ids, manager_id, employee_id, start, end, include_subtree)
+    ).all()
+
+# --- Batch writes ---
+# Each batch is validated up front with set-based lookups, then the valid
+# items are written with bulk statements in a single transaction. Invalid
+# items are reported per index and do not stop the rest of the batch.
+
+def _batch_ok(index: int, id: str) -> dict:
+    return {"index": index, "ok": True, "id": id}
+
+def _batch_error(index: int, error: str) -> dict:
+    return {"index": index, "ok": False, "error": error}
+
+def batch_summary(results: list[dict]) -> dict:
+    succeeded = sum(1 for r in results if r["ok"])
+    return {"succeeded": succeeded, "failed": len(results) - succeeded, "results": results}
+
+def create_feedback_batch(db: Session, items: list[schemas.FeedbackCreate], manager_id: str):
+    employee_ids = set(db.scalars(select(models.User.id).where(
+        models.User.id.in_({item.employee_id for item in items}),
+        models.User.role == models.RoleEnum.employee
+    )))
+    requested_tags = {tag_id for item in items for tag_id in (item.tag_ids or [])}
+    known_tags = set(tag_registry.resolve(db, requested_tags)) if requested_tags else set()
+
+    now = datetime.utcnow()
+    results, feedback_rows, tag_rows, tag_ids = [], [], [], {}
+    for index, item in enumerate(items):
+        if item.employee_id not in employee_ids:
+            results.append(_batch_error(index, "Employee not found"))
+            continue
+        unknown = set(item.tag_ids or []) - known_tags
+        if unknown:
+            results.append(_batch_error(index, f"Unknown tag ids: {sorted(unknown)}"))
+            continue
+        feedback_id = str(uuid.uuid4())
+        feedback_rows.append({
+            "id": feedback_id,
+            "employee_id": item.employee_id,
+            "manager_id": manager_id,
+            "strengths": item.strengths,
+            "improvements": item.improvements,
+            "sentiment": item.sentiment,
+            "created_at": now,
+            "updated_at": now,
+        })
+        tag_rows.extend({"feedback_id": feedback_id, "tag_id": tag_id} for tag_id in set(item.tag_ids or []))
+        tag_ids[feedback_id] = sorted(set(item.tag_ids or []))
+        results.append(_batch_ok(index, feedback_id))
+
+    if feedback_rows:
+        db.execute(insert(models.Feedback), feedback_rows)
+        if tag_rows:
+            db.execute(insert(models.feedback_tags), tag_rows)
+        stats.record_feedback_batch(db, manager_id, [row["sentiment"] for row in feedback_rows])
+        rollups.record_feedback_created(db, ({**row, "tag_ids": tag_ids[row["id"]]} for row in feedback_rows))
+        versions.bump(db, versions.manager(manager_id), *{versions.employee(row["employee_id"]) for row in feedback_rows})
+        db.commit()
+        events.publish_many(
+            (events.FEEDBACK_CREATED, events.feedback_payload(row, tag_ids[row["id"]]), (manager_id, row["employee_id"]))
+            for row in feedback_rows
+        )
+    return results
+
+def acknowledge_feedback_batch(db: Session, items: list[schemas.AcknowledgementBatchItem], employee_id: str):
+    feedback_ids = {item.feedback_id for item in items}
+    feedback = {
+        row.id: row for row in db.execute(
+            select(models.Feedback.id, models.Feedback.employee_id, models.Feedback.manager_id)
+            .where(models.Feedback.id.in_(feedback_ids))
+        )
+    }
+    existing = dict(db.execute(
+        select(models.Acknowledgement.feedback_id, models.Acknowledgement.id).where(
+            models.Acknowledgement.feedback_id.in_(feedback_ids),
+            models.Acknowledgement.employee_id == employee_id
+        )
+    ).all())
+
+    now = datetime.utcnow()
+    results, new_rows, updates, seen, acknowledged = [], [], [], set(), []
+    newly_acknowledged = Counter()
+    for index, item in enumerate(items):
+        row = feedback.get(item.feedback_id)
+        if row is None or row.employee_id != employee_id:
+            results.append(_batch_error(index, "Not authorized to acknowledge this feedback"))
+            continue
+        if item.feedback_id in seen:
+            results.append(_batch_error(index, "Duplicate feedback id in batch"))
+            continue
+        seen.add(item.feedback_id)
+        values = {"acknowledged": True, "comment": item.comment, "acknowledged_at": now}
+        if item.feedback_id in existing:
+            updates.append({"id": existing[item.feedback_id], **values})
+            acknowledged.append(({"feedback_id": item.feedback_id, "employee_id": employee_id, **values}, row.manager_id))
+        else:
+            new_rows.append({"feedback_id": item.feedback_id, "employee_id": employee_id, **values})
+            acknowledged.append((new_rows[-1], row.manager_id))
+            newly_acknowledged[row.manager_id] += 1
+        results.append(_batch_ok(index, item.feedback_id))
+
+    if new_rows or updates:
+        if new_rows:
+            db.execute(insert(models.Acknowledgement), new_rows)
+        if updates:
+            db.execute(update(models.Acknowledgement), updates)
+        for manager_id, count in newly_acknowledged.items():
+            stats.record_acknowledged(db, manager_id, count)
+        rollups.record_acknowledged(db, [row["feedback_id"] for row in new_rows], now)
+        versions.bump(db, versions.employee(employee_id), *{versions.manager(m) for _, m in acknowledged})
+        db.commit()
+        events.publish_many(
+            (events.FEEDBACK_ACKNOWLEDGED, events.acknowledgement_payload(ack), (manager_id, employee_id))
+            for ack, manager_id in acknowledged
+        )
+    return results
+
+def assign_employees_to_manager(db: Session, employee_ids: list[str], manager_id: str):
+    users = {
+        row.id: row for row in db.execute(
+            select(models.User.id, models.User.email, models.User.role, models.User.manager_id)
+            .where(models.User.id.in_(set(employee_ids)))
+        )
+    }
+    cycles = hierarchy.would_create_cycle(db, users, manager_id)
+    results, assigned = [], {}
+    for index, employee_id in enumerate(employee_ids):
+        user = users.get(employee_id)
+        if user is None:
+            results.append(_batch_error(index, "Employee not found"))
+        elif user.role != models.RoleEnum.employee:
+            results.append(_batch_error(index, "User is not an employee"))
+        elif employee_id in cycles:
+            results.append(_batch_error(index, "Employee manages this manager"))
+        else:
+            assigned[employee_id] = user
+            results.append(_batch_ok(index, employee_id))
+
+    if assigned:
+        db.execute(
+            update(models.User)
+            .where(models.User.id.in_(list(assigned)))
+            .values(manager_id=manager_id)
+            .execution_options(synchronize_session=False)
+        )
+        hierarchy.move(db, assigned, manager_id)
+        versions.bump(
+            db, versions.team(manager_id),
+            *{versions.team(user.manager_id) for user in assigned.values()},
+            *{versions.employee(employee_id) for employee_id in assigned}
+        )
+        db.commit()
+        for user in assigned.values():
+            principals.invalidate(user.email)
+        query_cache.invalidate(
+            query_cache.team(manager_id), query_cache.AVAILABLE,
+            *(query_cache.team(user.manager_id) for user in assigned.values())
+        )
+    return results
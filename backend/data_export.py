@@ -0,0 +1,293 @@
+"""
+Bulk export of feedback data for analytics, streamed as NDJSON or CSV.
+
+Datasets:
+
+    feedback           one row per feedback, with manager and employee names and its tag names
+    acknowledgements   one row per acknowledgement
+    requests           one row per feedback request
+    tags               one row per tag
+
+Rows are read with yield_per(EXPORT_BATCH_SIZE), which streams them from a
+server-side cursor on PostgreSQL and steps the SQLite cursor lazily, and each
+batch is encoded and handed on before the next is fetched, so memory stays
+flat however many rows are exported.
+
+Every dataset is written in primary key order and the key is the first
+column, so an interrupted transfer resumes with `after=<key of the last
+complete row>` without repeating rows. Feedback ids are random, so feedback
+created in between may sort before the cursor and only appear in the next
+full export. Exports can be limited to [start, end) (on created_at, or
+acknowledged_at for acknowledgements) and to the org subtree of a manager.
+
+    python data_export.py feedback --format csv --out feedback.csv --start 2024-01-01
+    python data_export.py feedback --format csv --out feedback.csv --resume
+    python data_export.py acknowledgements --manager <manager id> > acks.ndjson
+"""
+
+import argparse
+import csv
+import enum
+import io
+import json
+import os
+import sys
+from datetime import date, datetime
+from typing import Iterator, Optional
+
+from sqlalchemy import Integer, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import aliased
+
+import crud, hierarchy, models, serialization
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+FORMATS = ("ndjson", "csv")
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+# Lists (the tags of a feedback) are joined with this in CSV cells
+CSV_LIST_SEPARATOR = ";"
+
+_manager = aliased(models.User, name="manager")
+_employee = aliased(models.User, name="employee")
+
+
+def _feedback_query(start, end, manager_id):
+    # One row per (feedback, tag); stream() folds the tags of a feedback into a list
+    feedback, link = models.Feedback, models.feedback_tags
+    stmt = (
+        select(
+            feedback.id, feedback.created_at, feedback.updated_at,
+            feedback.manager_id, _manager.name.label("manager_name"),
+            feedback.employee_id, _employee.name.label("employee_name"),
+            feedback.sentiment, feedback.strengths, feedback.improvements,
+            models.Tag.name.label("tags"),
+        )
+        .outerjoin(_manager, _manager.id == feedback.manager_id)
+        .outerjoin(_employee, _employee.id == feedback.employee_id)
+        .outerjoin(link, link.c.feedback_id == feedback.id)
+        .outerjoin(models.Tag, models.Tag.id == link.c.tag_id)
+    )
+    if manager_id is not None:
+        stmt = stmt.where(crud.given_by(manager_id, include_subtree=True))
+    return _in_range(stmt, feedback.created_at, start, end)
+
+
+def _acknowledgements_query(start, end, manager_id):
+    ack = models.Acknowledgement
+    stmt = select(ack.id, ack.feedback_id, ack.employee_id, ack.acknowledged, ack.comment, ack.acknowledged_at)
+    if manager_id is not None:
+        stmt = stmt.join(models.Feedback, models.Feedback.id == ack.feedback_id).where(
+            crud.given_by(manager_id, include_subtree=True)
+        )
+    return _in_range(stmt, ack.acknowledged_at, start, end)
+
+
+def _requests_query(start, end, manager_id):
+    request = models.FeedbackRequest
+    stmt = select(
+        request.id, request.created_at, request.updated_at, request.manager_id, request.employee_id,
+        request.message, request.is_open,
+    )
+    if manager_id is not None:
+        stmt = stmt.where(request.manager_id.in_(hierarchy.subtree_query(manager_id)))
+    return _in_range(stmt, request.created_at, start, end)
+
+
+def _tags_query(start, end, manager_id):
+    return select(models.Tag.id, models.Tag.name)
+
+
+def _in_range(stmt, column, start, end):
+    if start is not None:
+        stmt = stmt.where(column >= start)
+    if end is not None:
+        stmt = stmt.where(column < end)
+    return stmt
+
+
+# name -> (key column, query builder, whether the last column is folded into a list per key)
+DATASETS = {
+    "feedback": (models.Feedback.id, _feedback_query, True),
+    "acknowledgements": (models.Acknowledgement.id, _acknowledgements_query, False),
+    "requests": (models.FeedbackRequest.id, _requests_query, False),
+    "tags": (models.Tag.id, _tags_query, False),
+}
+
+
+def parse_cursor(dataset: str, after: str):
+    """The key value of an `after` cursor. Raises ValueError if it is not a key of `dataset`."""
+    key = DATASETS[dataset][0]
+    if isinstance(key.type, Integer):
+        try:
+            return int(after)
+        except ValueError:
+            raise ValueError(f"Invalid cursor for {dataset}: expected an integer id") from None
+    return after
+
+
+def export_query(
+    dataset: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    manager_id: Optional[str] = None,
+    after: Optional[str] = None
+):
+    """The statement of an export, in key order. Raises ValueError for an unknown dataset or bad cursor."""
+    if dataset not in DATASETS:
+        raise ValueError(f"Unknown dataset {dataset!r}; expected one of {', '.join(DATASETS)}")
+    key, build, folded = DATASETS[dataset]
+    stmt = build(start, end, manager_id)
+    if after is not None:
+        stmt = stmt.where(key > parse_cursor(dataset, after))
+    stmt = stmt.order_by(key)
+    if folded:
+        stmt = stmt.order_by(list(stmt.selected_columns)[-1])
+    return stmt
+
+
+# --- Encoding ---
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, list):
+        return CSV_LIST_SEPARATOR.join(value)
+    return value
+
+
+def _encode_ndjson(columns: list, rows: list) -> bytes:
+    return b"".join(serialization.dumps(dict(zip(columns, row))) + b"\n" for row in rows)
+
+
+def _encode_csv(columns: list, rows: list) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([_csv_value(value) for value in row])
+    return buffer.getvalue().encode("utf-8")
+
+
+def _fold(partitions) -> Iterator[list]:
+    """Merge consecutive rows with the same key, collecting their last column into a list.
+
+    A key's rows may straddle two batches, so the last row of each batch is
+    held back until the next one shows whether it continues.
+    """
+    current = None
+    for partition in partitions:
+        rows = []
+        for row in partition:
+            if current is not None and row[0] == current[0]:
+                if row[-1] is not None:
+                    current[-1].append(row[-1])
+                continue
+            if current is not None:
+                rows.append(current)
+            current = [*row[:-1], [] if row[-1] is None else [row[-1]]]
+        yield rows
+    if current is not None:
+        yield [current]
+
+
+def stream(
+    engine: Engine,
+    dataset: str,
+    fmt: str = "ndjson",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    manager_id: Optional[str] = None,
+    after: Optional[str] = None,
+    header: bool = True,
+    batch_size: int = EXPORT_BATCH_SIZE
+) -> Iterator[bytes]:
+    """Encoded chunks of an export, one per batch of rows; CSV starts with a header row when `header` is set.
+
+    Call export_query first to validate the arguments: errors raised here
+    surface only once the response has started.
+    """
+    stmt = export_query(dataset, start, end, manager_id, after)
+    encode = _encode_csv if fmt == "csv" else _encode_ndjson
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=batch_size).execute(stmt)
+        columns = list(result.keys())
+        if fmt == "csv" and header:
+            yield _encode_csv(columns, [columns])
+        batches = _fold(result.partitions()) if DATASETS[dataset][2] else result.partitions()
+        for rows in batches:
+            if rows:
+                yield encode(columns, rows)
+
+
+# --- Resuming a file ---
+
+def resume_point(path: str, fmt: str) -> tuple[Optional[str], bool]:
+    """(key of the last complete row, whether a CSV header is present) of a partial export file.
+
+    A half-written last record is cut off so the file can be appended to.
+    CSV records may span lines (quoted newlines), so a record ends at a line
+    break outside quotes.
+    """
+    end, last, records, pending, quotes = 0, None, 0, b"", 0
+    with open(path, "rb") as f:
+        for line in f:
+            pending += line
+            quotes += line.count(b'"')
+            if line.endswith(b"\n") and (fmt != "csv" or quotes % 2 == 0):
+                end += len(pending)
+                last, pending, quotes = pending, b"", 0
+                records += 1
+    with open(path, "rb+") as f:
+        f.truncate(end)
+
+    has_header = fmt == "csv" and records > 0
+    if last is None or (fmt == "csv" and records < 2):
+        return None, has_header
+    if fmt == "csv":
+        return next(csv.reader([last.decode("utf-8")]))[0], has_header
+    return str(json.loads(last)["id"]), has_header
+
+
+if __name__ == "__main__":
+    import migrations
+    from database import engine
+
+    parser = argparse.ArgumentParser(description="Stream feedback data as NDJSON or CSV")
+    parser.add_argument("dataset", choices=list(DATASETS))
+    parser.add_argument("--format", choices=FORMATS, default="ndjson")
+    parser.add_argument("--out", help="File to write (default stdout)")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="Only rows from this date/time on")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="Only rows before this date/time")
+    parser.add_argument("--manager", help="Only feedback in this manager's org subtree")
+    parser.add_argument("--after", help="Resume after this key")
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted --out file where it stopped")
+    args = parser.parse_args()
+
+    migrations.upgrade(engine)
+    after, header = args.after, True
+    if args.resume:
+        if not args.out:
+            parser.error("--resume needs --out")
+        if os.path.exists(args.out):
+            after, has_header = resume_point(args.out, args.format)
+            header = not has_header
+    try:
+        export_query(args.dataset, args.start, args.end, args.manager, after)
+    except ValueError as e:
+        parser.error(str(e))
+
+    out = open(args.out, "ab" if args.resume else "wb") if args.out else sys.stdout.buffer
+    try:
+        for chunk in stream(engine, args.dataset, args.format, args.start, args.end, args.manager, after, header):
+            out.write(chunk)
+    finally:
+        if args.out:
+            out.close()
+    if args.out:
+        print(f"Exported {args.dataset} to {args.out}" + (f" (resumed after {after})" if after else ""), file=sys.stderr)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Per-user digests of what is waiting on them, and reminders about it.
+
+The digests.refresh job recomputes the `digests` table every
+DIGEST_REFRESH_SECONDS from three grouped queries: unacknowledged feedback per
+recipient, unacknowledged feedback per giver, and open feedback requests per
+manager. Rows are upserted in chunks and users with nothing waiting any more
+are dropped, so a refresh costs a few scans however many users there are.
+Dashboards read one row by primary key (GET /dashboard/digest/) instead of
+counting per request; the numbers are at most one interval old.
+
+The digests.remind job sends a "digest.reminder" event to every user whose
+oldest unacknowledged feedback or open request is older than
+REMINDER_AFTER_HOURS, at most once per REMINDER_EVERY_HOURS. With
+EVENTS_BACKEND=memory, only streams on the worker that ran the job receive it.
+
+    python digests.py refresh
+    python digests.py remind
+"""
+
+import argparse
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, or_, select, true, update
+from sqlalchemy.orm import Session
+
+import crud, events, jobs, models
+from database import dialect_insert
+
+DIGEST_REFRESH_SECONDS = float(os.getenv("DIGEST_REFRESH_SECONDS", "900"))
+DIGEST_REMIND_SECONDS = float(os.getenv("DIGEST_REMIND_SECONDS", "3600"))
+REMINDER_AFTER_HOURS = float(os.getenv("REMINDER_AFTER_HOURS", "48"))
+REMINDER_EVERY_HOURS = float(os.getenv("REMINDER_EVERY_HOURS", "24"))
+UPSERT_CHUNK_SIZE = 1000
+
+REFRESH = "digests.refresh"
+REMIND = "digests.remind"
+
+# Recomputed by refresh(); reminded_at is kept across refreshes
+COMPUTED_COLUMNS = (
+    "pending_acknowledgements", "oldest_pending_at", "unacknowledged_given",
+    "open_requests", "oldest_open_request_at", "computed_at",
+)
+
+
+def _unacknowledged():
+    ack = models.Acknowledgement
+    return ~select(ack.id).where(ack.feedback_id == models.Feedback.id).exists()
+
+
+def pending_acknowledgements_query():
+    """(employee_id, count, oldest created_at) of unacknowledged feedback per recipient"""
+    feedback = models.Feedback
+    return (
+        select(feedback.employee_id, func.count(), func.min(feedback.created_at))
+        .where(feedback.employee_id.is_not(None), _unacknowledged())
+        .group_by(feedback.employee_id)
+    )
+
+
+def unacknowledged_given_query():
+    """(manager_id, count) of unacknowledged feedback per giver"""
+    feedback = models.Feedback
+    return (
+        select(feedback.manager_id, func.count())
+        .where(feedback.manager_id.is_not(None), _unacknowledged())
+        .group_by(feedback.manager_id)
+    )
+
+
+def open_requests_query():
+    """(manager_id, count, oldest created_at) of open feedback requests per manager"""
+    request = models.FeedbackRequest
+    return (
+        select(request.manager_id, func.count(), func.min(request.created_at))
+        .where(request.is_open == true(), request.manager_id.is_not(None))
+        .group_by(request.manager_id)
+    )
+
+
+def refresh(db: Session) -> int:
+    """Recompute every user's digest. Returns how many users have something waiting."""
+    now = datetime.utcnow()
+    digests = {}
+
+    def digest(user_id: str) -> dict:
+        return digests.setdefault(user_id, {
+            "user_id": user_id, "pending_acknowledgements": 0, "oldest_pending_at": None,
+            "unacknowledged_given": 0, "open_requests": 0, "oldest_open_request_at": None, "computed_at": now,
+        })
+
+    for user_id, count, oldest in db.execute(pending_acknowledgements_query()):
+        row = digest(user_id)
+        row["pending_acknowledgements"], row["oldest_pending_at"] = count, oldest
+    for user_id, count in db.execute(unacknowledged_given_query()):
+        digest(user_id)["unacknowledged_given"] = count
+    for user_id, count, oldest in db.execute(open_requests_query()):
+        row = digest(user_id)
+        row["open_requests"], row["oldest_open_request_at"] = count, oldest
+
+    table = models.Digest.__table__
+    stmt = dialect_insert(db.get_bind(), table)
+    upsert = stmt.on_conflict_do_update(
+        index_elements=["user_id"], set_={name: stmt.excluded[name] for name in COMPUTED_COLUMNS}
+    )
+    rows = list(digests.values())
+    for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        db.execute(upsert, rows[start:start + UPSERT_CHUNK_SIZE])
+    # Everyone not upserted above has nothing waiting any more
+    db.execute(delete(table).where(table.c.computed_at < now))
+    db.commit()
+    return len(rows)
+
+
+def remind(db: Session) -> int:
+    """Send a reminder event to users with long-waiting items. Returns how many were reminded."""
+    now = datetime.utcnow()
+    digest = models.Digest
+    overdue = now - timedelta(hours=REMINDER_AFTER_HOURS)
+    rows = db.execute(
+        select(
+            digest.user_id, digest.pending_acknowledgements, digest.oldest_pending_at,
+            digest.open_requests, digest.oldest_open_request_at,
+        )
+        .where(
+            or_(digest.oldest_pending_at < overdue, digest.oldest_open_request_at < overdue),
+            or_(digest.reminded_at.is_(None), digest.reminded_at < now - timedelta(hours=REMINDER_EVERY_HOURS)),
+        )
+    ).all()
+    if not rows:
+        return 0
+    for chunk in crud.id_chunks([row.user_id for row in rows]):
+        db.execute(update(digest).where(digest.user_id.in_(chunk)).values(reminded_at=now))
+    db.commit()
+    events.publish_many(
+        (events.DIGEST_REMINDER, {
+            "pending_acknowledgements": row.pending_acknowledgements,
+            "oldest_pending_at": row.oldest_pending_at,
+            "open_requests": row.open_requests,
+            "oldest_open_request_at": row.oldest_open_request_at,
+        }, [row.user_id])
+        for row in rows
+    )
+    return len(rows)
+
+
+@jobs.handler(REFRESH)
+def _refresh_job(db: Session, payload: dict):
+    refresh(db)
+
+
+@jobs.handler(REMIND)
+def _remind_job(db: Session, payload: dict):
+    remind(db)
+
+
+jobs.every(REFRESH, DIGEST_REFRESH_SECONDS)
+jobs.every(REMIND, DIGEST_REMIND_SECONDS)
+
+
+if __name__ == "__main__":
+    import migrations
+    from database import engine
+
+    parser = argparse.ArgumentParser(description="Recompute digests or send reminders now")
+    parser.add_argument("command", choices=["refresh", "remind"])
+    args = parser.parse_args()
+
+    migrations.upgrade(engine)
+    with Session(bind=engine) as db:
+        if args.command == "refresh":
+            print(f"Refreshed digests: {refresh(db)} users have something waiting")
+        else:
+            print(f"Reminded {remind(db)} users")
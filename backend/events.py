@@ -0,0 +1,355 @@
+"""
+Per-user change events, pushed to browsers over Server-Sent Events.
+
+crud publishes a small delta after each committed write (feedback created or
+edited, acknowledgements, feedback requests opened or closed) addressed to the
+users who can see it. Every user's stream replays what it missed after a
+reconnect from a bounded log, using the standard Last-Event-ID header. When
+the requested id is older than anything still in the log the stream starts
+with a "reset" event, telling the client to reload once.
+
+Backends (EVENTS_BACKEND):
+
+    memory     events live in this process only; fine for a single worker
+    database   events are written to the `events` table and every worker polls
+               it, so subscribers on any worker see writes from all of them.
+               Ids can commit out of order (an id 10 committing after 11), so
+               a poller only moves past a missing id once EVENTS_SETTLE_SECONDS
+               have passed since it saw a later one
+
+Another fan-out transport (Redis pub/sub, Postgres LISTEN/NOTIFY, ...) plugs in
+by implementing EventBackend and passing it to set_backend().
+"""
+
+import asyncio
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from typing import Iterable, Optional
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.engine import Engine
+
+import models, serialization
+
+EVENTS_BACKEND = os.getenv("EVENTS_BACKEND", "memory")
+EVENT_LOG_SIZE = int(os.getenv("EVENT_LOG_SIZE", "10000"))
+EVENTS_POLL_SECONDS = float(os.getenv("EVENTS_POLL_SECONDS", "1"))
+# How long a poller waits for a missing id to commit before assuming it was rolled back
+EVENTS_SETTLE_SECONDS = float(os.getenv("EVENTS_SETTLE_SECONDS", "10"))
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+EVENTS_RETRY_MS = 3000
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+FEEDBACK_CREATED = "feedback.created"
+FEEDBACK_UPDATED = "feedback.updated"
+FEEDBACK_ACKNOWLEDGED = "feedback.acknowledged"
+REQUEST_CREATED = "feedback_request.created"
+REQUEST_CLOSED = "feedback_request.closed"
+DIGEST_REMINDER = "digest.reminder"
+RESET = "reset"
+
+
+class Event:
+    __slots__ = ("id", "user_id", "type", "payload")
+
+    def __init__(self, id: int, user_id: str, type: str, payload: str):
+        self.id = id
+        self.user_id = user_id
+        self.type = type
+        self.payload = payload
+
+    def encode(self) -> str:
+        """SSE wire format"""
+        return f"id: {self.id}\nevent: {self.type}\ndata: {self.payload}\n\n"
+
+
+class _Subscriber:
+    """An SSE stream's inbox; written from any thread, read on its event loop"""
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def _put(self, event: Event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A stalled client; it is told to reload instead of holding memory
+            self.overflowed = True
+
+    def deliver(self, event: Event):
+        self.loop.call_soon_threadsafe(self._put, event)
+
+
+class EventBackend:
+    """Stores events for replay and fans them out to this process's subscribers"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def publish(self, events: list):
+        """Store (user_id, type, payload) tuples and deliver them"""
+        raise NotImplementedError
+
+    def replay(self, user_id: str, after_id: int):
+        """Return (events after `after_id` for the user, whether the log still reaches back that far)"""
+        raise NotImplementedError
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    def subscribe(self, user_id: str) -> _Subscriber:
+        subscriber = _Subscriber(user_id)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: _Subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.user_id)
+            if subscribers:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[subscriber.user_id]
+
+    def _fan_out(self, events: Iterable[Event]):
+        with self._lock:
+            targets = [(event, list(self._subscribers.get(event.user_id, ()))) for event in events]
+        for event, subscribers in targets:
+            for subscriber in subscribers:
+                subscriber.deliver(event)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
+
+
+class MemoryBackend(EventBackend):
+    def __init__(self, log_size: int):
+        super().__init__()
+        self._log = deque(maxlen=log_size)
+        # Ids continue to grow across restarts, so a client's Last-Event-ID from
+        # before a restart is recognised as older than this log
+        self._ids = itertools.count(time.time_ns() // 1000)
+        self._floor = next(self._ids)
+
+    def publish(self, events: list):
+        with self._lock:
+            stored = []
+            for user_id, event_type, payload in events:
+                if len(self._log) == self._log.maxlen:
+                    self._floor = self._log[0].id
+                event = Event(next(self._ids), user_id, event_type, payload)
+                self._log.append(event)
+                stored.append(event)
+        self._fan_out(stored)
+
+    def replay(self, user_id: str, after_id: int):
+        with self._lock:
+            complete = after_id >= self._floor
+            return [e for e in self._log if e.id > after_id and e.user_id == user_id], complete
+
+
+class DatabaseBackend(EventBackend):
+    def __init__(self, engine: Engine, log_size: int, poll_seconds: float, settle_seconds: float = EVENTS_SETTLE_SECONDS):
+        super().__init__()
+        self.engine = engine
+        self.log_size = log_size
+        self.poll_seconds = poll_seconds
+        self.settle_seconds = settle_seconds
+        # Everything up to _last_id has been delivered; ids above it that have
+        # been delivered too (while an earlier one is missing) map to when they were seen
+        self._last_id = None
+        self._pending = {}
+        self._task = None
+
+    def publish(self, events: list):
+        # Delivered by the pollers, including this process's
+        with self.engine.begin() as conn:
+            conn.execute(insert(models.Event), [
+                {"user_id": user_id, "type": event_type, "payload": payload}
+                for user_id, event_type, payload in events
+            ])
+
+    def replay(self, user_id: str, after_id: int):
+        with self.engine.connect() as conn:
+            oldest = conn.scalar(select(func.min(models.Event.id)))
+            rows = conn.execute(
+                select(models.Event.id, models.Event.user_id, models.Event.type, models.Event.payload)
+                .where(models.Event.user_id == user_id, models.Event.id > after_id)
+                .order_by(models.Event.id)
+            ).all()
+        return [Event(*row) for row in rows], oldest is None or after_id >= oldest - 1
+
+    def _poll(self):
+        with self.engine.begin() as conn:
+            if self._last_id is None:
+                self._last_id = conn.scalar(select(func.max(models.Event.id))) or 0
+                return
+            rows = conn.execute(
+                select(models.Event.id, models.Event.user_id, models.Event.type, models.Event.payload)
+                .where(models.Event.id > self._last_id)
+                .order_by(models.Event.id)
+            ).all()
+            new = [Event(*row) for row in rows if row.id not in self._pending]
+            if new:
+                self._fan_out(new)
+            if self._advance(new, time.monotonic()):
+                conn.execute(delete(models.Event).where(models.Event.id <= self._last_id - self.log_size))
+
+    def _advance(self, delivered: list, now: float) -> bool:
+        """Move _last_id over delivered ids, and over missing ids that had time to commit"""
+        for event in delivered:
+            self._pending[event.id] = now
+        start = self._last_id
+        for event_id in sorted(self._pending):
+            # A missing id below event_id is given up once event_id has been seen for the settle time
+            if event_id != self._last_id + 1 and now - self._pending[event_id] < self.settle_seconds:
+                break
+            self._last_id = event_id
+            del self._pending[event_id]
+        return self._last_id != start
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self._poll)
+            except Exception as exc:  # keep polling through transient database errors
+                print(f"Event poll failed: {exc}")
+            await asyncio.sleep(self.poll_seconds)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+def _default_backend() -> EventBackend:
+    if EVENTS_BACKEND == "database":
+        from database import engine
+        return DatabaseBackend(engine, EVENT_LOG_SIZE, EVENTS_POLL_SECONDS)
+    return MemoryBackend(EVENT_LOG_SIZE)
+
+
+backend = _default_backend()
+
+
+def set_backend(new_backend: EventBackend):
+    global backend
+    backend = new_backend
+
+
+# --- Publishing (called by crud after commit) ---
+
+def _dump(value) -> str:
+    # Same encoding as the REST responses, so clients parse timestamps one way
+    return serialization.dumps(value).decode()
+
+
+def publish_many(messages: Iterable[tuple]):
+    """Send (event_type, payload, user_ids) messages. Failures are logged, never raised into the write path."""
+    events = []
+    for event_type, payload, user_ids in messages:
+        data = _dump(payload)
+        events.extend((uid, event_type, data) for uid in dict.fromkeys(user_ids) if uid)
+    if not events:
+        return
+    try:
+        backend.publish(events)
+    except Exception as exc:
+        print(f"Failed to publish {len(events)} events: {exc}")
+
+
+def publish(event_type: str, payload: dict, user_ids: Iterable[Optional[str]]):
+    publish_many([(event_type, payload, user_ids)])
+
+
+def feedback_payload(feedback, tag_ids: Optional[list] = None) -> dict:
+    """Delta for a feedback row; `feedback` is a Feedback or a row dict as written by a bulk insert"""
+    get = feedback.get if isinstance(feedback, dict) else lambda key: getattr(feedback, key)
+    sentiment = get("sentiment")
+    return {
+        "id": get("id"),
+        "employee_id": get("employee_id"),
+        "manager_id": get("manager_id"),
+        "strengths": get("strengths"),
+        "improvements": get("improvements"),
+        "sentiment": sentiment.value if sentiment else None,
+        "created_at": get("created_at"),
+        "updated_at": get("updated_at"),
+        "tag_ids": [tag.id for tag in feedback.tags] if tag_ids is None else tag_ids,
+    }
+
+
+def feedback_changed(event_type: str, feedback: models.Feedback):
+    publish(event_type, feedback_payload(feedback), (feedback.manager_id, feedback.employee_id))
+
+
+def acknowledgement_payload(acknowledgement) -> dict:
+    get = acknowledgement.get if isinstance(acknowledgement, dict) else lambda key: getattr(acknowledgement, key)
+    return {
+        "feedback_id": get("feedback_id"),
+        "employee_id": get("employee_id"),
+        "comment": get("comment"),
+        "acknowledged_at": get("acknowledged_at"),
+    }
+
+
+def acknowledged(acknowledgement: models.Acknowledgement, manager_id: Optional[str]):
+    publish(FEEDBACK_ACKNOWLEDGED, acknowledgement_payload(acknowledgement), (manager_id, acknowledgement.employee_id))
+
+
+def feedback_request_changed(event_type: str, request: models.FeedbackRequest):
+    publish(event_type, {
+        "id": request.id,
+        "employee_id": request.employee_id,
+        "manager_id": request.manager_id,
+        "message": request.message,
+        "created_at": request.created_at,
+        "is_open": request.is_open,
+    }, (request.manager_id, request.employee_id))
+
+
+# --- Streaming ---
+
+async def stream(user_id: str, last_event_id: Optional[int] = None, heartbeat: float = EVENTS_HEARTBEAT_SECONDS):
+    """SSE body for one user: replay after `last_event_id`, then live events and heartbeats"""
+    subscriber = backend.subscribe(user_id)
+    try:
+        yield f"retry: {EVENTS_RETRY_MS}\n\n"
+        replayed = set()
+        if last_event_id is not None:
+            missed, complete = await asyncio.to_thread(backend.replay, user_id, last_event_id)
+            if not complete:
+                yield Event(last_event_id, user_id, RESET, "{}").encode()
+            for event in missed:
+                replayed.add(event.id)
+                yield event.encode()
+        while True:
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if subscriber.overflowed:
+                yield Event(event.id, user_id, RESET, "{}").encode()
+                return
+            # Not by id order: the database backend may deliver a late-committing id after a later one
+            if event.id in replayed:
+                continue  # already sent during replay
+            yield event.encode()
+    finally:
+        backend.unsubscribe(subscriber)
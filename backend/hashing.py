@@ -0,0 +1,107 @@
+"""
+Password hashing off the event loop.
+
+bcrypt deliberately takes hundreds of milliseconds per hash, so async
+endpoints hand it to a small dedicated thread pool (bcrypt releases the GIL
+while it works). The pool admits a bounded number of waiting jobs; beyond that
+callers get PoolSaturated straight away, which the API turns into a 503, so a
+burst of logins queues up here instead of starving every other endpoint.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+PASSWORD_POOL_WORKERS = int(os.getenv("PASSWORD_POOL_WORKERS", "4"))
+PASSWORD_POOL_MAX_QUEUE = int(os.getenv("PASSWORD_POOL_MAX_QUEUE", "32"))
+
+
+class PoolSaturated(Exception):
+    """Raised when the password pool's queue is full"""
+
+
+class PasswordPool:
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password")
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._run_total = 0.0
+        self._run_max = 0.0
+
+    def _admit(self):
+        with self._lock:
+            if self._in_flight >= self.workers + self.max_queue:
+                self._rejected += 1
+                raise PoolSaturated()
+            self._in_flight += 1
+
+    def _record(self, waited: float, ran: float):
+        with self._lock:
+            self._completed += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+            self._run_total += ran
+            self._run_max = max(self._run_max, ran)
+
+    def _release(self, future):
+        with self._lock:
+            self._in_flight -= 1
+
+    async def run(self, fn, *args):
+        """Run fn(*args) on the pool and await the result. Raises PoolSaturated if the queue is full."""
+        self._admit()
+        submitted = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                self._record(started - submitted, time.perf_counter() - started)
+
+        future = self._executor.submit(job)
+        # A job stays admitted until it is done or cancelled before starting,
+        # not until its caller stops waiting: a disconnected client's hash
+        # still occupies a worker.
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    async def hash(self, password: str) -> str:
+        return await self.run(pwd_context.hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self.run(pwd_context.verify, plain_password, hashed_password)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            completed = self._completed or 1
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "queue_depth": max(0, self._in_flight - self.workers),
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "avg_wait_ms": round(self._wait_total / completed * 1000, 2),
+                "max_wait_ms": round(self._wait_max * 1000, 2),
+                "avg_run_ms": round(self._run_total / completed * 1000, 2),
+                "max_run_ms": round(self._run_max * 1000, 2),
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_pool = PasswordPool(PASSWORD_POOL_WORKERS, PASSWORD_POOL_MAX_QUEUE)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Reporting hierarchy.
+
+users.manager_id forms a tree; org_closure stores every (ancestor,
+descendant, depth) pair of it, including each user with itself at depth 0.
+Everyone below a manager is then one indexed range scan on the primary key,
+however deep the org, and "is A above B" is a single primary-key lookup.
+
+crud keeps the table current when users are created or reassigned. Rebuild it
+from users.manager_id (with a recursive CTE) with:
+
+    python hierarchy.py rebuild
+"""
+
+import argparse
+from typing import Iterable, Optional
+
+from sqlalchemy import delete, func, insert, literal, select, true
+from sqlalchemy.orm import Session, aliased
+
+import models
+
+# Guards the rebuild against a manager_id cycle in imported data
+MAX_DEPTH = 64
+
+closure = models.OrgClosure
+
+
+# --- Statement builders ---
+
+def subtree_query(manager_id: str, include_self: bool = True):
+    """Ids of everyone below `manager_id` (and the manager, unless include_self is False)"""
+    stmt = select(closure.descendant_id).where(closure.ancestor_id == manager_id)
+    if not include_self:
+        stmt = stmt.where(closure.depth > 0)
+    return stmt
+
+
+def subtree_members_query(manager_id: str):
+    """Employees anywhere below `manager_id`, nearest first"""
+    return (
+        select(models.User)
+        .join(closure, closure.descendant_id == models.User.id)
+        .where(closure.ancestor_id == manager_id, closure.depth > 0, models.User.role == models.RoleEnum.employee)
+        .order_by(closure.depth, models.User.name)
+    )
+
+
+def ancestors_query(user_id: str):
+    """Ids of `user_id` and everyone above them"""
+    return select(closure.ancestor_id).where(closure.descendant_id == user_id)
+
+
+# --- Maintenance ---
+# These run inside the caller's transaction; the caller commits.
+
+def add_user(db: Session, user_id: str, manager_id: Optional[str] = None):
+    """Record a new user, placed under `manager_id`"""
+    db.execute(insert(closure).values(ancestor_id=user_id, descendant_id=user_id, depth=0))
+    if manager_id:
+        db.execute(insert(closure).from_select(
+            ["ancestor_id", "descendant_id", "depth"],
+            select(closure.ancestor_id, literal(user_id), closure.depth + 1).where(closure.descendant_id == manager_id),
+        ))
+
+
+def would_create_cycle(db: Session, user_ids: Iterable[str], manager_id: str) -> set:
+    """The users in `user_ids` that are `manager_id` or above them, and so can't report to them"""
+    return set(user_ids) & set(db.scalars(ancestors_query(manager_id)))
+
+
+def move(db: Session, user_ids: Iterable[str], manager_id: Optional[str]):
+    """Re-home the users' whole subtrees under `manager_id` (None detaches them). Check would_create_cycle first.
+
+    Two statements however many users move. A moved user who was below
+    another moved user ends up directly under `manager_id` as well.
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    moved, above = aliased(closure), aliased(closure)
+    # Paths that reach a moved user from above it, into the user's subtree;
+    # paths inside the subtree stay
+    crossing = (
+        select(moved.descendant_id)
+        .join(above, above.descendant_id == moved.ancestor_id)
+        .where(
+            moved.ancestor_id.in_(user_ids), above.depth > 0,
+            moved.descendant_id == closure.descendant_id, above.ancestor_id == closure.ancestor_id,
+        )
+        .exists()
+    )
+    db.execute(delete(closure).where(crossing).execution_options(synchronize_session=False))
+    if manager_id:
+        # Each member is now left under exactly one moved user, its nearest:
+        # pair every ancestor of the new manager with every member
+        new_above, below = aliased(closure), aliased(closure)
+        db.execute(insert(closure).from_select(
+            ["ancestor_id", "descendant_id", "depth"],
+            select(new_above.ancestor_id, below.descendant_id, new_above.depth + below.depth + 1)
+            .select_from(new_above).join(below, true())
+            .where(new_above.descendant_id == manager_id, below.ancestor_id.in_(user_ids)),
+        ))
+
+
+def rebuild(db: Session) -> int:
+    """Recompute the closure from users.manager_id. Returns the number of pairs written."""
+    users = models.User.__table__
+    tree = (
+        select(users.c.id.label("ancestor_id"), users.c.id.label("descendant_id"), literal(0).label("depth"))
+        .cte("tree", recursive=True)
+    )
+    tree = tree.union_all(
+        select(tree.c.ancestor_id, users.c.id, tree.c.depth + 1)
+        .join(users, users.c.manager_id == tree.c.descendant_id)
+        .where(tree.c.depth < MAX_DEPTH)
+    )
+    db.execute(delete(closure))
+    db.execute(insert(closure).from_select(
+        ["ancestor_id", "descendant_id", "depth"],
+        # A cycle reaches the same pair again at a greater depth; keep the first
+        select(tree.c.ancestor_id, tree.c.descendant_id, func.min(tree.c.depth))
+        .group_by(tree.c.ancestor_id, tree.c.descendant_id),
+    ))
+    db.commit()
+    return db.scalar(select(func.count()).select_from(closure))
+
+
+if __name__ == "__main__":
+    import migrations
+    from database import SessionLocal, engine
+
+    parser = argparse.ArgumentParser(description="Reporting hierarchy maintenance")
+    parser.add_argument("command", choices=["rebuild"])
+    args = parser.parse_args()
+
+    migrations.upgrade(engine)
+    db = SessionLocal()
+    try:
+        pairs = rebuild(db)
+        print(f"Rebuilt the org closure ({pairs} pairs).")
+    finally:
+        db.close()
@@ -0,0 +1,94 @@
+"""
+HTTP conditional requests for read endpoints.
+
+Validators are derived from the resource version counters (versions.py) or
+from a row's own timestamps, so an unchanged resource is answered with
+304 Not Modified after one primary-key lookup, before any ORM objects are
+loaded or serialized. ETags mix in the resource keys and the request's query
+string, so two users (or two pages) never share a validator.
+"""
+
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Iterable, Optional
+
+from fastapi import Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import versions
+
+# Personal data: browsers keep it but must revalidate on every use
+PRIVATE_REVALIDATE = "private, no-cache"
+# Shared reference data that may be a little stale
+PRIVATE_SHORT = "private, max-age=60"
+
+
+class Validator:
+    def __init__(self, etag: str, last_modified: Optional[datetime], cache_control: str):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.cache_control = cache_control
+        # Resource versions the validator was built from, for keying cached bodies
+        self.versions = {}
+
+    @property
+    def headers(self) -> dict:
+        headers = {"ETag": self.etag, "Cache-Control": self.cache_control, "Vary": "Authorization"}
+        if self.last_modified is not None:
+            headers["Last-Modified"] = format_datetime(self.last_modified, usegmt=True)
+        return headers
+
+    def matches(self, request: Request) -> bool:
+        """True when the client's copy is current. If-None-Match wins over If-Modified-Since."""
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            return "*" in tags or self.etag in tags
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since and self.last_modified is not None:
+            try:
+                since = parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=timezone.utc)
+            return self.last_modified <= since
+        return False
+
+    def not_modified(self) -> Response:
+        return Response(status_code=304, headers=self.headers)
+
+
+def _http_time(value: Optional[datetime]) -> Optional[datetime]:
+    """UTC, whole seconds (HTTP dates have no fractions)"""
+    if value is None:
+        return None
+    return value.replace(microsecond=0, tzinfo=timezone.utc)
+
+
+def make_validator(parts: Iterable, last_modified: Optional[datetime], cache_control: str) -> Validator:
+    digest = hashlib.sha256("|".join(str(part) for part in parts).encode()).hexdigest()[:32]
+    return Validator(f'"{digest}"', _http_time(last_modified), cache_control)
+
+
+async def for_versions(
+    db: AsyncSession, request: Request, keys: Iterable[str], cache_control: str = PRIVATE_REVALIDATE
+) -> Validator:
+    """Validator for a response built only from the resources behind `keys`"""
+    keys = sorted(key for key in keys if key)
+    rows = {row.key: row for row in await db.execute(versions.versions_query(*keys))}
+    parts = [request.url.path, request.url.query]
+    found = {}
+    stamps = []
+    for key in keys:
+        row = rows.get(key)
+        found[key] = row.version if row else 0
+        parts.append(f"{key}={found[key]}")
+        if row is not None and row.updated_at is not None:
+            stamps.append(row.updated_at)
+    # Without a timestamp for every key, Last-Modified could claim too old a time
+    last_modified = max(stamps) if stamps and len(stamps) == len(keys) else None
+    validator = make_validator(parts, last_modified, cache_control)
+    validator.versions = found
+    return validator
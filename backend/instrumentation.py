@@ -0,0 +1,370 @@
+"""
+Per-request performance instrumentation.
+
+For every HTTP request this records the route, status, wall time, time spent
+in the database, the number of SQL statements, the rows fetched from their
+cursors (ORM objects and column tuples alike) and the time spent validating
+and encoding the response (where lazy relationship loads show up as "lazy"
+queries). A statement sent N_PLUS_ONE_THRESHOLD times or more in one request
+is reported as a likely N+1 query.
+
+Serialization is timed from the moment the endpoint returns until FastAPI
+hands back the response (InstrumentedRoute), plus any FastJSONResponse
+rendered inside the endpoint itself (serializing()).
+
+The numbers are exposed two ways:
+
+    Server-Timing    on each response: app, db (with the query count),
+                     serialize, so browser dev tools show the breakdown
+    GET /metrics     per-route totals and histograms of this worker in the
+                     Prometheus text format; scrape every worker
+
+Settings:
+
+    INSTRUMENTATION          false disables it entirely
+    SERVER_TIMING            false stops sending the Server-Timing header
+    N_PLUS_ONE_THRESHOLD     repeats of one statement that count as N+1 (default 5)
+
+install() wires it into an app and its engines; call it before declaring
+routes so they are built with InstrumentedRoute.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+INSTRUMENTATION = os.getenv("INSTRUMENTATION", "true").lower() in ("1", "true", "yes")
+SERVER_TIMING = os.getenv("SERVER_TIMING", "true").lower() in ("1", "true", "yes")
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+# Routes are labelled by their template; anything unrouted shares one label
+UNMATCHED = "unmatched"
+
+
+class RequestStats:
+    __slots__ = ("method", "route", "status", "started", "db_seconds", "queries", "rows",
+                 "serialize_seconds", "lazy_queries", "serializing", "serialize_started", "statements")
+
+    def __init__(self, method: str):
+        self.method = method
+        self.route = UNMATCHED
+        self.status = 500
+        self.started = time.perf_counter()
+        self.db_seconds = 0.0
+        self.queries = 0
+        self.rows = 0
+        self.serialize_seconds = 0.0
+        self.lazy_queries = 0
+        self.serializing = False
+        self.serialize_started = None
+        self.statements = Counter()
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def repeated_statements(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> dict:
+        return {statement: n for statement, n in self.statements.items() if n >= threshold}
+
+    def server_timing(self) -> str:
+        parts = [
+            f"app;dur={self.elapsed() * 1000:.1f}",
+            f'db;dur={self.db_seconds * 1000:.1f};desc="{self.queries} queries, {self.rows} rows"',
+        ]
+        if self.serialize_seconds:
+            parts.append(f"serialize;dur={self.serialize_seconds * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current() -> Optional[RequestStats]:
+    """Stats of the request being handled, if any"""
+    return _current.get()
+
+
+# --- Metrics ---
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name: str, **labels) -> list[str]:
+        lines = [f"{name}_bucket{_labels(**labels, le=bound)} {n}" for bound, n in zip(self.buckets, self.counts)]
+        lines.append(f"{name}_bucket{_labels(**labels, le='+Inf')} {self.count}")
+        lines.append(f"{name}_sum{_labels(**labels)} {self.sum:.9g}")
+        lines.append(f"{name}_count{_labels(**labels)} {self.count}")
+        return lines
+
+
+class Metrics:
+    """Per-route totals for this process"""
+
+    COUNTERS = {
+        "db_seconds": ("http_request_db_seconds_total", "Time spent executing SQL"),
+        "queries": ("http_request_db_queries_total", "SQL statements executed"),
+        "rows": ("http_request_rows_loaded_total", "Rows fetched from SQL cursors"),
+        "serialize_seconds": ("http_request_serialize_seconds_total", "Time spent validating and encoding responses"),
+        "lazy_queries": ("http_request_lazy_queries_total", "SQL statements executed while serializing (lazy loads)"),
+        "n_plus_one": ("http_request_n_plus_one_total", "Requests that repeated a statement N_PLUS_ONE_THRESHOLD times or more"),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = Counter()
+        self.durations = defaultdict(lambda: _Histogram(DURATION_BUCKETS))
+        self.query_counts = defaultdict(lambda: _Histogram(QUERY_BUCKETS))
+        self.totals = defaultdict(Counter)
+
+    def observe(self, stats: RequestStats, n_plus_one: bool):
+        key = (stats.method, stats.route)
+        with self._lock:
+            self.requests[(*key, stats.status)] += 1
+            self.durations[key].observe(stats.elapsed())
+            self.query_counts[key].observe(stats.queries)
+            totals = self.totals[key]
+            for name in ("db_seconds", "queries", "rows", "serialize_seconds", "lazy_queries"):
+                totals[name] += getattr(stats, name)
+            totals["n_plus_one"] += n_plus_one
+
+    def render(self) -> str:
+        with self._lock:
+            lines = ["# HELP http_requests_total Requests handled", "# TYPE http_requests_total counter"]
+            for (method, route, status), n in sorted(self.requests.items()):
+                lines.append(f"http_requests_total{_labels(method=method, route=route, status=status)} {n}")
+
+            lines += ["# HELP http_request_duration_seconds Wall time of requests",
+                      "# TYPE http_request_duration_seconds histogram"]
+            for (method, route), histogram in sorted(self.durations.items()):
+                lines += histogram.lines("http_request_duration_seconds", method=method, route=route)
+
+            lines += ["# HELP http_request_db_queries SQL statements per request",
+                      "# TYPE http_request_db_queries histogram"]
+            for (method, route), histogram in sorted(self.query_counts.items()):
+                lines += histogram.lines("http_request_db_queries", method=method, route=route)
+
+            for field, (name, help_text) in self.COUNTERS.items():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                for (method, route), totals in sorted(self.totals.items()):
+                    value = totals[field]
+                    value = f"{value:.6f}" if isinstance(value, float) else value
+                    lines.append(f"{name}{_labels(method=method, route=route)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+_reported = set()
+
+
+def _report_n_plus_one(stats: RequestStats) -> bool:
+    repeated = stats.repeated_statements()
+    for statement, n in repeated.items():
+        # Once per route and statement, or a hot endpoint would flood the log
+        if (stats.route, statement) not in _reported:
+            _reported.add((stats.route, statement))
+            print(f"Possible N+1 in {stats.method} {stats.route}: {n}x {' '.join(statement.split())[:300]}")
+    return bool(repeated)
+
+
+# --- Hooks ---
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("instrumentation_started", []).append(time.perf_counter())
+
+
+class _CountingCursor:
+    """DB-API cursor that adds the rows fetched through it to `stats`"""
+
+    def __init__(self, cursor, stats: RequestStats):
+        object.__setattr__(self, "_cursor", cursor)
+        object.__setattr__(self, "_stats", stats)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._stats.rows += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._stats.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._stats.rows += len(rows)
+        return rows
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._cursor, name, value)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    started = conn.info.get("instrumentation_started")
+    if stats is None or not started:
+        return
+    stats.db_seconds += time.perf_counter() - started.pop()
+    stats.queries += 1
+    stats.statements[statement] += 1
+    if stats.serializing:
+        stats.lazy_queries += 1
+    # The result is built from context.cursor right after this event, so rows
+    # are counted however they are consumed (ORM objects, tuples, scalars)
+    if context is not None and not executemany and cursor.description is not None:
+        context.cursor = _CountingCursor(cursor, stats)
+
+
+def _handle_error(exception_context):
+    started = exception_context.connection.info.get("instrumentation_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+def instrument_engine(engine):
+    """Time and count the statements of `engine` (sync or async)"""
+    engine = getattr(engine, "sync_engine", engine)
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+@contextmanager
+def serializing():
+    """Count the enclosed work, and its queries, as serialization of the current request"""
+    stats = _current.get()
+    if stats is None or stats.serializing:
+        # Nothing to record, or already inside a timed serialization
+        yield
+        return
+    stats.serializing = True
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.serialize_seconds += time.perf_counter() - started
+        stats.serializing = False
+
+
+def _serialization_started():
+    stats = _current.get()
+    if stats is not None:
+        stats.serializing = True
+        stats.serialize_started = time.perf_counter()
+
+
+def _mark_return(call):
+    """Wrap an endpoint so the request's serialization starts when it returns"""
+    if asyncio.iscoroutinefunction(call):
+        async def endpoint(**values):
+            result = await call(**values)
+            _serialization_started()
+            return result
+    else:
+        # Runs in the threadpool with a copy of the context; the stats object is shared
+        def endpoint(**values):
+            result = call(**values)
+            _serialization_started()
+            return result
+    endpoint.instrumented = True
+    return endpoint
+
+
+class InstrumentedRoute(APIRoute):
+    """APIRoute that times FastAPI's response-model validation and encoding,
+    where lazy relationships get loaded"""
+
+    def get_route_handler(self):
+        # The dependant is already built from the original endpoint's signature
+        if not getattr(self.dependant.call, "instrumented", False):
+            self.dependant.call = _mark_return(self.dependant.call)
+        handler = super().get_route_handler()
+
+        async def instrumented_handler(request):
+            try:
+                return await handler(request)
+            finally:
+                stats = _current.get()
+                if stats is not None and stats.serialize_started is not None:
+                    stats.serialize_seconds += time.perf_counter() - stats.serialize_started
+                    stats.serialize_started = None
+                    stats.serializing = False
+
+        return instrumented_handler
+
+
+class InstrumentationMiddleware:
+    """ASGI middleware that collects RequestStats for each HTTP request"""
+
+    def __init__(self, app, server_timing: bool = SERVER_TIMING):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats(scope["method"])
+        token = _current.set(stats)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                stats.status = message["status"]
+                if self.server_timing:
+                    MutableHeaders(scope=message).append("Server-Timing", stats.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            stats.route = getattr(route, "path", UNMATCHED)
+            metrics.observe(stats, _report_n_plus_one(stats))
+
+
+def install(app, *engines):
+    """Instrument `app`, its routes declared from now on and the statements of `engines`"""
+    if not INSTRUMENTATION:
+        return
+    for engine in engines:
+        instrument_engine(engine)
+    app.router.route_class = InstrumentedRoute
+    app.add_middleware(InstrumentationMiddleware)
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Durable background jobs, queued in the database.
+
+Jobs are rows of the `jobs` table, so they survive restarts and need no
+broker. Every app process runs JOB_WORKERS job workers (started in the
+lifespan). A worker claims the next due job with one
+UPDATE ... WHERE id = (SELECT ... FOR UPDATE SKIP LOCKED) ... RETURNING, so
+each job is claimed by exactly one worker however many processes share the
+database (SQLite runs the UPDATE under its write lock). A claim is a lease:
+if its worker dies, the job can be claimed again once JOB_LEASE_SECONDS have
+passed, so handlers must be safe to run twice.
+
+    jobs.enqueue(db, "digests.refresh", {"...": ...}, run_at=..., idempotency_key=...)
+
+enqueue() writes in the caller's transaction, so a job queued alongside a
+write is committed (or rolled back) with it. An idempotency key makes
+enqueueing a no-op while a job with that key is still in the table, i.e.
+until JOB_RETENTION_DAYS after it finished.
+
+A failing job is retried with exponential backoff (JOB_RETRY_BASE_SECONDS,
+doubling up to JOB_RETRY_MAX_SECONDS) until it has been attempted
+max_attempts times; then it stays "failed" with its last error.
+
+Handlers are registered with @handler(kind) and called as fn(db, payload)
+with a fresh Session; they commit their own work. Periodic jobs are
+registered with every(kind, seconds): each interval slot is enqueued under
+the key "<kind>@<slot start>", so it runs once however many workers schedule
+it.
+
+Settings:
+
+    JOB_WORKERS               job workers per app process (default 1; 0 leaves jobs to `python jobs.py work`)
+    JOB_POLL_SECONDS          wait between claims when nothing is due (default 1)
+    JOB_LEASE_SECONDS         how long a claim lasts before the job may be retried (default 300)
+    JOB_MAX_ATTEMPTS          default attempts per job (default 5)
+    JOB_RETRY_BASE_SECONDS    delay before the first retry (default 30)
+    JOB_RETRY_MAX_SECONDS     longest retry delay (default 3600)
+    JOB_RETENTION_DAYS        finished jobs are pruned after this (default 7)
+
+    python jobs.py work                       # run job workers in this process
+    python jobs.py run                        # run whatever is due now, then exit (cron)
+    python jobs.py enqueue digests.refresh    # queue a job
+    python jobs.py status                     # jobs per kind and status
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import and_, delete, func, or_, select, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+import models
+from database import dialect_insert
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "30"))
+JOB_RETRY_MAX_SECONDS = float(os.getenv("JOB_RETRY_MAX_SECONDS", "3600"))
+JOB_RETENTION_DAYS = int(os.getenv("JOB_RETENTION_DAYS", "7"))
+# How often a process enqueues the current slot of each periodic job
+SCHEDULE_SECONDS = 10
+# How long shutdown waits for running jobs before cancelling them
+SHUTDOWN_SECONDS = 10
+ERROR_MAX_LENGTH = 2000
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+PRUNE = "jobs.prune"
+
+_EPOCH = datetime(1970, 1, 1)
+
+# kind -> fn(db, payload)
+HANDLERS: dict[str, Callable] = {}
+# kind -> interval in seconds
+PERIODIC: dict[str, float] = {}
+
+
+def handler(kind: str):
+    """Register the decorated fn(db, payload) as the handler of `kind` jobs"""
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+def every(kind: str, seconds: float):
+    """Run `kind` once per `seconds`-long slot; 0 or less unschedules it"""
+    if seconds > 0:
+        PERIODIC[kind] = seconds
+    else:
+        PERIODIC.pop(kind, None)
+
+
+def enqueue(
+    db,
+    kind: str,
+    payload: Optional[dict] = None,
+    run_at: Optional[datetime] = None,
+    idempotency_key: Optional[str] = None,
+    max_attempts: int = JOB_MAX_ATTEMPTS
+) -> bool:
+    """Queue a job in the transaction of `db` (a Session or Connection; the caller commits).
+
+    Returns False when a job with `idempotency_key` already exists.
+    """
+    bind = db.get_bind() if isinstance(db, Session) else db
+    result = db.execute(
+        dialect_insert(bind, models.Job.__table__)
+        .values(
+            kind=kind, payload=json.dumps(payload or {}), status=QUEUED, run_at=run_at or datetime.utcnow(),
+            idempotency_key=idempotency_key, attempts=0, max_attempts=max_attempts,
+        )
+        .on_conflict_do_nothing(index_elements=["idempotency_key"])
+    )
+    return result.rowcount == 1
+
+
+def retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=min(JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1), JOB_RETRY_MAX_SECONDS))
+
+
+def claim_statement(worker_id: str, now: datetime, lease_seconds: float):
+    """Take the next due job for `worker_id`; returns its (id, kind, payload, attempts, max_attempts) row"""
+    job = models.Job
+    due = or_(
+        and_(job.status == QUEUED, job.run_at <= now),
+        # A lease that ran out: its worker died or hung
+        and_(job.status == RUNNING, job.locked_until < now),
+    )
+    next_id = (
+        select(job.id).where(due).order_by(job.run_at, job.id).limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    return (
+        update(job)
+        .where(job.id == next_id)
+        .values(
+            status=RUNNING, attempts=job.attempts + 1, locked_by=worker_id,
+            locked_until=now + timedelta(seconds=lease_seconds),
+        )
+        .returning(job.id, job.kind, job.payload, job.attempts, job.max_attempts)
+    )
+
+
+def _release(conn: Connection, job_id: int, worker_id: str, **values):
+    # Only while the claim is still ours: once the lease ran out another worker owns the job
+    conn.execute(
+        update(models.Job)
+        .where(models.Job.id == job_id, models.Job.status == RUNNING, models.Job.locked_by == worker_id)
+        .values(locked_by=None, locked_until=None, **values)
+    )
+
+
+def schedule_periodic(conn: Connection, now: datetime) -> int:
+    """Enqueue the current slot of every periodic job that is not queued yet. Returns how many were added."""
+    slots = {}
+    for kind, seconds in PERIODIC.items():
+        start = _EPOCH + timedelta(seconds=(now - _EPOCH).total_seconds() // seconds * seconds)
+        slots[f"{kind}@{start.isoformat()}"] = (kind, start)
+    if not slots:
+        return 0
+    # Read first: the common case (all present) then takes no write lock
+    existing = set(conn.scalars(select(models.Job.idempotency_key).where(models.Job.idempotency_key.in_(slots))))
+    added = 0
+    for key, (kind, start) in slots.items():
+        if key not in existing and enqueue(conn, kind, run_at=start, idempotency_key=key):
+            added += 1
+    return added
+
+
+class JobQueue:
+    """Job workers of one process: asyncio tasks that claim and run jobs in threads"""
+
+    def __init__(
+        self,
+        engine: Engine,
+        workers: int = JOB_WORKERS,
+        poll_seconds: float = JOB_POLL_SECONDS,
+        lease_seconds: float = JOB_LEASE_SECONDS
+    ):
+        self.engine = engine
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._tasks = []
+        self._stopping = False
+        self._next_schedule = 0.0
+
+    def schedule(self) -> int:
+        with self.engine.begin() as conn:
+            return schedule_periodic(conn, datetime.utcnow())
+
+    def run_next(self) -> bool:
+        """Claim and run one due job. Returns False when nothing is due."""
+        with self.engine.begin() as conn:
+            job = conn.execute(claim_statement(self.worker_id, datetime.utcnow(), self.lease_seconds)).first()
+        if job is None:
+            return False
+
+        fn = HANDLERS.get(job.kind)
+        try:
+            if fn is None:
+                raise LookupError(f"No handler for job kind {job.kind!r}")
+            if job.attempts > job.max_attempts:
+                raise TimeoutError("Lease expired during the last attempt")
+            with Session(bind=self.engine) as db:
+                fn(db, json.loads(job.payload))
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}"[:ERROR_MAX_LENGTH]
+            now = datetime.utcnow()
+            with self.engine.begin() as conn:
+                if fn is None or job.attempts >= job.max_attempts:
+                    _release(conn, job.id, self.worker_id, status=FAILED, last_error=error, finished_at=now)
+                    print(f"Job {job.id} ({job.kind}) failed after {job.attempts} attempts: {error}")
+                else:
+                    delay = retry_delay(job.attempts)
+                    _release(conn, job.id, self.worker_id, status=QUEUED, last_error=error, run_at=now + delay)
+                    print(f"Job {job.id} ({job.kind}) failed, retrying in {delay.total_seconds():.0f}s: {error}")
+        else:
+            with self.engine.begin() as conn:
+                _release(conn, job.id, self.worker_id, status=DONE, finished_at=datetime.utcnow())
+        return True
+
+    def run_due(self) -> int:
+        """Schedule periodic jobs, then run jobs until none is due. Returns how many ran."""
+        self.schedule()
+        ran = 0
+        while self.run_next():
+            ran += 1
+        return ran
+
+    async def _run(self, scheduler: bool):
+        while not self._stopping:
+            ran = False
+            try:
+                if scheduler and time.monotonic() >= self._next_schedule:
+                    self._next_schedule = time.monotonic() + SCHEDULE_SECONDS
+                    await asyncio.to_thread(self.schedule)
+                ran = await asyncio.to_thread(self.run_next)
+            except Exception as exc:  # keep working through transient database errors
+                print(f"Job worker failed: {exc}")
+            if not ran:
+                await asyncio.sleep(self.poll_seconds)
+
+    async def start(self):
+        if self._tasks or self.workers <= 0:
+            return
+        self._stopping = False
+        # One scheduler per process is plenty; the slot keys dedupe across processes
+        self._tasks = [asyncio.create_task(self._run(scheduler=i == 0)) for i in range(self.workers)]
+
+    async def stop(self, timeout: float = SHUTDOWN_SECONDS):
+        """Let running jobs finish for up to `timeout`, then cancel; a cancelled job is retried after its lease"""
+        self._stopping = True
+        if self._tasks:
+            _, pending = await asyncio.wait(self._tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+        self._tasks = []
+
+
+def _default_queue() -> JobQueue:
+    from database import engine
+    return JobQueue(engine)
+
+
+queue = _default_queue()
+
+
+def status_counts(conn: Connection) -> list:
+    """(kind, status, count, earliest run_at) per kind and status"""
+    job = models.Job
+    return conn.execute(
+        select(job.kind, job.status, func.count(), func.min(job.run_at))
+        .group_by(job.kind, job.status)
+        .order_by(job.kind, job.status)
+    ).all()
+
+
+@handler(PRUNE)
+def prune(db: Session, payload: dict):
+    cutoff = datetime.utcnow() - timedelta(days=JOB_RETENTION_DAYS)
+    db.execute(delete(models.Job).where(models.Job.status.in_((DONE, FAILED)), models.Job.finished_at < cutoff))
+    db.commit()
+
+
+every(PRUNE, 86400)
+
+
+if __name__ == "__main__":
+    # Through the module, not __main__: that is where the handlers register
+    import digests, jobs, migrations
+    from database import engine
+
+    parser = argparse.ArgumentParser(description="Background job queue")
+    sub = parser.add_subparsers(dest="command", required=True)
+    work = sub.add_parser("work", help="Run job workers until interrupted")
+    work.add_argument("--workers", type=int, default=max(jobs.JOB_WORKERS, 1))
+    sub.add_parser("run", help="Run the jobs that are due, then exit")
+    add = sub.add_parser("enqueue", help="Queue a job")
+    add.add_argument("kind", choices=sorted(jobs.HANDLERS))
+    add.add_argument("--payload", type=json.loads, default=None, help="JSON object")
+    add.add_argument("--key", help="Idempotency key")
+    add.add_argument("--at", type=datetime.fromisoformat, help="Run at this UTC time (default now)")
+    sub.add_parser("status", help="Count jobs per kind and status")
+    args = parser.parse_args()
+
+    migrations.upgrade(engine)
+    if args.command == "work":
+        async def work_forever():
+            worker = jobs.JobQueue(engine, workers=args.workers)
+            await worker.start()
+            try:
+                await asyncio.Event().wait()
+            finally:
+                await worker.stop()
+        try:
+            asyncio.run(work_forever())
+        except KeyboardInterrupt:
+            pass
+    elif args.command == "run":
+        print(f"Ran {jobs.JobQueue(engine).run_due()} jobs")
+    elif args.command == "enqueue":
+        with engine.begin() as conn:
+            added = jobs.enqueue(conn, args.kind, args.payload, run_at=args.at, idempotency_key=args.key)
+        print(f"Queued {args.kind}" if added else f"A job with key {args.key!r} already exists")
+    else:
+        with engine.connect() as conn:
+            for kind, job_status, count, run_at in jobs.status_counts(conn):
+                print(f"{kind:24} {job_status:8} {count:8}  earliest run_at {run_at:%Y-%m-%d %H:%M:%S}")
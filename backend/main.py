@@ -1,64 +1,48 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-import crud, models, schemas, auth
-from database import SessionLocal, engine, Base
-from typing import List, Optional
-from fastapi.staticfiles import StaticFiles
+import async_crud, compression, crud, data_export, jobs, models, schemas, auth, pagination, migrations, events, http_cache, instrumentation, query_cache, rollups, search, serialization, versions
+from hashing import PoolSaturated, password_pool
+# Registers the digest jobs and their schedule with the job queue
+import digests  # noqa: F401
+import pdf_export
+from pdf_export import pdf_renderer
+from database import async_engine, engine, Base, get_async_db, get_db
+from typing import List, Literal, Optional
+from datetime import date, datetime, timedelta
 import os
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from weasyprint import HTML
-import io
+from fastapi.responses import JSONResponse, StreamingResponse
 from contextlib import asynccontextmanager
-import time
+from starlette.background import BackgroundTask
 
 # Import models before anything else to ensure they are registered with Base
 import models
 
-# Define a lock file path
-LOCK_FILE = "db_seed.lock"
-
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # --- Startup ---
-    # This check is to ensure seeding only runs in one worker process
-    if not os.path.exists(LOCK_FILE):
-        # Create the lock file to prevent other workers from running this
-        with open(LOCK_FILE, "w") as f:
-            f.write("locked")
-        
-        print("Application startup: Acquired lock, checking database...")
-        db = SessionLocal()
-        try:
-            # Check if tags already exist to prevent re-seeding
-            tags_exist = db.query(models.Tag).first()
-            if not tags_exist:
-                print("No tags found. Seeding initial tags.")
-                tags_to_create = ["Leadership", "Communication", "Teamwork", "Technical Skills", "Problem Solving"]
-                crud.get_or_create_tags(db, tags_to_create)
-                print("Initial tags seeded successfully.")
-            else:
-                print("Tags already exist in the database. Skipping seeding.")
-        finally:
-            db.close()
-            # Remove the lock file so startup can run on next deploy
-            if os.path.exists(LOCK_FILE):
-                os.remove(LOCK_FILE)
-            print("Lock released.")
-    else:
-        print("Startup lock found, another worker is handling seeding. Waiting...")
-        # Optional: wait a moment for the seeding to complete
-        time.sleep(5)
-
+    # Every worker runs this. Pending migrations (including seeding the default
+    # tags) are applied under a database lock, so exactly one worker applies
+    # each and the rest wait for it instead of racing; an up-to-date database
+    # costs a single read.
+    applied = migrations.upgrade(engine)
+    if applied:
+        print(f"Applied migrations: {applied}")
+    query_cache.warn_if_per_worker()
+
+    await events.backend.start()
+    await jobs.queue.start()
     yield
     # --- Shutdown ---
+    await jobs.queue.stop()
+    await events.backend.stop()
+    password_pool.shutdown()
+    pdf_renderer.shutdown()
     print("Application shutdown.")
 
-# Create tables
-models.Base.metadata.create_all(bind=engine)
-
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=serialization.FastJSONResponse)
 
 # CORS middleware
 origins = [
@@ -74,47 +58,61 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Server-Timing"],
 )
 
+compression.install(app)
+# Outermost, so Server-Timing covers everything above
+instrumentation.install(app, engine, async_engine)
+
 # Use the same password context as crud.py
 pwd_context = crud.pwd_context
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+@app.exception_handler(PoolSaturated)
+async def password_pool_saturated_handler(request: Request, exc: PoolSaturated):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Too many authentication requests, please retry shortly"},
+        headers={"Retry-After": "1"},
+    )
 
 # --- User Endpoints ---
 @app.post("/users", response_model=schemas.UserOut, tags=["Users"])
 @app.post("/users/", response_model=schemas.UserOut, tags=["Users"], include_in_schema=False)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_email(db, email=user.email)
+async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = await async_crud.get_user_by_email(db, email=user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    return crud.create_user(db=db, user=user)
+    hashed_password = await password_pool.hash(user.password)
+    return await async_crud.create_user(db=db, user=user, hashed_password=hashed_password)
 
 @app.get("/manager/{manager_id}/team", response_model=List[schemas.UserOut])
-def get_team_members(manager_id: str, db: Session = Depends(get_db), current_user: schemas.UserOut = Depends(auth.get_current_user)):
+async def get_team_members(manager_id: str, request: Request, response: Response, include_subtree: bool = False, db: AsyncSession = Depends(get_async_db), current_user: schemas.UserOut = Depends(auth.get_current_user_async)):
     if manager_id != current_user.id:
         raise HTTPException(status_code=403, detail="You are not authorized to view this team")
+    if include_subtree:
+        # Everyone below this manager, at any depth
+        return await async_crud.get_org_members(db, manager_id)
+    validator = await http_cache.for_versions(db, request, [versions.team(manager_id)])
+    if validator.matches(request):
+        return validator.not_modified()
+    response.headers.update(validator.headers)
     # Now returns only employees assigned to this specific manager
-    return crud.get_team_members(db, manager_id)
+    return await async_crud.get_team_members(db, manager_id, validator.versions[versions.team(manager_id)])
 
 @app.get("/users/by_email/{email}", response_model=schemas.UserOut)
-def get_user_by_email_endpoint(email: str, db: Session = Depends(get_db)):
-    user = crud.get_user_by_email(db, email)
+async def get_user_by_email_endpoint(email: str, db: AsyncSession = Depends(get_async_db)):
+    user = await async_crud.get_user_by_email(db, email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
 # --- Team Management Endpoints ---
 @app.get("/manager/{manager_id}/available-employees", response_model=List[schemas.UserOut])
-def get_available_employees(manager_id: str, db: Session = Depends(get_db)):
+async def get_available_employees(manager_id: str, db: AsyncSession = Depends(get_async_db)):
     """Get all employees not assigned to any manager"""
-    return crud.get_available_employees(db)
+    return await async_crud.get_available_employees(db)
 
 @app.post("/manager/{manager_id}/assign-employee/{employee_id}")
 def assign_employee_to_manager(manager_id: str, employee_id: str, db: Session = Depends(get_db)):
@@ -124,29 +122,56 @@ def assign_employee_to_manager(manager_id: str, employee_id: str, db: Session =
         raise HTTPException(status_code=400, detail="Failed to assign employee to manager")
     return {"message": "Employee assigned successfully"}
 
+@app.post("/manager/{manager_id}/assign-employees", response_model=schemas.BatchResult)
+def assign_employees_to_manager(
+    manager_id: str,
+    batch: schemas.TeamAssignmentBatch,
+    db: Session = Depends(get_db),
+    current_user: schemas.UserOut = Depends(auth.get_current_user)
+):
+    """Assign many employees to a manager in one transaction"""
+    if current_user.role != schemas.RoleEnum.manager or manager_id != current_user.id:
+        raise HTTPException(status_code=403, detail="You can only assign employees to your own team")
+    results = crud.assign_employees_to_manager(db, batch.employee_ids, manager_id)
+    return crud.batch_summary(results)
+
 # --- Feedback Endpoints ---
 @app.post("/seed-db")
 def seed_db(db: Session = Depends(get_db)):
     """Seed the database with some initial data."""
-    tags_to_create = ["Leadership", "Communication", "Teamwork", "Technical Skills", "Problem Solving"]
-    crud.get_or_create_tags(db, tags_to_create)
+    crud.get_or_create_tags(db, migrations.DEFAULT_TAGS)
     return {"message": "Database seeded successfully with tags."}
 
 @app.get("/")
 def read_root():
     return {"message": "Feedback System API is running"}
 
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """Per-route request, database and serialization metrics of this worker, in Prometheus text format"""
+    return Response(instrumentation.metrics.render(), media_type=instrumentation.CONTENT_TYPE)
+
+@app.get("/metrics/query-cache")
+def query_cache_metrics():
+    """Hit/miss/eviction counters of the listing cache in this worker"""
+    return query_cache.stats()
+
+@app.get("/metrics/password-pool")
+def password_pool_metrics():
+    """Queue depth, rejections and latency of the password hashing pool"""
+    return password_pool.metrics()
+
 @app.post("/token", response_model=schemas.Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
     print(f"Login attempt for email: {form_data.username}")
     
-    user = crud.get_user_by_email(db, email=form_data.username)
+    user = await async_crud.get_user_by_email(db, email=form_data.username)
     
     if not user:
         raise HTTPException(status_code=404, detail="User not found, please register first.")
     
-    # Verify password using local pwd_context
-    if not auth.verify_password(form_data.password, user.hashed_password):
+    # Verify password on the password pool so bcrypt doesn't block the event loop
+    if not await password_pool.verify(form_data.password, user.hashed_password):
         print(f"Password verification failed for user: {form_data.username}")
         print(f"Input password: {form_data.password}")
         print(f"Stored hash: {user.hashed_password}")
@@ -158,21 +183,19 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
         )
     
     print(f"Password verified successfully for user: {user.email}")
-    access_token = auth.create_access_token(data={"sub": user.email})
+    access_token = auth.create_access_token(data=auth.token_claims(user))
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.post("/reset-password/{email}")
-def reset_user_password(email: str, new_password: str, db: Session = Depends(get_db)):
+async def reset_user_password(email: str, new_password: str, db: AsyncSession = Depends(get_async_db)):
     """Reset a user's password (for debugging purposes)"""
-    user = crud.get_user_by_email(db, email=email)
+    user = await async_crud.get_user_by_email(db, email=email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     # Hash the new password
-    hashed_password = pwd_context.hash(new_password)
-    user.hashed_password = hashed_password
-    db.commit()
-    db.refresh(user)
+    hashed_password = await password_pool.hash(new_password)
+    await async_crud.update_user_password(db, user, hashed_password)
     
     print(f"Password reset for user: {email}")
     print(f"New hash: {hashed_password}")
@@ -196,28 +219,137 @@ def create_feedback(
         
     return new_feedback
 
-@app.get("/feedback/employee/", response_model=List[schemas.FeedbackOut])
-def get_feedback_for_employee(
-    db: Session = Depends(get_db), 
+# --- Timelines ---
+async def load_timeline(db: AsyncSession, cursor, limit, fields, **owner):
+    """Load a timeline page as JSON-ready dicts. Returns (items, next_cursor)."""
+    try:
+        field_list = schemas.parse_feedback_fields(fields)
+        if field_list is None:
+            # Full FeedbackOut rows come straight from column tuples, without ORM objects or validation
+            return await async_crud.get_feedback_timeline_rows(db, cursor=cursor, limit=limit, **owner)
+        feedbacks, next_cursor = await async_crud.get_feedback_timeline(
+            db, cursor=cursor, limit=limit, fields=field_list, **owner
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return [schemas.project_feedback(fb, field_list) for fb in feedbacks], next_cursor
+
+async def timeline_validator(request: Request, db: AsyncSession, manager_id=None, employee_id=None, include_subtree=False):
+    """None for whole-org timelines: versions are kept per manager, so a subtree has no cheap validator"""
+    if include_subtree:
+        return None
+    return await http_cache.for_versions(db, request, [versions.manager(manager_id), versions.employee(employee_id)])
+
+async def timeline_response(request: Request, db: AsyncSession, cursor, limit, fields, **owner):
+    """Timeline as a plain list; the next page's cursor goes in the X-Next-Cursor header.
+
+    Without `limit` or `cursor` the whole history is returned, as before. The
+    items are already JSON-ready, so the response model is documentation only.
+    """
+    validator = await timeline_validator(request, db, **owner)
+    if validator and validator.matches(request):
+        return validator.not_modified()
+    if cursor and limit is None:
+        limit = pagination.DEFAULT_PAGE_SIZE
+    items, next_cursor = await load_timeline(db, cursor, limit, fields, **owner)
+    headers = dict(validator.headers) if validator else {}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return serialization.FastJSONResponse(content=items, headers=headers)
+
+@app.post("/feedback/batch", response_model=schemas.BatchResult)
+def create_feedback_batch(
+    batch: schemas.FeedbackBatchCreate,
+    db: Session = Depends(get_db),
+    current_user: schemas.UserOut = Depends(auth.get_current_user)
+):
+    """Create feedback for many employees in one transaction"""
+    if current_user.role != schemas.RoleEnum.manager:
+        raise HTTPException(status_code=403, detail="Only managers can create feedback")
+    results = crud.create_feedback_batch(db, batch.items, manager_id=current_user.id)
+    return crud.batch_summary(results)
+
+@app.post("/feedback/acknowledge/batch", response_model=schemas.BatchResult)
+def acknowledge_feedback_batch(
+    batch: schemas.AcknowledgementBatch,
+    db: Session = Depends(get_db),
     current_user: schemas.UserOut = Depends(auth.get_current_user)
+):
+    """Acknowledge many feedback items in one transaction"""
+    results = crud.acknowledge_feedback_batch(db, batch.items, employee_id=current_user.id)
+    return crud.batch_summary(results)
+
+@app.get("/feedback/employee/", response_model=List[schemas.FeedbackOut])
+async def get_feedback_for_employee(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=pagination.MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db), 
+    current_user: schemas.UserOut = Depends(auth.get_current_user_async)
 ):
     if current_user.role != schemas.RoleEnum.employee:
         raise HTTPException(status_code=403, detail="Only employees can view their feedback timeline")
-    return crud.get_feedback_for_employee(db, employee_id=current_user.id)
+    return await timeline_response(request, db, cursor, limit, fields, employee_id=current_user.id)
 
 @app.get("/feedback/manager/", response_model=List[schemas.FeedbackOut])
-def get_feedback_for_manager(
-    db: Session = Depends(get_db), 
-    current_user: schemas.UserOut = Depends(auth.get_current_user)
+async def get_feedback_for_manager(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=pagination.MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    include_subtree: bool = False,
+    db: AsyncSession = Depends(get_async_db), 
+    current_user: schemas.UserOut = Depends(auth.get_current_user_async)
 ):
+    """Feedback the manager gave; with include_subtree, also feedback given by everyone below them"""
     if current_user.role != schemas.RoleEnum.manager:
         raise HTTPException(status_code=403, detail="Only managers can view their sent feedback")
-    return crud.get_feedback_for_manager(db, manager_id=current_user.id)
+    return await timeline_response(
+        request, db, cursor, limit, fields, manager_id=current_user.id, include_subtree=include_subtree
+    )
+
+@app.get("/feedback/search", response_model=schemas.FeedbackSearchResults)
+async def search_feedback(
+    q: str = Query(..., min_length=1, max_length=200),
+    employee_id: Optional[str] = None,
+    manager_id: Optional[str] = None,
+    tag_id: Optional[int] = None,
+    sentiment: Optional[models.SentimentEnum] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(search.SEARCH_PAGE_SIZE, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.UserOut = Depends(auth.get_current_user_async)
+):
+    """Keyword search over strengths, improvements and acknowledgement comments, best match first.
+
+    Managers search the feedback they gave, employees the feedback they received.
+    """
+    if current_user.role == schemas.RoleEnum.manager:
+        manager_id = current_user.id
+    else:
+        employee_id = current_user.id
+    try:
+        return await async_crud.search_feedback(
+            db, q, manager_id=manager_id, employee_id=employee_id, tag_id=tag_id,
+            sentiment=sentiment, start=start, end=end, cursor=cursor, limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/feedback/{feedback_id}", response_model=schemas.FeedbackOut)
-def get_feedback_by_id(feedback_id: str, db: Session = Depends(get_db)):
+async def get_feedback_by_id(feedback_id: str, request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
     """Get a specific feedback by ID"""
-    feedback = crud.get_feedback_by_id(db, feedback_id)
+    owners = await async_crud.get_feedback_owners(db, feedback_id)
+    if not owners:
+        raise HTTPException(status_code=404, detail="Feedback not found")
+    validator = await http_cache.for_versions(db, request, versions.feedback_keys(*owners))
+    if validator.matches(request):
+        return validator.not_modified()
+    response.headers.update(validator.headers)
+    feedback = await async_crud.get_feedback_details(db, feedback_id)
     if not feedback:
         raise HTTPException(status_code=404, detail="Feedback not found")
     return feedback
@@ -280,81 +412,331 @@ def create_feedback_request(
     )
 
 @app.get("/feedback-requests/manager/", response_model=List[schemas.FeedbackRequestOut])
-def get_feedback_requests_for_manager(
-    db: Session = Depends(get_db),
-    current_user: schemas.UserOut = Depends(auth.get_current_user)
+async def get_feedback_requests_for_manager(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.UserOut = Depends(auth.get_current_user_async)
 ):
     if current_user.role != schemas.RoleEnum.manager:
         raise HTTPException(status_code=403, detail="Only managers can view feedback requests.")
     
-    return crud.get_open_feedback_requests(db=db, manager_id=current_user.id)
+    return await async_crud.get_open_feedback_requests(db=db, manager_id=current_user.id)
 
-@app.get("/feedback/{feedback_id}/pdf")
-def export_feedback_to_pdf(
-    feedback_id: str,
-    db: Session = Depends(get_db),
-    current_user: schemas.UserOut = Depends(auth.get_current_user)
-):
-    feedback = crud.get_feedback_details(db, feedback_id)
+async def get_viewable_feedback(db: AsyncSession, feedback_id: str, current_user: schemas.UserOut):
+    """Load a feedback report, allowing only the manager or employee involved"""
+    feedback = await async_crud.get_feedback_details(db, feedback_id)
     if not feedback:
         raise HTTPException(status_code=404, detail="Feedback not found")
-
-    # Security check: only manager or employee involved can download
-    if not (current_user.id == feedback.manager_id or current_user.id == feedback.employee_id):
+    if not crud.can_view_feedback(feedback, current_user.id):
         raise HTTPException(status_code=403, detail="You are not authorized to view this feedback")
+    return feedback
+
+def pdf_file_response(request: Request, key: str, file, feedback_id: str):
+    """Send an open cached PDF (closed once sent), or 304 when the client has this version"""
+    headers = {"ETag": f'"{key}"', "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        if file is not None:
+            file.close()
+        return Response(status_code=304, headers=headers)
+    headers["Content-Disposition"] = f"attachment; filename=feedback_{feedback_id}.pdf"
+    headers["Content-Length"] = str(os.fstat(file.fileno()).st_size)
+    return StreamingResponse(
+        pdf_export.stream_open(file), media_type="application/pdf", headers=headers,
+        # In case the body is never iterated; closing twice is harmless
+        background=BackgroundTask(file.close),
+    )
 
-    html_content = f"""
-    <html>
-        <head>
-            <title>Feedback Report</title>
-            <style>
-                body {{ font-family: sans-serif; }}
-                h1 {{ color: #333; }}
-                .feedback-card {{ border: 1px solid #ccc; padding: 20px; border-radius: 8px; }}
-                .label {{ font-weight: bold; }}
-            </style>
-        </head>
-        <body>
-            <h1>Feedback Report</h1>
-            <div class="feedback-card">
-                <p><span class="label">To:</span> {feedback.employee.name}</p>
-                <p><span class="label">From:</span> {feedback.manager.name}</p>
-                <p><span class="label">Date:</span> {feedback.created_at.strftime('%B %d, %Y')}</p>
-                <hr>
-                <h3>Strengths:</h3>
-                <p>{feedback.strengths}</p>
-                <h3>Areas to Improve:</h3>
-                <p>{feedback.improvements}</p>
-                <p><span class="label">Sentiment:</span> {feedback.sentiment.value}</p>
-            </div>
-        </body>
-    </html>
+@app.get("/feedback/{feedback_id}/pdf")
+async def export_feedback_to_pdf(
+    feedback_id: str,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.UserOut = Depends(auth.get_current_user_async)
+):
+    feedback = await get_viewable_feedback(db, feedback_id, current_user)
+    snap = pdf_export.snapshot(feedback)
+    key = pdf_export.cache_key(snap)
+    if request.headers.get("if-none-match") == f'"{key}"':
+        return pdf_file_response(request, key, None, feedback_id)
+
+    file = await pdf_renderer.render(snap)
+    return pdf_file_response(request, key, file, feedback_id)
+
+@app.post("/feedback/export")
+async def bulk_export_feedback(
+    export: schemas.FeedbackExportRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.UserOut = Depends(auth.get_current_user_async)
+):
+    """Export many feedback reports as a streamed ZIP of PDFs, or as one merged PDF.
+
+    Without `feedback_ids` a manager exports the feedback they gave their team
+    and an employee the feedback they received. With `include_subtree` a
+    manager may also export feedback given by anyone below them.
     """
+    owner, managers = {}, set()
+    subtree = export.include_subtree and current_user.role == schemas.RoleEnum.manager
+    if subtree:
+        managers = await async_crud.get_subtree_ids(db, current_user.id)
+    if export.feedback_ids is None:
+        if current_user.role == schemas.RoleEnum.manager:
+            owner = {"manager_id": current_user.id, "include_subtree": subtree}
+        else:
+            owner = {"employee_id": current_user.id}
+    filters = dict(feedback_ids=export.feedback_ids, start=export.start, end=export.end, **owner)
+    if export.feedback_ids is not None:
+        # Bounded by the request; without ids the owner filter already limits rows to the caller's
+        rows = await async_crud.get_feedback_access(db, **filters)
+        found = {row.id for row in rows}
+        missing = [fid for fid in export.feedback_ids if fid not in found]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Feedback not found: {', '.join(missing)}")
+        if any(not crud.can_view_feedback(row, current_user.id, managers) for row in rows):
+            raise HTTPException(status_code=403, detail="You are not authorized to view this feedback")
+        count = len(rows)
+    else:
+        count = await async_crud.count_feedback(db, **filters)
+    if not count:
+        raise HTTPException(status_code=404, detail="No feedback to export")
 
-    pdf_bytes = HTML(string=html_content).write_pdf()
-    
-    return StreamingResponse(io.BytesIO(pdf_bytes), media_type="application/pdf", headers={
-        "Content-Disposition": f"attachment; filename=feedback_{feedback_id}.pdf"
+    if export.format == "pdf" and count > pdf_export.PDF_MERGE_MAX_DOCUMENTS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Merged PDFs are limited to {pdf_export.PDF_MERGE_MAX_DOCUMENTS} reports; use format=zip"
+        )
+
+    # Rows are read and snapshotted batch by batch as the renders need them
+    snaps = pdf_export.snapshots(async_crud.iter_feedback_details(pdf_export.PDF_EXPORT_BATCH_SIZE, **filters))
+    if export.format == "pdf":
+        file = pdf_export.open_temporary(await pdf_renderer.render_merged([snap async for snap in snaps]))
+        return StreamingResponse(pdf_export.stream_open(file), media_type="application/pdf", headers={
+            "Content-Disposition": "attachment; filename=feedback_export.pdf",
+            "Content-Length": str(os.fstat(file.fileno()).st_size),
+        }, background=BackgroundTask(file.close))
+    return StreamingResponse(pdf_renderer.stream_zip(snaps), media_type="application/zip", headers={
+        "Content-Disposition": "attachment; filename=feedback_export.zip"
     })
 
+@app.post("/feedback/{feedback_id}/pdf/jobs", status_code=202)
+async def submit_pdf_job(
+    feedback_id: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.UserOut = Depends(auth.get_current_user_async)
+):
+    """Start rendering a report in the background; poll the job, then fetch it"""
+    feedback = await get_viewable_feedback(db, feedback_id, current_user)
+    job_id = pdf_renderer.submit(pdf_export.snapshot(feedback))
+    return {"job_id": job_id, "status": pdf_renderer.status(job_id)}
+
+@app.get("/feedback/{feedback_id}/pdf/jobs/{job_id}")
+async def get_pdf_job(
+    feedback_id: str,
+    job_id: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.UserOut = Depends(auth.get_current_user_async)
+):
+    feedback = await get_viewable_feedback(db, feedback_id, current_user)
+    # Jobs are addressed by the report's current cache key; older versions are gone
+    job_status = pdf_renderer.status(job_id)
+    if job_id != pdf_export.cache_key(pdf_export.snapshot(feedback)) or job_status == "unknown":
+        raise HTTPException(status_code=404, detail="PDF job not found")
+    return {"job_id": job_id, "status": job_status}
+
+@app.get("/feedback/{feedback_id}/pdf/jobs/{job_id}/download")
+async def download_pdf_job(
+    feedback_id: str,
+    job_id: str,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.UserOut = Depends(auth.get_current_user_async)
+):
+    feedback = await get_viewable_feedback(db, feedback_id, current_user)
+    if job_id != pdf_export.cache_key(pdf_export.snapshot(feedback)):
+        raise HTTPException(status_code=404, detail="PDF is not ready")
+    file = pdf_renderer.cache.open(job_id)
+    if file is None:
+        raise HTTPException(status_code=404, detail="PDF is not ready")
+    return pdf_file_response(request, job_id, file, feedback_id)
+
+# --- Incremental sync ---
+@app.get("/sync/changes", response_model=schemas.SyncChanges)
+async def sync_changes(
+    since: Optional[str] = Query(None, description="Watermark from the previous response; omit for a full sync"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.UserOut = Depends(auth.get_current_user_async)
+):
+    """Feedback, acknowledgements and feedback requests changed since `since`.
+
+    Store the returned watermark and send it back next time. While `has_more`
+    is true, call again straight away to fetch the rest.
+    """
+    try:
+        return await async_crud.get_changes(db, current_user, since)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# --- Live updates ---
+@app.post("/events/ticket", response_model=schemas.StreamTicket)
+async def create_stream_ticket(current_user: schemas.UserOut = Depends(auth.get_current_user_async)):
+    """Ticket for opening /events/stream. EventSource cannot send headers, so it goes
+    in the URL; it expires after STREAM_TICKET_SECONDS and is good for nothing else."""
+    return {"ticket": auth.create_stream_ticket(current_user), "expires_in": auth.STREAM_TICKET_SECONDS}
+
+@app.get("/events/stream")
+async def event_stream(
+    request: Request,
+    last_event_id: Optional[int] = Query(None, description="Resume after this event; the Last-Event-ID header takes precedence"),
+    current_user: schemas.UserOut = Depends(auth.get_stream_user)
+):
+    """Server-Sent Events with deltas for everything the current user can see.
+
+    Browsers reconnect on their own and send Last-Event-ID, so missed events
+    are replayed. A `reset` event means the gap was too long to replay; reload once.
+    """
+    header = request.headers.get("last-event-id")
+    if header:
+        try:
+            last_event_id = int(header)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+    return StreamingResponse(
+        events.stream(current_user.id, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# --- Bulk data export ---
+@app.get("/export/{dataset}")
+async def export_data(
+    dataset: Literal["feedback", "acknowledgements", "requests", "tags"],
+    format: Literal["ndjson", "csv"] = "ndjson",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    manager_id: Optional[str] = Query(None, description="Only this manager's org subtree"),
+    after: Optional[str] = Query(None, description="Resume after the row with this key (the first column)"),
+    db: AsyncSession = Depends(get_async_db),
+    caller: Optional[schemas.UserOut] = Depends(auth.get_export_user)
+):
+    """Stream a dataset as NDJSON or CSV for analytics tools.
+
+    With X-Export-Key any subtree (or the whole org) can be exported; a
+    signed-in manager can export their own subtree. Rows come in key order,
+    so an interrupted download continues with `after` set to the first
+    column of the last complete row (a resumed CSV has no header row).
+    """
+    if caller is not None:
+        if caller.role != schemas.RoleEnum.manager:
+            raise HTTPException(status_code=403, detail="Only managers can export data")
+        if manager_id is None:
+            manager_id = caller.id
+        elif manager_id not in await async_crud.get_subtree_ids(db, caller.id):
+            raise HTTPException(status_code=403, detail="You can only export your own org subtree")
+    try:
+        data_export.export_query(dataset, start, end, manager_id, after)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        data_export.stream(engine, dataset, format, start, end, manager_id, after, header=after is None),
+        media_type=data_export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f"attachment; filename={dataset}.{format}"},
+    )
+
 # --- Dashboard Endpoints ---
 @app.get("/dashboard/manager/{manager_id}")
-def get_manager_dashboard(manager_id: str, db: Session = Depends(get_db), current_user: schemas.UserOut = Depends(auth.get_current_user)):
+async def get_manager_dashboard(
+    manager_id: str,
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    include_subtree: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.UserOut = Depends(auth.get_current_user_async)
+):
     if manager_id != current_user.id:
         raise HTTPException(status_code=403, detail="You are not authorized to view this dashboard")
-    # This is just an example, you might want a more complex dashboard
-    feedbacks = crud.get_feedback_for_manager(db, manager_id)
-    return {"timeline": feedbacks}
+    owner = {"manager_id": manager_id, "include_subtree": include_subtree}
+    validator = await timeline_validator(request, db, **owner)
+    if validator and validator.matches(request):
+        return validator.not_modified()
+    feedbacks, next_cursor = await load_timeline(db, cursor, limit, fields, **owner)
+    return serialization.FastJSONResponse(
+        content={"timeline": feedbacks, "next_cursor": next_cursor},
+        headers=dict(validator.headers) if validator else None,
+    )
 
 @app.get("/dashboard/employee/{employee_id}")
-def employee_dashboard(employee_id: str, db: Session = Depends(get_db), current_user: schemas.UserOut = Depends(auth.get_current_user)):
+async def employee_dashboard(
+    employee_id: str,
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.UserOut = Depends(auth.get_current_user_async)
+):
     if employee_id != current_user.id:
         raise HTTPException(status_code=403, detail="You are not authorized to view this dashboard")
-    feedbacks = crud.get_feedback_for_employee(db, employee_id)
-    return {"timeline": feedbacks}
+    validator = await timeline_validator(request, db, employee_id=employee_id)
+    if validator.matches(request):
+        return validator.not_modified()
+    feedbacks, next_cursor = await load_timeline(db, cursor, limit, fields, employee_id=employee_id)
+    return serialization.FastJSONResponse(
+        content={"timeline": feedbacks, "next_cursor": next_cursor}, headers=dict(validator.headers)
+    )
+
+@app.get("/dashboard/digest/", response_model=schemas.DigestOut)
+async def get_digest(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.UserOut = Depends(auth.get_current_user_async)
+):
+    """What is waiting on the current user, as of the last digest refresh (see digests.py)"""
+    digest = await async_crud.get_digest(db, current_user.id)
+    computed_at = digest.computed_at if digest else None
+    validator = http_cache.make_validator(
+        [request.url.path, current_user.id, computed_at], computed_at, http_cache.PRIVATE_REVALIDATE
+    )
+    if validator.matches(request):
+        return validator.not_modified()
+    response.headers.update(validator.headers)
+    return digest or schemas.DigestOut()
+
+# --- Analytics ---
+TREND_DEFAULT_SPAN = {rollups.DAY: timedelta(days=90), rollups.WEEK: timedelta(weeks=26), rollups.MONTH: timedelta(days=365)}
+
+@app.get("/analytics/trends", response_model=schemas.Trends)
+async def get_trends(
+    grain: Literal["day", "week", "month"] = "week",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    employee_id: Optional[str] = None,
+    tag_id: Optional[int] = None,
+    sentiment: Optional[models.SentimentEnum] = None,
+    by_tag: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.UserOut = Depends(auth.get_current_user_async)
+):
+    """Feedback, sentiment and time-to-acknowledge per day, week or month, from the rollup tables.
+
+    Managers see the feedback they gave (optionally for one employee), employees what they received.
+    `by_tag=true` breaks every bucket down per tag.
+    """
+    end = end or datetime.utcnow().date()
+    start = start or end - TREND_DEFAULT_SPAN[grain]
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if current_user.role == schemas.RoleEnum.manager:
+        owner = {"manager_id": current_user.id, "employee_id": employee_id}
+    else:
+        owner = {"employee_id": current_user.id}
+    buckets = await async_crud.get_trends(
+        db, grain, start, end, tag_id=tag_id, sentiment=sentiment, by_tag=by_tag, **owner
+    )
+    return {"grain": grain, "start": start, "end": end, "buckets": buckets}
 
 @app.get("/users/me/", response_model=schemas.UserOut)
-def read_users_me(current_user: schemas.UserOut = Depends(auth.get_current_user)):
+async def read_users_me(current_user: schemas.UserOut = Depends(auth.get_current_user_async)):
     return current_user
 
 def get_manager_dashboard_data(
@@ -367,20 +749,33 @@ def get_manager_dashboard_data(
     return crud.get_manager_dashboard_stats(db, manager_id=current_user.id)
 
 @app.get("/tags/", response_model=List[schemas.Tag])
-def read_tags(db: Session = Depends(get_db), current_user: schemas.UserOut = Depends(auth.get_current_user)):
-    return crud.get_tags(db)
+async def read_tags(request: Request, response: Response, db: AsyncSession = Depends(get_async_db), current_user: schemas.UserOut = Depends(auth.get_current_user_async)):
+    validator = await http_cache.for_versions(db, request, [versions.TAGS], http_cache.PRIVATE_SHORT)
+    if validator.matches(request):
+        return validator.not_modified()
+    response.headers.update(validator.headers)
+    return await async_crud.get_tags(db)
 
 @app.get("/dashboard/manager-stats/")
-def get_manager_dashboard_stats(
-    db: Session = Depends(get_db),
-    current_user: schemas.UserOut = Depends(auth.get_current_user)
+async def get_manager_dashboard_stats(
+    request: Request,
+    response: Response,
+    include_subtree: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.UserOut = Depends(auth.get_current_user_async)
 ):
+    """Stats of the feedback the manager gave; with include_subtree, of their whole org"""
     if current_user.role != schemas.RoleEnum.manager:
         raise HTTPException(status_code=403, detail="Only managers can access this dashboard")
+    if not include_subtree:
+        validator = await http_cache.for_versions(db, request, [versions.manager(current_user.id)])
+        if validator.matches(request):
+            return validator.not_modified()
+        response.headers.update(validator.headers)
     
-    return crud.get_manager_dashboard_stats(db, manager_id=current_user.id)
+    return await async_crud.get_manager_dashboard_stats(db, manager_id=current_user.id, include_subtree=include_subtree)
 
 # --- Static files for frontend ---
 dist_path = os.path.join("frontend", "dist")
 if os.path.exists(dist_path):
-    app.mount("/", StaticFiles(directory=dist_path, html=True), name="static")
+    app.mount("/", compression.PrecompressedStaticFiles(directory=dist_path, html=True), name="static")
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Schema migrations.
+
+Migrations are plain functions applied once each, in version order, and
+recorded in the schema_migrations table. Version 1 creates any missing
+tables, so it covers both fresh databases and existing feedback.db files; the
+migrations after it bring existing databases up to date and must therefore be
+safe to run against a schema that create_all has just built.
+
+    python migrations.py            # apply pending migrations
+    python migrations.py status     # list applied / pending migrations
+
+Every worker calls upgrade() on startup. Pending migrations are applied under
+a database-wide lock (BEGIN IMMEDIATE on SQLite, an advisory lock on
+PostgreSQL), so when several workers start at once one of them applies each
+migration and the others wait for it, then find it applied.
+"""
+
+import argparse
+import os
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, insert, select, text, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+import hierarchy, models, rollups, search
+from database import SQLITE_BUSY_TIMEOUT_MS, Base, dialect_insert
+
+# How long a worker waits for another one's migration before giving up
+MIGRATION_LOCK_TIMEOUT = float(os.getenv("MIGRATION_LOCK_TIMEOUT", "600"))
+# Arbitrary key of the PostgreSQL advisory lock
+MIGRATION_LOCK_KEY = 7_240_331
+
+DEFAULT_TAGS = ["Leadership", "Communication", "Teamwork", "Technical Skills", "Problem Solving"]
+
+migration_metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations", migration_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+MIGRATIONS = []
+
+
+def migration(version: int, description: str):
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+def create_missing_indexes(conn: Connection, *index_names: str):
+    """Create the named indexes (as declared in models.py) that don't exist yet"""
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in index_names and index.name not in existing:
+                index.create(bind=conn)
+
+
+# --- Migrations ---
+
+@migration(1, "Create tables")
+def _create_tables(conn: Connection):
+    Base.metadata.create_all(bind=conn)
+
+
+@migration(2, "Composite and partial indexes for hot query predicates")
+def _hot_path_indexes(conn: Connection):
+    create_missing_indexes(
+        conn,
+        "ix_feedback_manager_created",
+        "ix_feedback_employee_created",
+        "ix_feedback_tags_tag",
+        "ix_acknowledgements_feedback_employee",
+        "ix_acknowledgements_employee",
+        "ix_users_role_manager",
+        "ix_feedback_requests_open_manager",
+    )
+
+
+@migration(3, "Resource version counters")
+def _resource_versions(conn: Connection):
+    models.ResourceVersion.__table__.create(bind=conn, checkfirst=True)
+
+
+@migration(4, "Event log for the database event broker")
+def _events(conn: Connection):
+    models.Event.__table__.create(bind=conn, checkfirst=True)
+
+
+@migration(5, "Change tracking for /sync/changes")
+def _change_tracking(conn: Connection):
+    columns = {c["name"] for c in inspect(conn).get_columns("feedback_requests")}
+    if "updated_at" not in columns:
+        column_type = DateTime().compile(dialect=conn.dialect)
+        conn.exec_driver_sql(f"ALTER TABLE feedback_requests ADD COLUMN updated_at {column_type}")
+        conn.execute(
+            update(models.FeedbackRequest.__table__)
+            .values(updated_at=models.FeedbackRequest.__table__.c.created_at)
+        )
+    create_missing_indexes(
+        conn,
+        "ix_feedback_manager_updated",
+        "ix_feedback_employee_updated",
+        "ix_acknowledgements_acknowledged",
+        "ix_acknowledgements_employee_acknowledged",
+        "ix_feedback_requests_manager_updated",
+        "ix_feedback_requests_employee_updated",
+    )
+
+
+@migration(6, "Last-modified time on resource versions")
+def _resource_version_timestamps(conn: Connection):
+    columns = {c["name"] for c in inspect(conn).get_columns("resource_versions")}
+    if "updated_at" not in columns:
+        column_type = DateTime().compile(dialect=conn.dialect)
+        conn.exec_driver_sql(f"ALTER TABLE resource_versions ADD COLUMN updated_at {column_type}")
+
+
+@migration(7, "Full-text search index over feedback")
+def _feedback_search(conn: Connection):
+    search.install(conn)
+
+
+@migration(8, "Time-bucketed feedback rollups")
+def _feedback_rollups(conn: Connection):
+    models.FeedbackRollup.__table__.create(bind=conn, checkfirst=True)
+    create_missing_indexes(conn, "ix_feedback_rollups_employee")
+    with Session(bind=conn) as db:
+        rollups.rebuild(db)
+
+
+@migration(9, "Closure table of the reporting hierarchy")
+def _org_closure(conn: Connection):
+    models.OrgClosure.__table__.create(bind=conn, checkfirst=True)
+    create_missing_indexes(conn, "ix_org_closure_descendant")
+    with Session(bind=conn) as db:
+        hierarchy.rebuild(db)
+
+
+@migration(10, "Seed the default tags")
+def _default_tags(conn: Connection):
+    # Only into an empty table: tags an admin has since removed stay removed
+    if conn.execute(select(models.Tag.id).limit(1)).first() is None:
+        conn.execute(
+            dialect_insert(conn, models.Tag.__table__)
+            .values([{"name": name} for name in DEFAULT_TAGS])
+            .on_conflict_do_nothing(index_elements=["name"])
+        )
+
+
+@migration(11, "Background job queue and per-user digests")
+def _jobs_and_digests(conn: Connection):
+    models.Job.__table__.create(bind=conn, checkfirst=True)
+    models.Digest.__table__.create(bind=conn, checkfirst=True)
+    create_missing_indexes(conn, "ix_jobs_status_run_at")
+
+
+# --- Runner ---
+
+def applied_versions(conn: Connection) -> set:
+    migration_metadata.create_all(bind=conn)
+    return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+
+@contextmanager
+def locked(engine: Engine):
+    """A connection whose transaction holds the migration lock; commits on success"""
+    with engine.connect() as conn:
+        sqlite = conn.dialect.name == "sqlite"
+        if sqlite:
+            # Waiting for the lock is SQLite's busy handler, bounded by the timeout
+            conn.exec_driver_sql(f"PRAGMA busy_timeout = {int(MIGRATION_LOCK_TIMEOUT * 1000)}")
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+        elif conn.dialect.name == "postgresql":
+            conn.execute(text("SELECT set_config('lock_timeout', :ms, true)"), {"ms": f"{int(MIGRATION_LOCK_TIMEOUT * 1000)}ms"})
+            conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            if sqlite:
+                conn.exec_driver_sql(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+
+
+def upgrade(engine: Engine) -> list:
+    """Apply pending migrations, each in its own transaction. Returns the versions applied.
+
+    An up-to-date database costs one read; the lock is only taken when
+    something is pending.
+    """
+    with engine.connect() as conn:
+        if inspect(conn).has_table(schema_migrations.name):
+            done = set(conn.execute(select(schema_migrations.c.version)).scalars())
+            if all(version in done for version, _, _ in MIGRATIONS):
+                return []
+
+    applied = []
+    for version, description, fn in MIGRATIONS:
+        with locked(engine) as conn:
+            # Re-read under the lock: another worker may have just applied it
+            if version in applied_versions(conn):
+                continue
+            fn(conn)
+            conn.execute(insert(schema_migrations).values(
+                version=version, description=description, applied_at=datetime.utcnow()
+            ))
+        applied.append(version)
+    return applied
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    parser = argparse.ArgumentParser(description="Apply database schema migrations")
+    parser.add_argument("command", nargs="?", choices=["upgrade", "status"], default="upgrade")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        with engine.begin() as conn:
+            done = applied_versions(conn)
+        for version, description, _ in MIGRATIONS:
+            print(f"{'applied' if version in done else 'pending':8} {version:4}  {description}")
+    else:
+        applied = upgrade(engine)
+        print(f"Applied migrations: {applied}" if applied else "Database is up to date.")
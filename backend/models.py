@@ -1,7 +1,7 @@
 import enum
 from sqlalchemy import (
     create_engine, Column, Integer, String, Enum as SQLAlchemyEnum, 
-    ForeignKey, DateTime, Table, Boolean, func
+    ForeignKey, Date, DateTime, Table, Boolean, Index, func, true
 )
 from sqlalchemy.orm import relationship
 import uuid
@@ -81,7 +81,143 @@ class FeedbackRequest(Base):
     manager_id = Column(String, ForeignKey("users.id"))
     message = Column(String, nullable=True)
     created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     is_open = Column(Boolean, default=True)
 
     employee = relationship("User", foreign_keys=[employee_id])
-    manager = relationship("User", foreign_keys=[manager_id])
\ No newline at end of file
+    manager = relationship("User", foreign_keys=[manager_id])
+
+# --- Indexes for hot query predicates ---
+# Timelines filter on one owner column and sort newest-first on (created_at, id),
+# so the sort columns are part of the index and no separate sort step is needed.
+Index("ix_feedback_manager_created", Feedback.manager_id, Feedback.created_at, Feedback.id)
+Index("ix_feedback_employee_created", Feedback.employee_id, Feedback.created_at, Feedback.id)
+Index("ix_feedback_tags_tag", feedback_tags.c.tag_id)
+Index("ix_acknowledgements_feedback_employee", Acknowledgement.feedback_id, Acknowledgement.employee_id)
+Index("ix_acknowledgements_employee", Acknowledgement.employee_id)
+# get_team_members / get_available_employees
+Index("ix_users_role_manager", User.role, User.manager_id)
+# Only open requests are ever listed, so keep closed ones out of the index
+Index(
+    "ix_feedback_requests_open_manager",
+    FeedbackRequest.manager_id, FeedbackRequest.created_at,
+    sqlite_where=FeedbackRequest.is_open == true(),
+    postgresql_where=FeedbackRequest.is_open == true(),
+)
+
+
+class ManagerStats(Base):
+    """Per-manager dashboard counters, maintained alongside feedback writes (see stats.py)"""
+    __tablename__ = "manager_stats"
+    manager_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    feedback_count = Column(Integer, default=0, nullable=False)
+    acknowledged_count = Column(Integer, default=0, nullable=False)
+    positive_count = Column(Integer, default=0, nullable=False)
+    negative_count = Column(Integer, default=0, nullable=False)
+    neutral_count = Column(Integer, default=0, nullable=False)
+
+
+class ResourceVersion(Base):
+    """Monotonic version counters for cached resources (e.g. "tags"), bumped on every change"""
+    __tablename__ = "resource_versions"
+    key = Column(String, primary_key=True)
+    version = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, nullable=True)
+
+
+class Event(Base):
+    """Outbox of change events for the database-backed event broker (see events.py), one row per recipient"""
+    __tablename__ = "events"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(String, nullable=False)
+    type = Column(String, nullable=False)
+    payload = Column(String, nullable=False)
+    created_at = Column(DateTime, default=func.now(), nullable=False)
+
+# Replay for one subscriber after Last-Event-ID
+Index("ix_events_user_id", Event.user_id, Event.id)
+
+
+# --- Indexes for /sync/changes: each owner's rows in (changed-at, id) order ---
+Index("ix_feedback_manager_updated", Feedback.manager_id, Feedback.updated_at, Feedback.id)
+Index("ix_feedback_employee_updated", Feedback.employee_id, Feedback.updated_at, Feedback.id)
+Index("ix_acknowledgements_acknowledged", Acknowledgement.acknowledged_at, Acknowledgement.id)
+Index("ix_acknowledgements_employee_acknowledged", Acknowledgement.employee_id, Acknowledgement.acknowledged_at, Acknowledgement.id)
+Index("ix_feedback_requests_manager_updated", FeedbackRequest.manager_id, FeedbackRequest.updated_at, FeedbackRequest.id)
+Index("ix_feedback_requests_employee_updated", FeedbackRequest.employee_id, FeedbackRequest.updated_at, FeedbackRequest.id)
+
+
+class FeedbackRollup(Base):
+    """Feedback counts pre-aggregated per time bucket, maintained by crud (see rollups.py).
+
+    tag_id 0 counts every feedback item once whatever its tags; the other rows
+    break the same items down per tag. Acknowledgements are counted in the
+    bucket in which the feedback was given.
+    """
+    __tablename__ = "feedback_rollups"
+    manager_id = Column(String, primary_key=True)
+    grain = Column(String, primary_key=True)
+    tag_id = Column(Integer, primary_key=True)
+    bucket_start = Column(Date, primary_key=True)
+    employee_id = Column(String, primary_key=True)
+    sentiment = Column(SQLAlchemyEnum(SentimentEnum), primary_key=True)
+    feedback_count = Column(Integer, default=0, nullable=False)
+    acknowledged_count = Column(Integer, default=0, nullable=False)
+    ack_seconds_total = Column(Integer, default=0, nullable=False)
+    ack_within_1h = Column(Integer, default=0, nullable=False)
+    ack_within_1d = Column(Integer, default=0, nullable=False)
+    ack_within_1w = Column(Integer, default=0, nullable=False)
+    ack_within_30d = Column(Integer, default=0, nullable=False)
+    ack_after_30d = Column(Integer, default=0, nullable=False)
+
+# Trends for one employee; the primary key already serves per-manager trends
+Index("ix_feedback_rollups_employee", FeedbackRollup.employee_id, FeedbackRollup.grain, FeedbackRollup.tag_id, FeedbackRollup.bucket_start)
+
+
+class OrgClosure(Base):
+    """Every (ancestor, descendant) pair of the reporting tree, including each user with itself at depth 0 (see hierarchy.py)"""
+    __tablename__ = "org_closure"
+    ancestor_id = Column(String, primary_key=True)
+    descendant_id = Column(String, primary_key=True)
+    depth = Column(Integer, nullable=False)
+
+# A user's chain of managers
+Index("ix_org_closure_descendant", OrgClosure.descendant_id, OrgClosure.depth)
+
+
+class Job(Base):
+    """A unit of background work in the database-backed job queue (see jobs.py)"""
+    __tablename__ = "jobs"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String, nullable=False)
+    payload = Column(String, nullable=False, default="{}")  # JSON
+    status = Column(String, nullable=False, default="queued")
+    # Enqueueing a key that is already present is a no-op
+    idempotency_key = Column(String, unique=True, nullable=True)
+    run_at = Column(DateTime, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, nullable=False)
+    locked_by = Column(String, nullable=True)
+    locked_until = Column(DateTime, nullable=True)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=func.now(), nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+
+# Claiming: the due jobs of a status in run_at order
+Index("ix_jobs_status_run_at", Job.status, Job.run_at, Job.id)
+
+
+class Digest(Base):
+    """What is waiting on a user, recomputed in bulk by a periodic job (see digests.py)"""
+    __tablename__ = "digests"
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    # Feedback the user received and has not acknowledged
+    pending_acknowledgements = Column(Integer, default=0, nullable=False)
+    oldest_pending_at = Column(DateTime, nullable=True)
+    # Feedback the user gave that is still unacknowledged
+    unacknowledged_given = Column(Integer, default=0, nullable=False)
+    # Open feedback requests addressed to the user
+    open_requests = Column(Integer, default=0, nullable=False)
+    oldest_open_request_at = Column(DateTime, nullable=True)
+    computed_at = Column(DateTime, nullable=False)
+    reminded_at = Column(DateTime, nullable=True)
@@ -0,0 +1,56 @@
+"""
+Keyset (cursor) pagination helpers.
+
+Timelines are ordered newest-first on (created_at, id). A cursor is the sort
+key of the last row on a page, encoded as an opaque url-safe string; the next
+page is everything strictly "older" than that key.
+"""
+
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import String, tuple_, type_coerce
+from sqlalchemy.orm import Session
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def sort_key_column(db: Session, column):
+    """Expression used to order and compare on a timestamp column.
+
+    SQLite stores DATETIME as text whose format depends on the writer
+    (CURRENT_TIMESTAMP has no fractional seconds, Python datetimes do), so
+    there the stored text is compared verbatim rather than re-formatted.
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        return type_coerce(column, String)
+    return column
+
+
+def encode_cursor(sort_value, row_id) -> str:
+    if isinstance(sort_value, datetime):
+        payload = {"dt": sort_value.isoformat(), "id": row_id}
+    else:
+        payload = {"s": sort_value, "id": row_id}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """Return (sort_value, row_id). Raises ValueError for malformed cursors."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if "dt" in payload:
+            return datetime.fromisoformat(payload["dt"]), payload["id"]
+        return payload["s"], payload["id"]
+    except (ValueError, KeyError, TypeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def older_than(sort_column, id_column, cursor: str):
+    """WHERE clause selecting rows after `cursor` in newest-first order"""
+    sort_value, row_id = decode_cursor(cursor)
+    return tuple_(sort_column, id_column) < tuple_(sort_value, row_id)
@@ -0,0 +1,366 @@
+"""
+PDF export of feedback reports.
+
+Rendering runs in a process pool so WeasyPrint's CPU time never lands on a
+request worker. Rendered files are cached on disk under a content address
+derived from everything that appears in the report (feedback id, updated_at
+and acknowledgement state), so repeat downloads of unchanged feedback are
+served straight from disk. The cache is trimmed least-recently-used first
+once it grows past PDF_CACHE_MAX_BYTES.
+"""
+
+import asyncio
+import hashlib
+import html
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import zipfile
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", "2"))
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", "pdf_cache")
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# A merged document is laid out in a single worker, so its size is capped
+PDF_MERGE_MAX_DOCUMENTS = int(os.getenv("PDF_MERGE_MAX_DOCUMENTS", "200"))
+# Feedback rows read per query while a ZIP export streams
+PDF_EXPORT_BATCH_SIZE = int(os.getenv("PDF_EXPORT_BATCH_SIZE", "100"))
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Bump when the report layout changes so cached files are not reused
+TEMPLATE_VERSION = "3"
+
+
+def snapshot(feedback) -> dict:
+    """Plain (picklable) copy of what the report shows, taken from a fully loaded feedback row"""
+    ack = feedback.acknowledgment
+    return {
+        "id": feedback.id,
+        "employee_name": feedback.employee.name,
+        "manager_name": feedback.manager.name,
+        "created_at": feedback.created_at,
+        "updated_at": feedback.updated_at,
+        "strengths": feedback.strengths,
+        "improvements": feedback.improvements,
+        "sentiment": feedback.sentiment.value,
+        "acknowledged_at": ack.acknowledged_at if ack else None,
+        "ack_comment": ack.comment if ack else None,
+    }
+
+
+async def snapshots(feedbacks):
+    """snapshot() of each row of an async iterable; closes it when done or abandoned"""
+    try:
+        async for feedback in feedbacks:
+            yield snapshot(feedback)
+    finally:
+        await feedbacks.aclose()
+
+
+def cache_key(snap: dict) -> str:
+    parts = [TEMPLATE_VERSION, snap["id"], str(snap["updated_at"]), str(snap["acknowledged_at"])]
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+
+REPORT_STYLE = """
+                body { font-family: sans-serif; }
+                h1 { color: #333; }
+                .feedback-card { border: 1px solid #ccc; padding: 20px; border-radius: 8px; }
+                .label { font-weight: bold; }
+                .report + .report { page-break-before: always; }
+"""
+
+
+def _report(snap: dict) -> str:
+    e = lambda value: html.escape(str(value or ""))
+    acknowledgement = ""
+    if snap["acknowledged_at"]:
+        acknowledgement = f"""
+                <hr>
+                <p><span class="label">Acknowledged:</span> {snap["acknowledged_at"].strftime('%B %d, %Y')}</p>
+                {f'<p>{e(snap["ack_comment"])}</p>' if snap["ack_comment"] else ''}"""
+    return f"""
+            <div class="report">
+            <h1>Feedback Report</h1>
+            <div class="feedback-card">
+                <p><span class="label">To:</span> {e(snap["employee_name"])}</p>
+                <p><span class="label">From:</span> {e(snap["manager_name"])}</p>
+                <p><span class="label">Date:</span> {snap["created_at"].strftime('%B %d, %Y')}</p>
+                <hr>
+                <h3>Strengths:</h3>
+                <p>{e(snap["strengths"])}</p>
+                <h3>Areas to Improve:</h3>
+                <p>{e(snap["improvements"])}</p>
+                <p><span class="label">Sentiment:</span> {e(snap["sentiment"])}</p>{acknowledgement}
+            </div>
+            </div>"""
+
+
+def render_html(*snaps: dict) -> str:
+    """HTML for one report, or several reports on consecutive pages"""
+    return f"""
+    <html>
+        <head>
+            <title>Feedback Report</title>
+            <style>{REPORT_STYLE}</style>
+        </head>
+        <body>{"".join(_report(snap) for snap in snaps)}
+        </body>
+    </html>
+    """
+
+
+def render_to_file(snap: dict, path: str) -> int:
+    """Render a report and write it atomically to `path`. Runs in a pool worker process."""
+    return _write_pdf(render_html(snap), path)
+
+
+def render_merged_to_file(snaps: list, path: str) -> int:
+    """Render several reports into one document. Runs in a pool worker process."""
+    return _write_pdf(render_html(*snaps), path)
+
+
+def _write_pdf(document: str, path: str) -> int:
+    # Imported here, in the pool workers, so API processes never load WeasyPrint and its Pango/cairo stack
+    from weasyprint import HTML
+
+    pdf_bytes = HTML(string=document).write_pdf()
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(pdf_bytes)
+    os.replace(tmp_path, path)
+    return len(pdf_bytes)
+
+
+def stream_open(file):
+    """Yield an open file in chunks, closing it at the end"""
+    with file:
+        while chunk := file.read(STREAM_CHUNK_SIZE):
+            yield chunk
+
+
+def open_temporary(path: str):
+    """Open a temporary file and drop its name straight away, so it is removed
+    however the response ends, even if its body is never sent"""
+    if os.name == "nt":
+        # Windows can't remove an open file; this one is deleted when closed
+        return os.fdopen(os.open(path, os.O_RDONLY | os.O_BINARY | os.O_TEMPORARY), "rb")
+    file = open(path, "rb")
+    os.remove(path)
+    return file
+
+
+class _ZipStream:
+    """Write-only sink for ZipFile; bytes are drained after each chunk so nothing accumulates.
+
+    It has no tell()/seek(), which makes ZipFile write data descriptors
+    instead of seeking back to patch local headers.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class PdfCache:
+    """Directory of rendered PDFs named by cache key, trimmed least-recently-used first"""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    def get(self, key: str):
+        """Path of the cached file, or None. A hit refreshes the file's position in the LRU order."""
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def open(self, key: str):
+        """The cached file opened for reading, or None. Unlike a path, an open
+        file stays readable if another worker evicts it meanwhile."""
+        try:
+            file = open(self.path(key), "rb")
+        except FileNotFoundError:
+            return None
+        os.utime(file.fileno())
+        return file
+
+    def evict(self):
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(".pdf"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                # Already gone, or (on Windows) open for a download; it goes next time
+                pass
+
+
+async def _as_async(items):
+    for item in items:
+        yield item
+
+
+class PdfRenderer:
+    """Renders reports on a process pool, de-duplicating concurrent renders of the same key"""
+
+    MAX_TRACKED_FAILURES = 1000
+
+    def __init__(self, cache: PdfCache, workers: int):
+        self.cache = cache
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._failures = OrderedDict()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a process that is running server threads is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def submit(self, snap: dict) -> str:
+        """Start rendering `snap` unless it is cached or already rendering. Returns its key."""
+        key = cache_key(snap)
+        if self.cache.get(key):
+            return key
+        with self._lock:
+            if key in self._in_flight:
+                return key
+            self._failures.pop(key, None)
+        future = self._pool().submit(render_to_file, snap, self.cache.path(key))
+        with self._lock:
+            self._in_flight[key] = future
+        future.add_done_callback(lambda f: self._finished(key, f))
+        return key
+
+    def _finished(self, key: str, future):
+        with self._lock:
+            self._in_flight.pop(key, None)
+            if future.cancelled() or future.exception() is not None:
+                self._failures[key] = "cancelled" if future.cancelled() else str(future.exception())
+                while len(self._failures) > self.MAX_TRACKED_FAILURES:
+                    self._failures.popitem(last=False)
+                return
+        self.cache.evict()
+
+    def status(self, key: str) -> str:
+        """One of done, pending, failed, unknown"""
+        if self.cache.get(key):
+            return "done"
+        with self._lock:
+            if key in self._in_flight:
+                return "pending"
+            if key in self._failures:
+                return "failed"
+        return "unknown"
+
+    async def render(self, snap: dict):
+        """Render (or reuse) the report for `snap` and return the cached file, opened; the caller closes it"""
+        key = self.submit(snap)
+        with self._lock:
+            future = self._in_flight.get(key)
+        if future is not None:
+            # Shared by every caller rendering this key: one caller giving up
+            # (a ZIP download closed early) must not cancel it for the others
+            await asyncio.shield(asyncio.wrap_future(future))
+        file = self.cache.open(key)
+        if file is None:
+            raise RuntimeError(f"PDF render failed: {self._failures.get(key, 'evicted before use')}")
+        return file
+
+    async def render_many(self, snaps, window: int = None):
+        """Yield (snap, open file) in input order while keeping up to `window` renders running.
+
+        `snaps` may be an async iterable; it is only read `window` snaps ahead.
+        """
+        window = window or self.workers * 2
+        snaps = snaps if hasattr(snaps, "__anext__") else _as_async(snaps)
+        running = deque()
+        try:
+            while len(running) < window and (snap := await anext(snaps, None)) is not None:
+                running.append((snap, asyncio.ensure_future(self.render(snap))))
+            while running:
+                snap, task = running.popleft()
+                if (next_snap := await anext(snaps, None)) is not None:
+                    running.append((next_snap, asyncio.ensure_future(self.render(next_snap))))
+                file = await task
+                yield snap, file
+        finally:
+            for _, task in running:
+                if task.done() and not task.cancelled() and task.exception() is None:
+                    task.result().close()
+                else:
+                    task.cancel()
+            if hasattr(snaps, "aclose"):
+                await snaps.aclose()
+
+    async def stream_zip(self, snaps):
+        """Yield a ZIP archive of rendered reports as it is built"""
+        sink = _ZipStream()
+        with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as archive:
+            async for snap, file in self.render_many(snaps):
+                employee = re.sub(r"[^\w.-]+", "_", snap["employee_name"] or "")
+                name = f"feedback_{snap['created_at']:%Y-%m-%d}_{employee}_{snap['id']}.pdf"
+                with file as src, archive.open(name, mode="w") as dest:
+                    while chunk := src.read(STREAM_CHUNK_SIZE):
+                        dest.write(chunk)
+                        if data := sink.drain():
+                            yield data
+        # Closing the archive writes the central directory
+        if data := sink.drain():
+            yield data
+
+    async def render_merged(self, snaps: list) -> str:
+        """Render reports into one PDF in a temporary file and return its path; open it with open_temporary()"""
+        fd, path = tempfile.mkstemp(suffix=".pdf", prefix="feedback_export_")
+        os.close(fd)
+        try:
+            await asyncio.wrap_future(self._pool().submit(render_merged_to_file, snaps, path))
+        except BaseException:
+            os.remove(path)
+            raise
+        return path
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+pdf_renderer = PdfRenderer(PdfCache(PDF_CACHE_DIR, PDF_CACHE_MAX_BYTES), PDF_RENDER_WORKERS)
@@ -0,0 +1,29 @@
+"""
+Cache of authenticated principals, keyed by token subject (the user's email).
+
+get_current_user consults this before going to the database. crud drops a
+user's entry whenever their row changes (team assignment, password reset,
+signup), so a stale principal only survives in *other* worker processes, and
+only until its TTL runs out.
+"""
+
+import os
+
+from cache import TTLCache
+
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+
+
+def get(email: str):
+    return principal_cache.get(email)
+
+
+def put(email: str, principal):
+    principal_cache.set(email, principal)
+
+
+def invalidate(email: str):
+    principal_cache.delete(email)
@@ -0,0 +1,144 @@
+"""
+Cache of team and availability listings.
+
+Team members, available employees and open feedback requests are read on
+every dashboard load but change only when the team structure does. Results
+are cached per manager and tagged with what they depend on; crud invalidates
+the tags after each commit that changes them.
+
+Backends (QUERY_CACHE_BACKEND):
+
+    local      an LRU with TTL in this process, for a single worker: other
+               workers only see an invalidation once their copy expires
+               (QUERY_CACHE_TTL). The app warns at startup when WEB_CONCURRENCY
+               asks for several; QUERY_CACHE_TTL=0 turns caching off
+    redis      shared by every worker through REDIS_URL (needs the redis package)
+
+The team list is also keyed by the team version its ETag is built from, so
+even a stale copy is never sent under a newer ETag.
+
+set_backend() swaps in any other backend, e.g. SharedBackend(LocalClient()).
+
+    python query_cache.py check    # invalidation across two workers sharing a backend
+"""
+
+import argparse
+import asyncio
+import os
+from typing import Awaitable, Callable
+
+from cache import _MISSING, LocalClient, SharedBackend, TaggedCache, TTLCache
+
+QUERY_CACHE_BACKEND = os.getenv("QUERY_CACHE_BACKEND", "local")
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "30"))
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "4096"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Worker processes, as read by uvicorn and gunicorn
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+AVAILABLE = "available"
+
+
+def team(manager_id: str) -> str:
+    return f"team:{manager_id}" if manager_id else None
+
+
+def open_requests(manager_id: str) -> str:
+    return f"requests:{manager_id}" if manager_id else None
+
+
+def _default_backend():
+    if QUERY_CACHE_BACKEND == "redis":
+        import redis
+        return SharedBackend(redis.Redis.from_url(REDIS_URL))
+    return TTLCache(maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+
+
+query_cache = TaggedCache(_default_backend(), QUERY_CACHE_TTL)
+
+
+def warn_if_per_worker():
+    """Called at app startup (not import, so CLIs are unaffected). Worker counts
+    given only on the command line (gunicorn -w) are not visible here."""
+    if isinstance(query_cache.backend, TTLCache) and WEB_CONCURRENCY > 1 and QUERY_CACHE_TTL > 0:
+        print(
+            f"Warning: the query cache is kept in each of the {WEB_CONCURRENCY} workers, so listings may be "
+            f"up to {QUERY_CACHE_TTL:g}s stale; set QUERY_CACHE_BACKEND=redis, or QUERY_CACHE_TTL=0 to disable it"
+        )
+
+
+def set_backend(backend):
+    global query_cache
+    query_cache = TaggedCache(backend, QUERY_CACHE_TTL)
+
+
+async def get_or_load(key: str, tags: list, load: Callable[[], Awaitable]):
+    value = query_cache.get(key, tags, _MISSING)
+    if value is _MISSING:
+        # Before loading: a write that invalidates meanwhile must not be masked
+        tokens = query_cache.tokens(tags)
+        value = await load()
+        query_cache.set(key, tokens, value)
+    return value
+
+
+def invalidate(*tags: str):
+    """Drop everything tagged with any of `tags`; None is skipped. Failures are logged, never raised into the write path."""
+    tags = [tag for tag in dict.fromkeys(tags) if tag]
+    if not tags:
+        return
+    try:
+        query_cache.invalidate(*tags)
+    except Exception as exc:
+        print(f"Failed to invalidate {tags}: {exc}")
+
+
+def stats() -> dict:
+    return query_cache.stats()
+
+
+def check():
+    """Two workers on one shared backend: a write through either drops the other's entries"""
+    client = LocalClient()
+    worker_a = TaggedCache(SharedBackend(client), QUERY_CACHE_TTL)
+    worker_b = TaggedCache(SharedBackend(client), QUERY_CACHE_TTL)
+    tags = [team("m1"), AVAILABLE]
+
+    worker_a.set("team_members:m1", worker_a.tokens(tags), ["e1"])
+    assert worker_b.get("team_members:m1", tags) == ["e1"], "entry not shared"
+    worker_b.invalidate(team("m1"))
+    assert worker_a.get("team_members:m1", tags, _MISSING) is _MISSING, "invalidation not seen by the other worker"
+    worker_a.set("team_members:m1", worker_a.tokens(tags), ["e1", "e2"])
+    worker_a.invalidate(team("m2"))
+    assert worker_b.get("team_members:m1", tags) == ["e1", "e2"], "unrelated tag dropped the entry"
+
+    # An invalidation while a value loads leaves the stored entry stale
+    tokens = worker_a.tokens(tags)
+    worker_b.invalidate(AVAILABLE)
+    worker_a.set("available_employees", tokens, ["old"])
+    assert worker_b.get("available_employees", tags, _MISSING) is _MISSING, "load raced an invalidation"
+
+    # get_or_load on the module cache, as the app uses it
+    set_backend(SharedBackend(client))
+    loads = []
+
+    async def load():
+        loads.append(1)
+        return ["e3"]
+
+    async def run():
+        for _ in range(3):
+            assert await get_or_load("available_employees", [AVAILABLE], load) == ["e3"]
+        invalidate(AVAILABLE, None)
+        await get_or_load("available_employees", [AVAILABLE], load)
+
+    asyncio.run(run())
+    assert len(loads) == 2, f"loaded {len(loads)} times, expected 2"
+    print("SharedBackend invalidation ok:", stats())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the query cache")
+    parser.add_argument("command", choices=["check"])
+    parser.parse_args()
+    check()
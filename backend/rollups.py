@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Time-bucketed feedback analytics.
+
+feedback_rollups holds, per day, ISO week and calendar month (UTC), the
+number of feedback items and acknowledgements for every manager × employee ×
+tag × sentiment, with a histogram and running total of time-to-acknowledge.
+crud updates the affected buckets in the same transaction as each write with
+one INSERT ... ON CONFLICT DO UPDATE, so trend charts over any range read a
+few hundred pre-aggregated rows instead of the feedback tables.
+
+Rebuild the rollups from the feedback tables with:
+
+    python rollups.py rebuild [--since 2024-01-01]
+"""
+
+import argparse
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Iterable, Optional
+
+from sqlalchemy import delete, func, or_, select
+from sqlalchemy.orm import Session
+
+import models
+from database import dialect_insert
+
+USE_ROLLUPS = os.getenv("USE_ROLLUPS", "true").lower() not in ("0", "false", "no")
+REBUILD_CHUNK_SIZE = 10_000
+
+DAY, WEEK, MONTH = "day", "week", "month"
+GRAINS = (DAY, WEEK, MONTH)
+ALL_TAGS = 0
+
+# (column, upper bound in seconds); the last bucket is open-ended
+ACK_LATENCY_BUCKETS = [
+    (models.FeedbackRollup.ack_within_1h, 3600),
+    (models.FeedbackRollup.ack_within_1d, 86400),
+    (models.FeedbackRollup.ack_within_1w, 7 * 86400),
+    (models.FeedbackRollup.ack_within_30d, 30 * 86400),
+    (models.FeedbackRollup.ack_after_30d, None),
+]
+COUNTERS = [
+    models.FeedbackRollup.feedback_count,
+    models.FeedbackRollup.acknowledged_count,
+    models.FeedbackRollup.ack_seconds_total,
+    *(column for column, _ in ACK_LATENCY_BUCKETS),
+]
+
+
+def bucket_start(grain: str, moment) -> date:
+    day = moment.date() if isinstance(moment, datetime) else moment
+    if grain == WEEK:
+        return day - timedelta(days=day.weekday())
+    if grain == MONTH:
+        return day.replace(day=1)
+    return day
+
+
+# --- Deltas ---
+
+class _Facts:
+    """What the rollups need to know about one feedback item"""
+    __slots__ = ("manager_id", "employee_id", "sentiment", "created_at", "tag_ids", "acknowledged_at")
+
+    def __init__(self, manager_id, employee_id, sentiment, created_at, tag_ids=(), acknowledged_at=None):
+        self.manager_id = manager_id
+        self.employee_id = employee_id
+        self.sentiment = sentiment
+        self.created_at = created_at
+        self.tag_ids = tag_ids
+        self.acknowledged_at = acknowledged_at
+
+
+def _ack_deltas(facts: _Facts, acknowledged_at: datetime) -> dict:
+    seconds = max(0, int((acknowledged_at - facts.created_at).total_seconds()))
+    column = next(column for column, bound in ACK_LATENCY_BUCKETS if bound is None or seconds < bound)
+    return {"acknowledged_count": 1, "ack_seconds_total": seconds, column.key: 1}
+
+
+def _add(totals: dict, facts: _Facts, deltas: dict, sentiment=None, grains: Iterable[str] = GRAINS):
+    sentiment = sentiment or facts.sentiment
+    for grain in grains:
+        start = bucket_start(grain, facts.created_at)
+        for tag_id in (ALL_TAGS, *facts.tag_ids):
+            counters = totals[(facts.manager_id, grain, tag_id, start, facts.employee_id, sentiment)]
+            for name, delta in deltas.items():
+                counters[name] += delta
+
+
+def _feedback_deltas(facts: _Facts) -> dict:
+    deltas = {"feedback_count": 1}
+    if facts.acknowledged_at is not None:
+        deltas.update(_ack_deltas(facts, facts.acknowledged_at))
+    return deltas
+
+
+def _apply(db: Session, totals: dict):
+    """Add the accumulated counters to their buckets with one upsert"""
+    rows = []
+    for (manager_id, grain, tag_id, start, employee_id, sentiment), counters in totals.items():
+        if any(counters.values()):
+            row = {column.key: counters.get(column.key, 0) for column in COUNTERS}
+            row.update(manager_id=manager_id, grain=grain, tag_id=tag_id, bucket_start=start,
+                       employee_id=employee_id, sentiment=sentiment)
+            rows.append(row)
+    if not rows:
+        return
+    stmt = dialect_insert(db.get_bind(), models.FeedbackRollup.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[column.key for column in models.FeedbackRollup.__table__.primary_key],
+        set_={column.key: column + getattr(stmt.excluded, column.key) for column in COUNTERS},
+    )
+    db.execute(stmt, rows)
+
+
+def _totals() -> dict:
+    return defaultdict(lambda: defaultdict(int))
+
+
+def _load_facts(db: Session, feedback_ids: Iterable[str]) -> dict:
+    feedback_ids = list(set(feedback_ids))
+    facts = {
+        row.id: _Facts(row.manager_id, row.employee_id, row.sentiment, row.created_at, [])
+        for row in db.execute(
+            select(models.Feedback.id, models.Feedback.manager_id, models.Feedback.employee_id,
+                   models.Feedback.sentiment, models.Feedback.created_at)
+            .where(models.Feedback.id.in_(feedback_ids))
+        )
+    }
+    for feedback_id, tag_id in db.execute(
+        select(models.feedback_tags.c.feedback_id, models.feedback_tags.c.tag_id)
+        .where(models.feedback_tags.c.feedback_id.in_(feedback_ids))
+    ):
+        facts[feedback_id].tag_ids.append(tag_id)
+    return facts
+
+
+# --- Incremental maintenance ---
+# These run inside the caller's transaction; the caller commits.
+
+def record_feedback_created(db: Session, rows: Iterable[dict]):
+    """Count new feedback; `rows` hold manager_id, employee_id, sentiment, created_at and tag_ids"""
+    if not USE_ROLLUPS:
+        return
+    totals = _totals()
+    for row in rows:
+        facts = _Facts(row["manager_id"], row["employee_id"], row["sentiment"], row["created_at"], row["tag_ids"])
+        _add(totals, facts, {"feedback_count": 1})
+    _apply(db, totals)
+
+
+def record_acknowledged(db: Session, feedback_ids: Iterable[str], acknowledged_at: datetime):
+    """Count the first acknowledgement of each of `feedback_ids`"""
+    if not USE_ROLLUPS:
+        return
+    totals = _totals()
+    for facts in _load_facts(db, feedback_ids).values():
+        if facts.created_at is not None:
+            _add(totals, facts, _ack_deltas(facts, acknowledged_at))
+    _apply(db, totals)
+
+
+def record_sentiment_changed(db: Session, feedback_id: str, old: models.SentimentEnum, new: models.SentimentEnum):
+    """Move an item, with its acknowledgement if any, from the old sentiment's buckets to the new one's"""
+    if not USE_ROLLUPS or old == new:
+        return
+    facts = _load_facts(db, [feedback_id]).get(feedback_id)
+    if facts is None or facts.created_at is None:
+        return
+    facts.acknowledged_at = db.scalar(
+        select(func.min(models.Acknowledgement.acknowledged_at))
+        .where(models.Acknowledgement.feedback_id == feedback_id)
+    )
+    deltas = _feedback_deltas(facts)
+    totals = _totals()
+    _add(totals, facts, {name: -value for name, value in deltas.items()}, sentiment=old)
+    _add(totals, facts, deltas, sentiment=new)
+    _apply(db, totals)
+
+
+# --- Backfill ---
+
+def rebuild(db: Session, since: Optional[date] = None) -> int:
+    """Recompute the rollups from the feedback tables, entirely or from `since` on.
+
+    Each grain is recomputed from the start of the bucket containing `since`.
+    Rows are streamed and added in chunks, so memory stays flat on large
+    tables. Returns the number of feedback items counted.
+    """
+    starts = {grain: bucket_start(grain, since) for grain in GRAINS} if since else {}
+    earliest = min(starts.values()) if starts else None
+
+    clear = delete(models.FeedbackRollup)
+    if starts:
+        clear = clear.where(or_(*(
+            (models.FeedbackRollup.grain == grain) & (models.FeedbackRollup.bucket_start >= start)
+            for grain, start in starts.items()
+        )))
+    db.execute(clear)
+
+    first_ack = (
+        select(models.Acknowledgement.feedback_id, func.min(models.Acknowledgement.acknowledged_at).label("acknowledged_at"))
+        .group_by(models.Acknowledgement.feedback_id)
+        .subquery()
+    )
+    query = (
+        select(models.Feedback.id, models.Feedback.manager_id, models.Feedback.employee_id,
+               models.Feedback.sentiment, models.Feedback.created_at, first_ack.c.acknowledged_at)
+        .outerjoin(first_ack, first_ack.c.feedback_id == models.Feedback.id)
+        .where(models.Feedback.created_at.is_not(None))
+    )
+    if earliest is not None:
+        query = query.where(models.Feedback.created_at >= datetime.combine(earliest, datetime.min.time()))
+
+    counted = 0
+    result = db.execute(query.execution_options(yield_per=REBUILD_CHUNK_SIZE))
+    for chunk in result.partitions():
+        tags = defaultdict(list)
+        for feedback_id, tag_id in db.execute(
+            select(models.feedback_tags.c.feedback_id, models.feedback_tags.c.tag_id)
+            .where(models.feedback_tags.c.feedback_id.in_([row.id for row in chunk]))
+        ):
+            tags[feedback_id].append(tag_id)
+        totals = _totals()
+        for row in chunk:
+            facts = _Facts(row.manager_id, row.employee_id, row.sentiment, row.created_at,
+                           tags.get(row.id, ()), row.acknowledged_at)
+            grains = [g for g in GRAINS if not starts or facts.created_at.date() >= starts[g]]
+            _add(totals, facts, _feedback_deltas(facts), grains=grains)
+        _apply(db, totals)
+        counted += len(chunk)
+    db.commit()
+    return counted
+
+
+# --- Queries ---
+
+def trends_query(
+    grain: str,
+    start: date,
+    end: date,
+    manager_id: Optional[str] = None,
+    employee_id: Optional[str] = None,
+    tag_id: Optional[int] = None,
+    sentiment: Optional[models.SentimentEnum] = None,
+    by_tag: bool = False,
+):
+    """Counter sums per (bucket_start, [tag_id,] sentiment) for buckets starting in [start, end]"""
+    r = models.FeedbackRollup
+    keys = [r.bucket_start, r.tag_id, r.sentiment] if by_tag else [r.bucket_start, r.sentiment]
+    stmt = select(*keys, *(func.sum(column).label(column.key) for column in COUNTERS)).where(
+        r.grain == grain, r.bucket_start >= bucket_start(grain, start), r.bucket_start <= end
+    )
+    if manager_id is not None:
+        stmt = stmt.where(r.manager_id == manager_id)
+    if employee_id is not None:
+        stmt = stmt.where(r.employee_id == employee_id)
+    if by_tag:
+        stmt = stmt.where(r.tag_id != ALL_TAGS if tag_id is None else r.tag_id == tag_id)
+    else:
+        stmt = stmt.where(r.tag_id == (ALL_TAGS if tag_id is None else tag_id))
+    if sentiment is not None:
+        stmt = stmt.where(r.sentiment == sentiment)
+    return stmt.group_by(*keys).order_by(*keys)
+
+
+def _empty_bucket() -> dict:
+    return {
+        "feedback_count": 0,
+        "acknowledged_count": 0,
+        "sentiments": {s.value: 0 for s in models.SentimentEnum},
+        "ack_seconds_total": 0,
+        "ack_latency_histogram": {column.key.removeprefix("ack_"): 0 for column, _ in ACK_LATENCY_BUCKETS},
+    }
+
+
+def trends_from_rows(rows, by_tag: bool = False) -> list[dict]:
+    """Fold trends_query rows into one entry per bucket (and tag), oldest first"""
+    buckets = {}
+    for row in rows:
+        key = (row.bucket_start, row.tag_id) if by_tag else (row.bucket_start,)
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = {"bucket_start": row.bucket_start, **_empty_bucket()}
+            if by_tag:
+                bucket["tag_id"] = row.tag_id
+        bucket["feedback_count"] += row.feedback_count
+        bucket["acknowledged_count"] += row.acknowledged_count
+        bucket["sentiments"][row.sentiment.value] += row.feedback_count
+        bucket["ack_seconds_total"] += row.ack_seconds_total
+        for column, _ in ACK_LATENCY_BUCKETS:
+            bucket["ack_latency_histogram"][column.key.removeprefix("ack_")] += getattr(row, column.key)
+
+    series = []
+    for bucket in buckets.values():
+        acked = bucket["acknowledged_count"]
+        total_seconds = bucket.pop("ack_seconds_total")
+        bucket["mean_hours_to_acknowledge"] = round(total_seconds / acked / 3600, 2) if acked else None
+        series.append(bucket)
+    return series
+
+
+if __name__ == "__main__":
+    import migrations
+    from database import SessionLocal, engine
+
+    parser = argparse.ArgumentParser(description="Feedback analytics rollup maintenance")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--since", type=date.fromisoformat, help="Only rebuild buckets from this date (YYYY-MM-DD) on")
+    args = parser.parse_args()
+
+    migrations.upgrade(engine)
+    db = SessionLocal()
+    try:
+        counted = rebuild(db, since=args.since)
+        print(f"Rebuilt feedback rollups from {counted} feedback items.")
+    finally:
+        db.close()
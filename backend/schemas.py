@@ -1,6 +1,6 @@
-from pydantic import BaseModel, ConfigDict, EmailStr
-from typing import Optional, List
-from datetime import datetime
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, TypeAdapter
+from typing import Dict, Optional, List, Literal
+from datetime import date, datetime
 from models import RoleEnum, SentimentEnum
 
 class TagBase(BaseModel):
@@ -67,9 +67,70 @@ class FeedbackOut(FeedbackBase):
 
     model_config = ConfigDict(orm_mode=True)
 
+# --- Field projection for feedback timelines ---
+FEEDBACK_FIELDS = tuple(FeedbackOut.model_fields)
+FEEDBACK_RELATIONSHIP_FIELDS = ("employee", "acknowledgment", "tags")
+_feedback_field_adapters = {
+    name: TypeAdapter(field.annotation) for name, field in FeedbackOut.model_fields.items()
+}
+
+def parse_feedback_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Parse a comma separated `fields=` parameter. `id` is always included."""
+    if not fields:
+        return None
+    requested = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = sorted(set(requested) - set(FEEDBACK_FIELDS))
+    if unknown:
+        raise ValueError(f"Unknown feedback fields: {', '.join(unknown)}")
+    return ["id"] + [name for name in FEEDBACK_FIELDS if name in requested and name != "id"]
+
+def project_feedback(feedback, fields: List[str]) -> dict:
+    """Serialize only the requested FeedbackOut fields of a feedback ORM object"""
+    data = {}
+    for name in fields:
+        adapter = _feedback_field_adapters[name]
+        value = adapter.validate_python(getattr(feedback, name), from_attributes=True)
+        data[name] = adapter.dump_python(value, mode="json")
+    return data
+
 class AcknowledgementIn(BaseModel):
     comment: Optional[str] = None
 
+class FeedbackExportRequest(BaseModel):
+    """Feedback to export: explicit ids, or all of the caller's feedback; optionally within [start, end)"""
+    feedback_ids: Optional[List[str]] = None
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    format: Literal["zip", "pdf"] = "zip"
+    # Managers: also feedback given by everyone below them
+    include_subtree: bool = False
+
+# --- Batch writes ---
+MAX_BATCH_SIZE = 1000
+
+class FeedbackBatchCreate(BaseModel):
+    items: List[FeedbackCreate] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
+class AcknowledgementBatchItem(AcknowledgementIn):
+    feedback_id: str
+
+class AcknowledgementBatch(BaseModel):
+    items: List[AcknowledgementBatchItem] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
+class TeamAssignmentBatch(BaseModel):
+    employee_ids: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
+class BatchItemResult(BaseModel):
+    index: int
+    ok: bool
+    id: Optional[str] = None
+    error: Optional[str] = None
+
+class BatchResult(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[BatchItemResult]
+
 class FeedbackRequestBase(BaseModel):
     message: Optional[str] = None
 
@@ -81,14 +142,74 @@ class FeedbackRequestOut(FeedbackRequestBase):
     employee_id: str
     manager_id: str
     created_at: datetime
+    updated_at: Optional[datetime] = None
     is_open: bool
     employee: UserOut
 
     model_config = ConfigDict(orm_mode=True)
 
+# --- Incremental sync ---
+class AcknowledgementChange(BaseModel):
+    feedback_id: str
+    employee_id: str
+    acknowledged: bool
+    comment: Optional[str]
+    acknowledged_at: datetime
+
+class SyncChanges(BaseModel):
+    feedback: List[FeedbackOut]
+    acknowledgements: List[AcknowledgementChange]
+    feedback_requests: List[FeedbackRequestOut]
+    watermark: str
+    has_more: bool
+
+# --- Search ---
+class FeedbackSearchHit(BaseModel):
+    feedback: FeedbackOut
+    score: float
+    # Matching fields as escaped HTML with the matched words wrapped in <mark>
+    highlights: Dict[str, str]
+
+class FeedbackSearchResults(BaseModel):
+    results: List[FeedbackSearchHit]
+    next_cursor: Optional[str] = None
+
+# --- Analytics ---
+class TrendBucket(BaseModel):
+    bucket_start: date
+    tag_id: Optional[int] = None
+    feedback_count: int
+    acknowledged_count: int
+    sentiments: Dict[str, int]
+    # Acknowledgements by time from feedback to acknowledgement: within_1h, within_1d, ...
+    ack_latency_histogram: Dict[str, int]
+    mean_hours_to_acknowledge: Optional[float] = None
+
+class Trends(BaseModel):
+    grain: Literal["day", "week", "month"]
+    start: date
+    end: date
+    buckets: List[TrendBucket]
+
+# --- Digests ---
+class DigestOut(BaseModel):
+    pending_acknowledgements: int = 0
+    oldest_pending_at: Optional[datetime] = None
+    unacknowledged_given: int = 0
+    open_requests: int = 0
+    oldest_open_request_at: Optional[datetime] = None
+    # None when the user had nothing waiting at the last refresh
+    computed_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
 class Token(BaseModel):
     access_token: str
     token_type: str
 
+class StreamTicket(BaseModel):
+    ticket: str
+    expires_in: int
+
 class TokenData(BaseModel):
     email: Optional[str] = None
\ No newline at end of file
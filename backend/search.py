@@ -0,0 +1,301 @@
+"""
+Full-text search over feedback strengths, improvements and acknowledgement comments.
+
+The index is maintained by database triggers, so every write path (crud, the
+batch endpoints' bulk inserts, direct imports) keeps it current in the same
+transaction. `feedback_search` maps each feedback id to an integer row id.
+
+    SQLite       an FTS5 table `feedback_fts` keyed by that row id, ranked with
+                 bm25. Its `scope` column holds an "m<manager>" and an
+                 "e<employee>" token, so restricting a search to one owner
+                 intersects posting lists inside the index instead of filtering
+                 every match afterwards.
+    PostgreSQL   a weighted tsvector per feedback in `feedback_search.document`
+                 with a GIN index, ranked with ts_rank_cd.
+
+Results are ordered best match first on (rank, row id) and paged with the
+usual opaque cursors.
+"""
+
+import html
+import re
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Float, Integer, String, column, func, literal_column, select, table, tuple_
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+import models, pagination
+
+TEXT_COLUMNS = ("strengths", "improvements", "comment")
+SEARCH_PAGE_SIZE = 20
+SNIPPET_TOKENS = 12
+# The database marks matches with control characters, which feedback text cannot
+# smuggle in as markup; highlights() escapes the text and only then adds <mark>
+MARK_START, MARK_END = "\x02", "\x03"
+PG_CONFIG = "english"
+
+# `document` only exists on PostgreSQL
+feedback_search = table("feedback_search", column("id", Integer), column("feedback_id", String), column("document"))
+feedback_fts = table("feedback_fts", column("rowid", Integer), *(column(name, String) for name in TEXT_COLUMNS))
+
+
+def _is_sqlite(bind) -> bool:
+    return bind.dialect.name == "sqlite"
+
+
+# --- Schema (installed by migration 7) ---
+
+_SQLITE_SCOPE = "'m' || replace(coalesce({row}.manager_id, ''), '-', '') || ' e' || replace(coalesce({row}.employee_id, ''), '-', '')"
+_SQLITE_ROW = "(SELECT id FROM feedback_search WHERE feedback_id = {feedback_id})"
+
+SQLITE_DDL = [
+    "CREATE TABLE IF NOT EXISTS feedback_search (id INTEGER PRIMARY KEY, feedback_id VARCHAR NOT NULL UNIQUE)",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS feedback_fts USING fts5("
+    "strengths, improvements, comment, scope, tokenize = 'porter unicode61 remove_diacritics 2')",
+    f"""CREATE TRIGGER IF NOT EXISTS feedback_search_insert AFTER INSERT ON feedback BEGIN
+        INSERT INTO feedback_search (feedback_id) VALUES (new.id);
+        INSERT INTO feedback_fts (rowid, strengths, improvements, comment, scope)
+        VALUES ({_SQLITE_ROW.format(feedback_id="new.id")}, new.strengths, new.improvements, '',
+                {_SQLITE_SCOPE.format(row="new")});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS feedback_search_update
+    AFTER UPDATE OF strengths, improvements, manager_id, employee_id ON feedback BEGIN
+        UPDATE feedback_fts SET strengths = new.strengths, improvements = new.improvements,
+            scope = {_SQLITE_SCOPE.format(row="new")}
+        WHERE rowid = {_SQLITE_ROW.format(feedback_id="new.id")};
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS feedback_search_delete AFTER DELETE ON feedback BEGIN
+        DELETE FROM feedback_fts WHERE rowid = {_SQLITE_ROW.format(feedback_id="old.id")};
+        DELETE FROM feedback_search WHERE feedback_id = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS feedback_search_ack_insert AFTER INSERT ON acknowledgements BEGIN
+        UPDATE feedback_fts SET comment = coalesce(new.comment, '')
+        WHERE rowid = {_SQLITE_ROW.format(feedback_id="new.feedback_id")};
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS feedback_search_ack_update AFTER UPDATE OF comment ON acknowledgements BEGIN
+        UPDATE feedback_fts SET comment = coalesce(new.comment, '')
+        WHERE rowid = {_SQLITE_ROW.format(feedback_id="new.feedback_id")};
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS feedback_search_ack_delete AFTER DELETE ON acknowledgements BEGIN
+        UPDATE feedback_fts SET comment = ''
+        WHERE rowid = {_SQLITE_ROW.format(feedback_id="old.feedback_id")};
+    END""",
+]
+
+SQLITE_DROP_TRIGGERS = [
+    f"DROP TRIGGER IF EXISTS {name}"
+    for name in ("feedback_search_insert", "feedback_search_update", "feedback_search_delete",
+                 "feedback_search_ack_insert", "feedback_search_ack_update", "feedback_search_ack_delete")
+]
+
+SQLITE_BACKFILL = [
+    "INSERT INTO feedback_search (feedback_id) SELECT id FROM feedback "
+    "WHERE id NOT IN (SELECT feedback_id FROM feedback_search)",
+    "DELETE FROM feedback_fts",
+    f"""INSERT INTO feedback_fts (rowid, strengths, improvements, comment, scope)
+    SELECT s.id, f.strengths, f.improvements,
+        coalesce((SELECT a.comment FROM acknowledgements a WHERE a.feedback_id = f.id LIMIT 1), ''),
+        {_SQLITE_SCOPE.format(row="f")}
+    FROM feedback_search s JOIN feedback f ON f.id = s.feedback_id""",
+]
+
+POSTGRES_DDL = [
+    """CREATE TABLE IF NOT EXISTS feedback_search (
+        id BIGSERIAL PRIMARY KEY,
+        feedback_id VARCHAR NOT NULL UNIQUE REFERENCES feedback (id) ON DELETE CASCADE,
+        document TSVECTOR NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_feedback_search_document ON feedback_search USING GIN (document)",
+    f"""CREATE OR REPLACE FUNCTION feedback_search_refresh(fid VARCHAR) RETURNS void AS $$
+        INSERT INTO feedback_search (feedback_id, document)
+        SELECT f.id,
+            setweight(to_tsvector('{PG_CONFIG}', coalesce(f.strengths, '')), 'A') ||
+            setweight(to_tsvector('{PG_CONFIG}', coalesce(f.improvements, '')), 'A') ||
+            setweight(to_tsvector('{PG_CONFIG}', coalesce(
+                (SELECT a.comment FROM acknowledgements a WHERE a.feedback_id = f.id LIMIT 1), '')), 'B')
+        FROM feedback f WHERE f.id = fid
+        ON CONFLICT (feedback_id) DO UPDATE SET document = excluded.document
+    $$ LANGUAGE sql""",
+    """CREATE OR REPLACE FUNCTION feedback_search_feedback_changed() RETURNS trigger AS $$
+    BEGIN
+        PERFORM feedback_search_refresh(NEW.id);
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql""",
+    """CREATE OR REPLACE FUNCTION feedback_search_ack_changed() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            PERFORM feedback_search_refresh(OLD.feedback_id);
+        ELSE
+            PERFORM feedback_search_refresh(NEW.feedback_id);
+        END IF;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS feedback_search_feedback ON feedback",
+    """CREATE TRIGGER feedback_search_feedback AFTER INSERT OR UPDATE OF strengths, improvements ON feedback
+    FOR EACH ROW EXECUTE FUNCTION feedback_search_feedback_changed()""",
+    "DROP TRIGGER IF EXISTS feedback_search_ack ON acknowledgements",
+    """CREATE TRIGGER feedback_search_ack AFTER INSERT OR UPDATE OF comment OR DELETE ON acknowledgements
+    FOR EACH ROW EXECUTE FUNCTION feedback_search_ack_changed()""",
+]
+
+POSTGRES_DROP_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS feedback_search_feedback ON feedback",
+    "DROP TRIGGER IF EXISTS feedback_search_ack ON acknowledgements",
+]
+
+POSTGRES_BACKFILL = [
+    "SELECT feedback_search_refresh(id) FROM feedback",
+]
+
+
+def install(conn: Connection, backfill: bool = True):
+    """Create the index, its triggers and (optionally) index every existing feedback row"""
+    sqlite = _is_sqlite(conn)
+    for statement in (SQLITE_DDL if sqlite else POSTGRES_DDL):
+        conn.exec_driver_sql(statement)
+    if backfill:
+        rebuild(conn)
+
+
+def drop_triggers(conn: Connection):
+    """Stop indexing writes, e.g. before a bulk load; install() puts the triggers back and re-indexes"""
+    for statement in (SQLITE_DROP_TRIGGERS if _is_sqlite(conn) else POSTGRES_DROP_TRIGGERS):
+        conn.exec_driver_sql(statement)
+
+
+def rebuild(conn: Connection):
+    """Re-index every feedback row (after restoring a dump with triggers disabled, for example)"""
+    for statement in (SQLITE_BACKFILL if _is_sqlite(conn) else POSTGRES_BACKFILL):
+        conn.exec_driver_sql(statement)
+
+
+# --- Queries ---
+
+def search_terms(q: str) -> list[str]:
+    """Words of a user query; a trailing * makes a word a prefix. Raises ValueError if there are none."""
+    terms = re.findall(r"\w+\*?", q or "")
+    if not terms:
+        raise ValueError("Search query must contain at least one word")
+    return terms
+
+
+def match_expression(q: str, manager_id: Optional[str] = None, employee_id: Optional[str] = None) -> str:
+    """FTS5 MATCH string: every word must appear in a text column, within the owners' scope"""
+    words = " ".join(f'"{t[:-1]}"*' if t.endswith("*") else f'"{t}"' for t in search_terms(q))
+    expression = f"{{{' '.join(TEXT_COLUMNS)}}} : ({words})"
+    for prefix, owner_id in (("m", manager_id), ("e", employee_id)):
+        if owner_id:
+            expression = f'scope : "{prefix}{owner_id.replace("-", "")}" AND {expression}'
+    return expression
+
+
+def _pg_query(q: str):
+    return func.websearch_to_tsquery(PG_CONFIG, q)
+
+
+def search_query(
+    db: Session,
+    q: str,
+    manager_id: Optional[str] = None,
+    employee_id: Optional[str] = None,
+    tag_id: Optional[int] = None,
+    sentiment: Optional[models.SentimentEnum] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = pagination.DEFAULT_PAGE_SIZE,
+):
+    """Rows of (feedback_id, rank, row_id), best first; lower rank is better. Fetches limit + 1 rows.
+
+    Raises ValueError for a query without words or a malformed cursor.
+    """
+    search_terms(q)
+    row_id = feedback_search.c.id
+    if _is_sqlite(db.get_bind()):
+        rank = func.bm25(literal_column("feedback_fts"), 1.0, 1.0, 1.0, 0.0, type_=Float)
+        stmt = (
+            select(feedback_search.c.feedback_id, rank.label("rank"), row_id.label("row_id"))
+            .select_from(feedback_fts)
+            .join(feedback_search, feedback_search.c.id == feedback_fts.c.rowid)
+            .where(literal_column("feedback_fts").op("MATCH")(match_expression(q, manager_id, employee_id)))
+        )
+    else:
+        rank = -func.ts_rank_cd(feedback_search.c.document, _pg_query(q), type_=Float)
+        stmt = (
+            select(feedback_search.c.feedback_id, rank.label("rank"), row_id.label("row_id"))
+            .where(feedback_search.c.document.op("@@")(_pg_query(q)))
+        )
+
+    filters = []
+    if manager_id is not None:
+        filters.append(models.Feedback.manager_id == manager_id)
+    if employee_id is not None:
+        filters.append(models.Feedback.employee_id == employee_id)
+    if sentiment is not None:
+        filters.append(models.Feedback.sentiment == sentiment)
+    if start is not None:
+        filters.append(models.Feedback.created_at >= start)
+    if end is not None:
+        filters.append(models.Feedback.created_at < end)
+    if tag_id is not None:
+        filters.append(models.Feedback.id.in_(
+            select(models.feedback_tags.c.feedback_id).where(models.feedback_tags.c.tag_id == tag_id)
+        ))
+    if filters:
+        stmt = stmt.join(models.Feedback, models.Feedback.id == stmt.selected_columns.feedback_id).where(*filters)
+    if cursor:
+        rank_value, last_row_id = pagination.decode_cursor(cursor)
+        stmt = stmt.where(tuple_(rank, row_id) > tuple_(rank_value, last_row_id))
+    return stmt.order_by(rank, row_id).limit(limit + 1)
+
+
+def highlights_query(db: Session, q: str, feedback_ids: list[str]):
+    """Rows of (feedback_id, strengths, improvements, comment) with matches between MARK_START and MARK_END"""
+    if _is_sqlite(db.get_bind()):
+        fts = literal_column("feedback_fts")
+        return (
+            select(
+                feedback_search.c.feedback_id,
+                *(
+                    func.snippet(fts, index, MARK_START, MARK_END, "…", SNIPPET_TOKENS).label(name)
+                    for index, name in enumerate(TEXT_COLUMNS)
+                ),
+            )
+            .select_from(feedback_fts)
+            .join(feedback_search, feedback_search.c.id == feedback_fts.c.rowid)
+            .where(fts.op("MATCH")(match_expression(q)), feedback_search.c.feedback_id.in_(feedback_ids))
+        )
+    options = f'StartSel="{MARK_START}", StopSel="{MARK_END}", MaxWords=35, MinWords=10, MaxFragments=2'
+    return (
+        select(
+            models.Feedback.id,
+            func.ts_headline(PG_CONFIG, models.Feedback.strengths, _pg_query(q), options).label("strengths"),
+            func.ts_headline(PG_CONFIG, models.Feedback.improvements, _pg_query(q), options).label("improvements"),
+            func.ts_headline(PG_CONFIG, models.Acknowledgement.comment, _pg_query(q), options).label("comment"),
+        )
+        .outerjoin(models.Acknowledgement, models.Acknowledgement.feedback_id == models.Feedback.id)
+        .where(models.Feedback.id.in_(feedback_ids))
+    )
+
+
+def page(rows: list, limit: int):
+    """Split fetched search_query rows into (rows for this page, next cursor)"""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, pagination.encode_cursor(rows[-1].rank, rows[-1].row_id)
+
+
+def _html(fragment: str) -> str:
+    return html.escape(fragment).replace(MARK_START, "<mark>").replace(MARK_END, "</mark>")
+
+
+def highlights(row) -> dict:
+    """HTML-escaped fragments with matches in <mark>, only for the fields that actually contain one"""
+    return {
+        name: _html(getattr(row, name))
+        for name in TEXT_COLUMNS
+        if getattr(row, name) and MARK_START in getattr(row, name)
+    }
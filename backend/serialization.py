@@ -0,0 +1,47 @@
+"""
+Fast JSON responses.
+
+FastJSONResponse is the app's default response class. It encodes with orjson
+when it is installed, which is several times faster than the standard
+library and handles datetimes and enums natively. Without orjson it falls
+back to json with the same output.
+
+Handlers that already hold JSON-ready data (for example the timeline dicts
+from crud.get_feedback_timeline_rows) return a FastJSONResponse directly,
+skipping FastAPI's response-model validation and jsonable_encoder pass.
+"""
+
+import enum
+import json
+from datetime import date, datetime
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+import instrumentation
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Compact UTF-8 JSON; naive datetimes as ISO 8601 like pydantic"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        with instrumentation.serializing():
+            return dumps(content)
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Manager dashboard statistics.
+
+Stats are computed with GROUP BY aggregates. When counters are enabled, the
+manager_stats table is updated by crud in the same transaction as each
+feedback write, so reading a manager's stats is a single primary-key lookup.
+
+Rebuild the counters from scratch with:
+
+    python stats.py rebuild [--manager MANAGER_ID]
+"""
+
+import argparse
+import os
+
+from sqlalchemy import case, delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+import models
+from database import dialect_insert
+
+USE_STATS_COUNTERS = os.getenv("USE_STATS_COUNTERS", "true").lower() not in ("0", "false", "no")
+
+SENTIMENT_COUNTERS = {
+    models.SentimentEnum.positive: models.ManagerStats.positive_count,
+    models.SentimentEnum.negative: models.ManagerStats.negative_count,
+    models.SentimentEnum.neutral: models.ManagerStats.neutral_count,
+}
+
+
+def _format_stats(feedback_count: int, acknowledged_count: int, sentiments: dict) -> dict:
+    return {
+        "feedback_count": feedback_count,
+        "acknowledged_count": acknowledged_count,
+        "pending_acknowledgment": feedback_count - acknowledged_count,
+        "acknowledgment_rate": round((acknowledged_count / feedback_count * 100) if feedback_count > 0 else 0, 1),
+        "sentiment_trends": {s.value: sentiments.get(s, 0) for s in models.SentimentEnum},
+    }
+
+
+def aggregate_counts_query(manager_id: str):
+    """Per-sentiment (sentiment, feedback_count, acknowledged_count) rows for a manager"""
+    return aggregate_counts_where(models.Feedback.manager_id == manager_id)
+
+
+def aggregate_counts_where(*criteria):
+    """aggregate_counts_query over the feedback matching `criteria`"""
+    return (
+        select(
+            models.Feedback.sentiment,
+            func.count(func.distinct(models.Feedback.id)),
+            func.count(func.distinct(models.Acknowledgement.feedback_id)),
+        )
+        .outerjoin(models.Acknowledgement, models.Acknowledgement.feedback_id == models.Feedback.id)
+        .where(*criteria)
+        .group_by(models.Feedback.sentiment)
+    )
+
+
+# --- Whole-org stats ---
+# A director's stats sum the counter rows of everyone below them; managers
+# without a counter row yet are aggregated directly.
+
+_COUNTER_COLUMNS = [
+    models.ManagerStats.feedback_count,
+    models.ManagerStats.acknowledged_count,
+    *SENTIMENT_COUNTERS.values(),
+]
+
+
+def subtree_counters_query(manager_id: str):
+    """One row of summed counters over the manager's subtree"""
+    return (
+        select(*(func.coalesce(func.sum(column), 0) for column in _COUNTER_COLUMNS))
+        .select_from(models.ManagerStats)
+        .join(models.OrgClosure, models.OrgClosure.descendant_id == models.ManagerStats.manager_id)
+        .where(models.OrgClosure.ancestor_id == manager_id)
+    )
+
+
+def uncounted_subtree_query(manager_id: str):
+    """aggregate_counts rows for managers in the subtree that have no counter row"""
+    uncounted = (
+        select(models.OrgClosure.descendant_id)
+        .join(models.User, models.User.id == models.OrgClosure.descendant_id)
+        .outerjoin(models.ManagerStats, models.ManagerStats.manager_id == models.OrgClosure.descendant_id)
+        .where(
+            models.OrgClosure.ancestor_id == manager_id,
+            models.User.role == models.RoleEnum.manager,
+            models.ManagerStats.manager_id.is_(None),
+        )
+    )
+    return aggregate_counts_where(models.Feedback.manager_id.in_(uncounted))
+
+
+def subtree_aggregate_query(manager_id: str):
+    """aggregate_counts rows for the whole subtree, without the counters"""
+    subtree = select(models.OrgClosure.descendant_id).where(models.OrgClosure.ancestor_id == manager_id)
+    return aggregate_counts_where(models.Feedback.manager_id.in_(subtree))
+
+
+def stats_from_subtree(counter_totals, uncounted_rows) -> dict:
+    """Combine a subtree_counters_query row with uncounted_subtree_query rows"""
+    feedback_count, acknowledged_count, sentiments = counts_from_rows(uncounted_rows)
+    totals = dict(zip([column.key for column in _COUNTER_COLUMNS], counter_totals))
+    for sentiment, column in SENTIMENT_COUNTERS.items():
+        sentiments[sentiment] = sentiments.get(sentiment, 0) + totals[column.key]
+    return _format_stats(
+        feedback_count + totals["feedback_count"],
+        acknowledged_count + totals["acknowledged_count"],
+        sentiments,
+    )
+
+
+def counts_from_rows(rows):
+    """Return (feedback_count, acknowledged_count, {sentiment: count}) from aggregate_counts_query rows"""
+    sentiments = {sentiment: count for sentiment, count, _ in rows if sentiment is not None}
+    feedback_count = sum(count for _, count, _ in rows)
+    acknowledged_count = sum(acked for _, _, acked in rows)
+    return feedback_count, acknowledged_count, sentiments
+
+
+def stats_from_rows(rows) -> dict:
+    return _format_stats(*counts_from_rows(rows))
+
+
+def stats_from_counters(counters: models.ManagerStats) -> dict:
+    sentiments = {
+        sentiment: getattr(counters, column.key)
+        for sentiment, column in SENTIMENT_COUNTERS.items()
+    }
+    return _format_stats(counters.feedback_count, counters.acknowledged_count, sentiments)
+
+
+def _aggregate_counts(db: Session, manager_id: str):
+    """Return (feedback_count, acknowledged_count, {sentiment: count}) using GROUP BY"""
+    return counts_from_rows(db.execute(aggregate_counts_query(manager_id)).all())
+
+
+def compute_manager_stats(db: Session, manager_id: str) -> dict:
+    """Compute dashboard stats directly from the feedback tables"""
+    return stats_from_rows(db.execute(aggregate_counts_query(manager_id)).all())
+
+
+def get_manager_dashboard_stats(db: Session, manager_id: str, include_subtree: bool = False) -> dict:
+    """Serve stats from the counter table, falling back to aggregates when no row exists yet.
+
+    `include_subtree` covers feedback given by the manager and everyone below them.
+    """
+    if include_subtree:
+        if not USE_STATS_COUNTERS:
+            return stats_from_rows(db.execute(subtree_aggregate_query(manager_id)).all())
+        return stats_from_subtree(
+            db.execute(subtree_counters_query(manager_id)).one(),
+            db.execute(uncounted_subtree_query(manager_id)).all(),
+        )
+    if USE_STATS_COUNTERS:
+        counters = db.get(models.ManagerStats, manager_id)
+        if counters is not None:
+            return stats_from_counters(counters)
+    return compute_manager_stats(db, manager_id)
+
+
+# --- Incremental counter maintenance ---
+# These run inside the caller's transaction; the caller commits.
+
+def _seed_counters(db: Session, manager_id: str) -> bool:
+    """Create a manager's counter row from the current (flushed) state of the feedback tables.
+
+    Returns False when another transaction created the row first; its seed
+    did not see this transaction's uncommitted changes.
+    """
+    db.flush()
+    feedback_count, acknowledged_count, sentiments = _aggregate_counts(db, manager_id)
+    values = {column.key: sentiments.get(sentiment, 0) for sentiment, column in SENTIMENT_COUNTERS.items()}
+    result = db.execute(
+        dialect_insert(db.get_bind(), models.ManagerStats.__table__)
+        .values(manager_id=manager_id, feedback_count=feedback_count, acknowledged_count=acknowledged_count, **values)
+        .on_conflict_do_nothing(index_elements=["manager_id"])
+    )
+    return result.rowcount == 1
+
+
+def _increment(db: Session, manager_id: str, deltas: dict):
+    update_counters = (
+        update(models.ManagerStats)
+        .where(models.ManagerStats.manager_id == manager_id)
+        .values({column: column + delta for column, delta in deltas.items()})
+        .execution_options(synchronize_session=False)
+    )
+    if db.execute(update_counters).rowcount == 0:
+        # No counters yet for this manager: seeding from the aggregates
+        # already includes the change being recorded. If a concurrent first
+        # write seeded the row meanwhile, apply the change to its row instead.
+        if not _seed_counters(db, manager_id):
+            db.execute(update_counters)
+
+
+def record_feedback_created(db: Session, manager_id: str, sentiment: models.SentimentEnum):
+    if not USE_STATS_COUNTERS:
+        return
+    _increment(db, manager_id, {
+        models.ManagerStats.feedback_count: 1,
+        SENTIMENT_COUNTERS[sentiment]: 1,
+    })
+
+
+def record_feedback_batch(db: Session, manager_id: str, sentiments: list):
+    if not USE_STATS_COUNTERS or not sentiments:
+        return
+    deltas = {models.ManagerStats.feedback_count: len(sentiments)}
+    for sentiment in sentiments:
+        column = SENTIMENT_COUNTERS[sentiment]
+        deltas[column] = deltas.get(column, 0) + 1
+    _increment(db, manager_id, deltas)
+
+
+def record_sentiment_changed(db: Session, manager_id: str, old: models.SentimentEnum, new: models.SentimentEnum):
+    if not USE_STATS_COUNTERS or old == new:
+        return
+    _increment(db, manager_id, {
+        SENTIMENT_COUNTERS[old]: -1,
+        SENTIMENT_COUNTERS[new]: 1,
+    })
+
+
+def record_acknowledged(db: Session, manager_id: str, count: int = 1):
+    """Record the first acknowledgement of `count` of the manager's feedback items"""
+    if not USE_STATS_COUNTERS:
+        return
+    _increment(db, manager_id, {models.ManagerStats.acknowledged_count: count})
+
+
+def rebuild_manager_stats(db: Session, manager_id: str = None) -> int:
+    """Recompute counters from scratch (for one manager, or all). Returns the number of rows written."""
+    acked = (
+        select(models.Acknowledgement.feedback_id)
+        .group_by(models.Acknowledgement.feedback_id)
+        .subquery()
+    )
+    query = (
+        select(
+            models.Feedback.manager_id,
+            func.count(models.Feedback.id),
+            func.count(acked.c.feedback_id),
+            *[
+                func.sum(case((models.Feedback.sentiment == sentiment, 1), else_=0))
+                for sentiment in SENTIMENT_COUNTERS
+            ],
+        )
+        .outerjoin(acked, acked.c.feedback_id == models.Feedback.id)
+        .where(models.Feedback.manager_id.is_not(None))
+        .group_by(models.Feedback.manager_id)
+    )
+    clear = delete(models.ManagerStats)
+    if manager_id is not None:
+        query = query.where(models.Feedback.manager_id == manager_id)
+        clear = clear.where(models.ManagerStats.manager_id == manager_id)
+
+    columns = [
+        models.ManagerStats.manager_id,
+        models.ManagerStats.feedback_count,
+        models.ManagerStats.acknowledged_count,
+        *SENTIMENT_COUNTERS.values(),
+    ]
+    db.execute(clear)
+    result = db.execute(insert(models.ManagerStats).from_select([c.key for c in columns], query))
+    db.commit()
+    return result.rowcount
+
+
+if __name__ == "__main__":
+    import migrations
+    from database import SessionLocal, engine
+
+    parser = argparse.ArgumentParser(description="Manager dashboard stats maintenance")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--manager", help="Only rebuild counters for this manager id")
+    args = parser.parse_args()
+
+    migrations.upgrade(engine)
+    db = SessionLocal()
+    try:
+        rows = rebuild_manager_stats(db, manager_id=args.manager)
+        print(f"Rebuilt manager stats ({rows} manager rows).")
+    finally:
+        db.close()
@@ -0,0 +1,172 @@
+"""
+Incremental sync: rows created, updated, acknowledged or closed since a watermark.
+
+Feedback is tracked by updated_at, acknowledgements by acknowledged_at and
+feedback requests by updated_at; rows are never deleted. Each entity is
+read in (changed-at, id) order from its own position, so the opaque
+watermark handed back to the client holds one position per entity.
+
+A write's timestamp is taken before its transaction commits, so a row can
+become visible with a timestamp slightly older than rows already synced.
+Positions therefore never move past SYNC_SETTLE_SECONDS ago: the most recent
+rows are sent again on the next call (clients upsert by id) rather than
+risking a missed one.
+"""
+
+import base64
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import Session, joinedload, selectinload
+
+import models, pagination, schemas
+
+SYNC_MAX_ROWS = int(os.getenv("SYNC_MAX_ROWS", "1000"))
+SYNC_SETTLE_SECONDS = float(os.getenv("SYNC_SETTLE_SECONDS", "2"))
+
+FEEDBACK = "feedback"
+ACKNOWLEDGEMENTS = "acknowledgements"
+FEEDBACK_REQUESTS = "feedback_requests"
+
+
+# --- Watermarks ---
+
+def _dump_position(sort_value, row_id):
+    if isinstance(sort_value, datetime):
+        return {"dt": sort_value.isoformat(), "id": row_id}
+    return {"s": sort_value, "id": row_id}
+
+
+def _load_position(position: dict):
+    if "dt" in position:
+        return datetime.fromisoformat(position["dt"]), position["id"]
+    return position["s"], position["id"]
+
+
+def encode_watermark(positions: dict) -> str:
+    payload = {
+        name: None if position is None else _dump_position(*position)
+        for name, position in positions.items()
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_watermark(watermark: Optional[str]) -> dict:
+    """Positions per entity; empty for a first sync. Raises ValueError for malformed watermarks."""
+    if not watermark:
+        return {}
+    try:
+        raw = base64.urlsafe_b64decode(watermark + "=" * (-len(watermark) % 4))
+        payload = json.loads(raw)
+        return {
+            name: None if position is None else _load_position(position)
+            for name, position in payload.items()
+        }
+    except (ValueError, KeyError, TypeError, AttributeError) as exc:
+        raise ValueError("Invalid watermark") from exc
+
+
+def settle_point(db: Session, now: Optional[datetime] = None):
+    """Newest changed-at value a position may advance to, in the form sort keys take on this database"""
+    point = (now or datetime.utcnow()) - timedelta(seconds=SYNC_SETTLE_SECONDS)
+    if db.get_bind().dialect.name == "sqlite":
+        return point.strftime("%Y-%m-%d %H:%M:%S.%f")
+    return point
+
+
+# --- Statement builders ---
+
+def _after(sort_key, id_column, position):
+    sort_value, row_id = position
+    if row_id is None:
+        return sort_key >= sort_value
+    return tuple_(sort_key, id_column) > tuple_(sort_value, row_id)
+
+
+def _changes(db: Session, model, column, owner_clause, position, *options):
+    sort_key = pagination.sort_key_column(db, column)
+    stmt = select(model, sort_key.label("sort_key")).where(owner_clause, column.is_not(None))
+    if options:
+        stmt = stmt.options(*options)
+    if position is not None:
+        stmt = stmt.where(_after(sort_key, model.id, position))
+    return stmt.order_by(sort_key, model.id).limit(SYNC_MAX_ROWS + 1)
+
+
+def _is_manager(user: schemas.UserOut) -> bool:
+    return user.role == schemas.RoleEnum.manager
+
+
+def feedback_changes_query(db: Session, user: schemas.UserOut, position):
+    owner = models.Feedback.manager_id if _is_manager(user) else models.Feedback.employee_id
+    return _changes(
+        db, models.Feedback, models.Feedback.updated_at, owner == user.id, position,
+        joinedload(models.Feedback.employee),
+        joinedload(models.Feedback.acknowledgment),
+        selectinload(models.Feedback.tags),
+    )
+
+
+def acknowledgement_changes_query(db: Session, user: schemas.UserOut, position):
+    if _is_manager(user):
+        owner = models.Acknowledgement.feedback_id.in_(
+            select(models.Feedback.id).where(models.Feedback.manager_id == user.id)
+        )
+    else:
+        owner = models.Acknowledgement.employee_id == user.id
+    return _changes(db, models.Acknowledgement, models.Acknowledgement.acknowledged_at, owner, position)
+
+
+def feedback_request_changes_query(db: Session, user: schemas.UserOut, position):
+    owner = models.FeedbackRequest.manager_id if _is_manager(user) else models.FeedbackRequest.employee_id
+    return _changes(
+        db, models.FeedbackRequest, models.FeedbackRequest.updated_at, owner == user.id, position,
+        joinedload(models.FeedbackRequest.employee),
+    )
+
+
+def entity_queries(db: Session, user: schemas.UserOut, positions: dict) -> dict:
+    return {
+        FEEDBACK: feedback_changes_query(db, user, positions.get(FEEDBACK)),
+        ACKNOWLEDGEMENTS: acknowledgement_changes_query(db, user, positions.get(ACKNOWLEDGEMENTS)),
+        FEEDBACK_REQUESTS: feedback_request_changes_query(db, user, positions.get(FEEDBACK_REQUESTS)),
+    }
+
+
+# --- Assembling a response ---
+
+def advance(rows: list, position, settle):
+    """Split fetched (entity, sort_key) rows into (entities, new position, has_more)"""
+    has_more = len(rows) > SYNC_MAX_ROWS
+    rows = rows[:SYNC_MAX_ROWS]
+    if rows:
+        last = rows[-1]
+        position = (last.sort_key, last[0].id)
+        if not has_more and position[0] >= settle:
+            position = (settle, None)
+    return [row[0] for row in rows], position, has_more
+
+
+def changes_response(entity_rows: dict, positions: dict, settle) -> dict:
+    """Build the /sync/changes body from the executed entity_queries"""
+    body, new_positions, has_more = {}, {}, False
+    for name, rows in entity_rows.items():
+        items, new_positions[name], more = advance(rows, positions.get(name), settle)
+        body[name] = items
+        has_more = has_more or more
+
+    return {
+        FEEDBACK: [schemas.FeedbackOut.model_validate(fb, from_attributes=True) for fb in body[FEEDBACK]],
+        ACKNOWLEDGEMENTS: [
+            schemas.AcknowledgementChange.model_validate(ack, from_attributes=True) for ack in body[ACKNOWLEDGEMENTS]
+        ],
+        FEEDBACK_REQUESTS: [
+            schemas.FeedbackRequestOut.model_validate(req, from_attributes=True) for req in body[FEEDBACK_REQUESTS]
+        ],
+        "watermark": encode_watermark(new_positions),
+        "has_more": has_more,
+    }
@@ -0,0 +1,60 @@
+"""
+Process-wide registry of tags.
+
+Tags almost never change, so each process keeps the full id -> name map in
+memory and only re-reads the table when the "tags" resource version moves.
+The version is checked at most every TAG_REGISTRY_CHECK_SECONDS (and
+immediately when an unknown tag id is asked for), so tags created in another
+worker show up within that interval.
+"""
+
+import os
+import threading
+import time
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import models, versions
+
+TAG_REGISTRY_CHECK_SECONDS = float(os.getenv("TAG_REGISTRY_CHECK_SECONDS", "30"))
+
+
+class TagRegistry:
+    def __init__(self, check_interval: float):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._tags = {}
+        self._version = None
+        self._checked_at = 0.0
+
+    def _refresh(self, db: Session, force: bool = False):
+        now = time.monotonic()
+        if not force and self._version is not None and now - self._checked_at < self.check_interval:
+            return
+        current = versions.get(db, versions.TAGS)
+        if current != self._version:
+            rows = db.execute(select(models.Tag.id, models.Tag.name).order_by(models.Tag.id)).all()
+            with self._lock:
+                self._tags = dict(rows)
+                self._version = current
+        self._checked_at = now
+
+    def all(self, db: Session) -> list[dict]:
+        self._refresh(db)
+        return [{"id": tag_id, "name": name} for tag_id, name in self._tags.items()]
+
+    def resolve(self, db: Session, tag_ids) -> dict:
+        """Map the known ids among `tag_ids` to their names; unknown ids are left out"""
+        self._refresh(db)
+        tag_ids = set(tag_ids)
+        if not tag_ids <= self._tags.keys():
+            self._refresh(db, force=True)
+        return {tag_id: self._tags[tag_id] for tag_id in tag_ids if tag_id in self._tags}
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+
+
+tag_registry = TagRegistry(TAG_REGISTRY_CHECK_SECONDS)
@@ -0,0 +1,68 @@
+"""
+Fixtures for the backend tests.
+
+The modules import each other by their flat names, so the backend directory
+goes on sys.path. Every test gets its own migrated SQLite database.
+
+    cd backend
+    python -m pytest tests
+"""
+
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# database reads DATABASE_URL when it is first imported; keep it off ./feedback.db
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='feedback_tests_'), 'unused.db')}")
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import migrations, models, schemas
+from cache import TTLCache
+import query_cache
+from tag_registry import tag_registry
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'feedback.db'}", connect_args={"check_same_thread": False})
+    migrations.upgrade(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine, autoflush=False)()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches():
+    """The process-wide caches outlive a test's database; start every test with empty ones"""
+    query_cache.set_backend(TTLCache(maxsize=query_cache.QUERY_CACHE_SIZE, ttl=query_cache.QUERY_CACHE_TTL))
+    tag_registry.invalidate()
+
+
+@pytest.fixture
+def make_user(db):
+    """Add a user under `manager_id` the way crud.create_user does, without hashing a password"""
+    import crud
+
+    def make(name: str, role: str = "employee", manager_id: str = None) -> models.User:
+        return crud.create_user(
+            db,
+            schemas.UserCreate(email=f"{name}@example.com", name=name, password="unused", role=role,
+                               manager_id=manager_id),
+            hashed_password="unused",
+        )
+
+    return make
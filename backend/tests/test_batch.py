@@ -0,0 +1,82 @@
+from sqlalchemy import func, select
+
+import crud, models, schemas, stats
+
+
+def feedback(employee_id: str, tag_ids=(), sentiment="positive") -> schemas.FeedbackCreate:
+    return schemas.FeedbackCreate(employee_id=employee_id, strengths="s", improvements="i", sentiment=sentiment,
+                                  tag_ids=list(tag_ids))
+
+
+def errors(results: list) -> dict:
+    return {r["index"]: r["error"] for r in results if not r["ok"]}
+
+
+def test_create_batch_reports_invalid_items_and_writes_the_rest(db, make_user):
+    manager = make_user("manager", "manager")
+    employee = make_user("employee", "employee", manager.id)
+    tag_id = crud.get_tags(db)[0]["id"]
+
+    results = crud.create_feedback_batch(db, [
+        feedback(employee.id, [tag_id]),
+        feedback("missing"),
+        feedback(manager.id),
+        feedback(employee.id, [tag_id, 9999]),
+        feedback(employee.id, sentiment="negative"),
+    ], manager.id)
+
+    assert [r["index"] for r in results] == [0, 1, 2, 3, 4]
+    assert errors(results) == {1: "Employee not found", 2: "Employee not found", 3: "Unknown tag ids: [9999]"}
+    written = {r["id"] for r in results if r["ok"]}
+    assert set(db.scalars(select(models.Feedback.id))) == written
+    assert db.scalar(select(func.count()).select_from(models.feedback_tags)) == 1
+    counters = stats.get_manager_dashboard_stats(db, manager.id)
+    assert counters == stats.compute_manager_stats(db, manager.id)
+    assert (counters["feedback_count"], counters["sentiment_trends"]["negative"]) == (2, 1)
+
+
+def test_acknowledge_batch_reports_invalid_items_and_writes_the_rest(db, make_user):
+    manager = make_user("manager", "manager")
+    employee = make_user("employee", "employee", manager.id)
+    colleague = make_user("colleague", "employee", manager.id)
+    own = [crud.create_feedback(db, feedback(employee.id), manager.id).id for _ in range(2)]
+    theirs = crud.create_feedback(db, feedback(colleague.id), manager.id).id
+    crud.acknowledge_feedback(db, own[1], employee.id, "first")
+
+    results = crud.acknowledge_feedback_batch(db, [
+        schemas.AcknowledgementBatchItem(feedback_id=own[0], comment="new"),
+        schemas.AcknowledgementBatchItem(feedback_id=theirs),
+        schemas.AcknowledgementBatchItem(feedback_id="missing"),
+        schemas.AcknowledgementBatchItem(feedback_id=own[0], comment="again"),
+        schemas.AcknowledgementBatchItem(feedback_id=own[1], comment="edited"),
+    ], employee.id)
+
+    assert errors(results) == {
+        1: "Not authorized to acknowledge this feedback",
+        2: "Not authorized to acknowledge this feedback",
+        3: "Duplicate feedback id in batch",
+    }
+    comments = dict(db.execute(select(models.Acknowledgement.feedback_id, models.Acknowledgement.comment)).all())
+    assert comments == {own[0]: "new", own[1]: "edited"}
+    # The re-acknowledged item is not counted twice
+    counters = stats.get_manager_dashboard_stats(db, manager.id)
+    assert counters == stats.compute_manager_stats(db, manager.id)
+    assert counters["acknowledged_count"] == 2
+
+
+def test_assign_batch_reports_invalid_items_and_assigns_the_rest(db, make_user):
+    # An employee above the target manager can't be moved below them
+    boss = make_user("boss", "employee")
+    manager = make_user("manager", "manager", boss.id)
+    lead = make_user("lead", "employee")
+    other_manager = make_user("other", "manager")
+    free = make_user("free", "employee")
+
+    results = crud.assign_employees_to_manager(db, [free.id, "missing", lead.id, boss.id, other_manager.id], manager.id)
+
+    assert errors(results) == {
+        1: "Employee not found",
+        3: "Employee manages this manager",
+        4: "User is not an employee",
+    }
+    assert {user.id for user in crud.get_team_members(db, manager.id)} == {free.id, lead.id}
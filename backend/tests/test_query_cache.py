@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+import crud, query_cache
+from cache import _MISSING, LocalClient, SharedBackend, TaggedCache, TTLCache
+
+TAGS = [query_cache.team("m1"), query_cache.AVAILABLE]
+
+
+@pytest.fixture(params=["local", "shared"])
+def backend(request):
+    if request.param == "local":
+        return TTLCache(maxsize=100, ttl=30)
+    return SharedBackend(LocalClient())
+
+
+def test_entry_served_until_a_tag_is_invalidated(backend):
+    cache = TaggedCache(backend, ttl=30)
+    cache.set("team_members:m1", cache.tokens(TAGS), ["e1"])
+    assert cache.get("team_members:m1", TAGS) == ["e1"]
+
+    cache.invalidate(query_cache.team("m2"))
+    assert cache.get("team_members:m1", TAGS) == ["e1"]
+
+    cache.invalidate(query_cache.AVAILABLE)
+    assert cache.get("team_members:m1", TAGS, _MISSING) is _MISSING
+
+
+def test_invalidation_seen_by_another_worker():
+    client = LocalClient()
+    worker_a = TaggedCache(SharedBackend(client), ttl=30)
+    worker_b = TaggedCache(SharedBackend(client), ttl=30)
+    worker_a.set("team_members:m1", worker_a.tokens(TAGS), ["e1"])
+    assert worker_b.get("team_members:m1", TAGS) == ["e1"]
+
+    worker_b.invalidate(query_cache.team("m1"))
+    assert worker_a.get("team_members:m1", TAGS, _MISSING) is _MISSING
+
+
+def test_evicted_token_costs_only_a_miss():
+    cache = TaggedCache(TTLCache(maxsize=100, ttl=30), ttl=30)
+    cache.set("team_members:m1", cache.tokens(TAGS), ["e1"])
+    cache.backend.delete("tag:" + query_cache.AVAILABLE)
+    assert cache.get("team_members:m1", TAGS, _MISSING) is _MISSING
+
+
+def test_invalidation_during_a_load_is_not_masked(backend):
+    query_cache.set_backend(backend)
+    loads = []
+
+    async def load():
+        loads.append(1)
+        if len(loads) == 1:
+            # A write commits and invalidates while the first load's rows are in flight
+            query_cache.invalidate(query_cache.AVAILABLE)
+            return ["stale"]
+        return ["fresh"]
+
+    async def run():
+        assert await query_cache.get_or_load("available_employees", [query_cache.AVAILABLE], load) == ["stale"]
+        assert await query_cache.get_or_load("available_employees", [query_cache.AVAILABLE], load) == ["fresh"]
+        assert await query_cache.get_or_load("available_employees", [query_cache.AVAILABLE], load) == ["fresh"]
+
+    asyncio.run(run())
+    assert len(loads) == 2
+
+
+def test_team_changes_invalidate_the_listings(db, make_user):
+    old_manager = make_user("old", "manager")
+    new_manager = make_user("new", "manager")
+    employee = make_user("employee", "employee", old_manager.id)
+
+    def team(manager_id):
+        async def load():
+            return [user.id for user in crud.get_team_members(db, manager_id)]
+        return asyncio.run(query_cache.get_or_load(f"team_members:{manager_id}", [query_cache.team(manager_id)], load))
+
+    def available():
+        async def load():
+            return [user.id for user in crud.get_available_employees(db)]
+        return asyncio.run(query_cache.get_or_load("available_employees", [query_cache.AVAILABLE], load))
+
+    assert team(old_manager.id) == [employee.id]
+    assert team(new_manager.id) == []
+    assert available() == []
+
+    crud.assign_employees_to_manager(db, [employee.id], new_manager.id)
+    assert team(old_manager.id) == []
+    assert team(new_manager.id) == [employee.id]
+
+    unassigned = make_user("unassigned", "employee")
+    assert available() == [unassigned.id]
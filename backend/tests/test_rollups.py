@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+
+import crud, models, rollups, schemas
+
+COUNTER_KEYS = [column.key for column in rollups.COUNTERS]
+
+
+def rollup_rows(db) -> dict:
+    """Non-empty buckets; a bucket emptied by a move keeps a row of zeros that a rebuild doesn't write"""
+    r = models.FeedbackRollup
+    rows = {}
+    for row in db.execute(select(r)).scalars():
+        counters = tuple(getattr(row, key) for key in COUNTER_KEYS)
+        if any(counters):
+            rows[(row.manager_id, row.grain, row.tag_id, row.bucket_start, row.employee_id, row.sentiment)] = counters
+    return rows
+
+
+def assert_matches_rebuild(db):
+    incremental = rollup_rows(db)
+    rollups.rebuild(db)
+    assert incremental == rollup_rows(db)
+
+
+def give_feedback(db, manager, employee, sentiment="positive", tag_ids=(), created_at=None) -> str:
+    feedback_id = crud.create_feedback(
+        db, schemas.FeedbackCreate(employee_id=employee.id, strengths="s", improvements="i", sentiment=sentiment,
+                                   tag_ids=list(tag_ids)),
+        manager.id,
+    ).id
+    if created_at is not None:
+        # Backdate the item and move its counts to the matching buckets, as if it had been given then
+        db.execute(update(models.Feedback).where(models.Feedback.id == feedback_id).values(created_at=created_at))
+        db.commit()
+        rollups.rebuild(db)
+    return feedback_id
+
+
+def test_sentiment_change_moves_the_item(db, make_user):
+    manager = make_user("manager", "manager")
+    employee = make_user("employee", "employee", manager.id)
+    tags = [tag["id"] for tag in crud.get_tags(db)[:2]]
+    moved = give_feedback(db, manager, employee, "positive", tags)
+    give_feedback(db, manager, employee, "positive", tags[:1])
+
+    crud.update_feedback(db, moved, schemas.FeedbackUpdate(sentiment="negative"))
+    assert_matches_rebuild(db)
+
+    day = rollups.bucket_start(rollups.DAY, datetime.utcnow())
+    per_sentiment = {
+        row.sentiment.value: row.feedback_count
+        for row in db.execute(rollups.trends_query(rollups.DAY, day, day, manager_id=manager.id))
+    }
+    assert per_sentiment == {"positive": 1, "negative": 1}
+
+
+def test_sentiment_change_moves_the_acknowledgement(db, make_user):
+    manager = make_user("manager", "manager")
+    employee = make_user("employee", "employee", manager.id)
+    feedback_id = give_feedback(db, manager, employee, "neutral", created_at=datetime.utcnow() - timedelta(days=3))
+    crud.acknowledge_feedback(db, feedback_id, employee.id, "thanks")
+    assert_matches_rebuild(db)
+
+    crud.update_feedback(db, feedback_id, schemas.FeedbackUpdate(sentiment="positive"))
+    assert_matches_rebuild(db)
+    crud.update_feedback(db, feedback_id, schemas.FeedbackUpdate(sentiment="negative"))
+    assert_matches_rebuild(db)
+
+    negative = [key for key in rollup_rows(db) if key[5] == models.SentimentEnum.negative]
+    assert {grain for _, grain, *_ in negative} == set(rollups.GRAINS)
+
+
+def test_unchanged_sentiment_leaves_the_buckets(db, make_user):
+    manager = make_user("manager", "manager")
+    employee = make_user("employee", "employee", manager.id)
+    feedback_id = give_feedback(db, manager, employee, "positive")
+    before = rollup_rows(db)
+
+    crud.update_feedback(db, feedback_id, schemas.FeedbackUpdate(strengths="edited", sentiment="positive"))
+    assert rollup_rows(db) == before
@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+import crud, models, schemas, sync
+
+
+def changes(db, user: models.User, watermark=None, now=None) -> dict:
+    """What GET /sync/changes answers, on a sync session and at `now`"""
+    user = schemas.UserOut.model_validate(user, from_attributes=True)
+    positions = sync.decode_watermark(watermark)
+    settle = sync.settle_point(db, now)
+    entity_rows = {name: db.execute(stmt).all() for name, stmt in sync.entity_queries(db, user, positions).items()}
+    return sync.changes_response(entity_rows, positions, settle)
+
+
+def give_feedback(db, manager, employee, updated_at: datetime) -> str:
+    feedback = crud.create_feedback(
+        db, schemas.FeedbackCreate(employee_id=employee.id, strengths="s", improvements="i", sentiment="positive"),
+        manager.id,
+    )
+    db.execute(update(models.Feedback).where(models.Feedback.id == feedback.id).values(updated_at=updated_at))
+    db.commit()
+    return feedback.id
+
+
+def feedback_ids(response: dict) -> list:
+    return [feedback.id for feedback in response[sync.FEEDBACK]]
+
+
+def test_watermark_round_trip():
+    positions = {
+        sync.FEEDBACK: (datetime(2024, 5, 1, 12, 30, 15, 250000), "f1"),
+        sync.ACKNOWLEDGEMENTS: ("2024-05-01 12:30:15.250000", None),
+        sync.FEEDBACK_REQUESTS: None,
+    }
+    assert sync.decode_watermark(sync.encode_watermark(positions)) == positions
+    assert sync.decode_watermark(None) == {}
+
+
+@pytest.mark.parametrize("watermark", ["not a watermark", "W10", "eyJmZWVkYmFjayI6eyJpZCI6MX19"])
+def test_malformed_watermark(watermark):
+    with pytest.raises(ValueError):
+        sync.decode_watermark(watermark)
+
+
+def test_positions_stop_at_the_settle_point(db, make_user):
+    manager = make_user("manager", "manager")
+    employee = make_user("employee", "employee", manager.id)
+    now = datetime.utcnow()
+    old = give_feedback(db, manager, employee, now - timedelta(minutes=5))
+    recent = give_feedback(db, manager, employee, now)
+
+    first = changes(db, manager, now=now)
+    assert feedback_ids(first) == [old, recent]
+
+    # The recent row is inside the settle window, so it is sent again, as is a row
+    # that committed late with a timestamp older than one already sent
+    late = give_feedback(db, manager, employee, now - timedelta(seconds=sync.SYNC_SETTLE_SECONDS / 2))
+    second = changes(db, manager, first["watermark"], now=now)
+    assert feedback_ids(second) == [late, recent]
+
+    # Once the window has passed the position moves past them
+    later = now + timedelta(seconds=sync.SYNC_SETTLE_SECONDS * 2)
+    third = changes(db, manager, second["watermark"], now=later)
+    assert feedback_ids(third) == [late, recent]
+    assert feedback_ids(changes(db, manager, third["watermark"], now=later)) == []
+
+
+def test_changes_are_scoped_to_the_user(db, make_user):
+    manager = make_user("manager", "manager")
+    other = make_user("other", "manager")
+    employee = make_user("employee", "employee", manager.id)
+    now = datetime.utcnow() - timedelta(minutes=1)
+    given = give_feedback(db, manager, employee, now)
+
+    assert feedback_ids(changes(db, employee)) == [given]
+    assert feedback_ids(changes(db, other)) == []
+
+
+def test_has_more_pages_through_everything(db, make_user, monkeypatch):
+    monkeypatch.setattr(sync, "SYNC_MAX_ROWS", 2)
+    manager = make_user("manager", "manager")
+    employee = make_user("employee", "employee", manager.id)
+    start = datetime.utcnow() - timedelta(hours=1)
+    given = [give_feedback(db, manager, employee, start + timedelta(seconds=n)) for n in range(5)]
+
+    seen, watermark = [], None
+    while True:
+        response = changes(db, manager, watermark)
+        seen += feedback_ids(response)
+        watermark = response["watermark"]
+        if not response["has_more"]:
+            break
+    assert seen == given
@@ -0,0 +1,80 @@
+"""
+Resource version counters.
+
+A version is bumped in the same transaction as the write that changes the
+resource, so any process can tell whether something it cached is stale by
+reading one primary-key row. The counters also back the HTTP validators in
+http_cache.py: the version is the ETag and updated_at is Last-Modified.
+
+Keys:
+
+    tags                 the tag list
+    manager:<id>         feedback given by a manager (timeline, stats)
+    employee:<id>        feedback received by an employee, and their team membership
+    team:<manager id>    who is on a manager's team
+
+The key helpers return None for a missing id, and bump() skips None.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+import models
+from database import dialect_insert
+
+TAGS = "tags"
+
+
+def manager(manager_id: str) -> str:
+    return f"manager:{manager_id}" if manager_id else None
+
+
+def employee(employee_id: str) -> str:
+    return f"employee:{employee_id}" if employee_id else None
+
+
+def team(manager_id: str) -> str:
+    return f"team:{manager_id}" if manager_id else None
+
+
+def feedback_keys(manager_id: str, employee_id: str) -> tuple:
+    """Keys to bump when a feedback item (or its acknowledgement) changes"""
+    return manager(manager_id), employee(employee_id)
+
+
+def bump(db: Session, *keys: str):
+    """Increment the given versions; the caller commits"""
+    keys = sorted({key for key in keys if key})
+    if not keys:
+        return
+    now = datetime.utcnow()
+    db.execute(
+        dialect_insert(db.get_bind(), models.ResourceVersion.__table__)
+        .values([{"key": key, "version": 0, "updated_at": now} for key in keys])
+        .on_conflict_do_nothing(index_elements=["key"])
+    )
+    db.execute(
+        update(models.ResourceVersion)
+        .where(models.ResourceVersion.key.in_(keys))
+        .values(version=models.ResourceVersion.version + 1, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def versions_query(*keys: str):
+    return (
+        select(models.ResourceVersion.key, models.ResourceVersion.version, models.ResourceVersion.updated_at)
+        .where(models.ResourceVersion.key.in_(keys))
+    )
+
+
+def get(db: Session, key: str) -> int:
+    version = db.scalar(select(models.ResourceVersion.version).where(models.ResourceVersion.key == key))
+    return version or 0
+
+
+def get_many(db: Session, *keys: str) -> dict:
+    found = {row.key: row.version for row in db.execute(versions_query(*keys))}
+    return {key: found.get(key, 0) for key in keys}
@@ -0,0 +1,49 @@
+// Writes .br and .gz copies of the text assets in dist/ after `vite build`.
+// The backend serves them to clients that accept them (see backend/compression.py),
+// so bundles are compressed once, at the highest level, instead of on every request.
+import { readdir, readFile, stat, writeFile } from 'node:fs/promises';
+import { join, extname } from 'node:path';
+import { brotliCompressSync, gzipSync, constants } from 'node:zlib';
+
+const DIST = new URL('../dist/', import.meta.url).pathname;
+const EXTENSIONS = new Set(['.html', '.js', '.mjs', '.css', '.svg', '.json', '.txt', '.xml', '.map', '.webmanifest']);
+// Below this, headers outweigh the savings
+const MIN_BYTES = 1024;
+
+async function* files(dir) {
+  for (const entry of await readdir(dir, { withFileTypes: true })) {
+    const path = join(dir, entry.name);
+    if (entry.isDirectory()) {
+      yield* files(path);
+    } else if (EXTENSIONS.has(extname(entry.name))) {
+      yield path;
+    }
+  }
+}
+
+const encoders = {
+  '.br': data => brotliCompressSync(data, {
+    params: {
+      [constants.BROTLI_PARAM_QUALITY]: constants.BROTLI_MAX_QUALITY,
+      [constants.BROTLI_PARAM_SIZE_HINT]: data.length,
+    },
+  }),
+  '.gz': data => gzipSync(data, { level: constants.Z_BEST_COMPRESSION }),
+};
+
+let original = 0;
+let written = 0;
+for await (const path of files(DIST)) {
+  if ((await stat(path)).size < MIN_BYTES) continue;
+  const data = await readFile(path);
+  for (const [suffix, encode] of Object.entries(encoders)) {
+    const compressed = encode(data);
+    // A copy that is not smaller would only cost a Content-Encoding header
+    if (compressed.length < data.length) {
+      await writeFile(path + suffix, compressed);
+      written += 1;
+    }
+  }
+  original += data.length;
+}
+console.log(`precompress: wrote ${written} files for ${(original / 1024).toFixed(1)} KiB of assets in dist/`);
@@ -1,6 +1,6 @@
-import React, { useEffect, useState, useCallback } from 'react';
+import React, { useEffect, useState, useCallback, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { getFeedbackForEmployee, acknowledgeFeedback, requestFeedback, exportFeedbackToPdf } from '../utils/api';
+import { getFeedbackForEmployee, acknowledgeFeedback, requestFeedback, exportFeedbackToPdf, getTags, subscribeToEvents, feedbackFromEvent, upsertById } from '../utils/api';
 import ReactMarkdown from 'react-markdown';
 import Header from '../components/Header';
 
@@ -13,6 +13,8 @@ const EmployeeDashboard = ({ user, setUser }) => {
   const [requestMessage, setRequestMessage] = useState('');
   const [requestStatus, setRequestStatus] = useState('');
   const [activeTab, setActiveTab] = useState('feedback');
+  // Tag names for live feedback events, which carry only tag ids
+  const tagsRef = useRef([]);
   
   const navigate = useNavigate();
 
@@ -42,6 +44,29 @@ const EmployeeDashboard = ({ user, setUser }) => {
     }
   }, [user?.id]);
 
+  // Apply live deltas instead of reloading the timeline
+  useEffect(() => {
+    if (!user || !user.id) return;
+    getTags().then(tags => { tagsRef.current = tags; }).catch(error => console.error('Failed to fetch tags', error));
+    return subscribeToEvents({
+      'feedback.created': (payload) => {
+        setTimeline(prev => upsertById(prev, feedbackFromEvent(payload, tagsRef.current, prev.find(fb => fb.id === payload.id))));
+      },
+      'feedback.updated': (payload) => {
+        setTimeline(prev => prev.map(fb => (fb.id === payload.id ? feedbackFromEvent(payload, tagsRef.current, fb) : fb)));
+      },
+      'feedback.acknowledged': (payload) => {
+        setTimeline(prev => prev.map(fb => (
+          fb.id === payload.feedback_id
+            ? { ...fb, acknowledgment: { acknowledged: true, comment: payload.comment, acknowledged_at: payload.acknowledged_at } }
+            : fb
+        )));
+      },
+      // Too much was missed to replay
+      reset: () => fetchTimeline(),
+    });
+  }, [user?.id]);
+
   const acknowledge = async (id, comment) => {
     setAcknowledging(prev => ({ ...prev, [id]: true }));
     try {
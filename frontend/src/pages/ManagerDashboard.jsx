@@ -1,4 +1,4 @@
-import React, { useEffect, useState, useCallback } from 'react';
+import React, { useEffect, useState, useCallback, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { 
   getTeamMembers, 
@@ -16,7 +16,10 @@ import {
   createTag, 
   exportFeedbackToPdf, 
   approveRequest, 
-  denyRequest 
+  denyRequest,
+  subscribeToEvents,
+  feedbackFromEvent,
+  upsertById
 } from '../utils/api';
 import ReactMarkdown from 'react-markdown';
 import Header from '../components/Header';
@@ -45,6 +48,12 @@ const ManagerDashboard = ({ user, setUser }) => {
   
   const [activeTab, setActiveTab] = useState('feedback');
   
+  // Read by the event handlers, which are registered once per stream
+  const teamRef = useRef(team);
+  teamRef.current = team;
+  const tagsRef = useRef(tags);
+  tagsRef.current = tags;
+  
   const navigate = useNavigate();
 
   const handleLogout = () => {
@@ -92,6 +101,51 @@ const ManagerDashboard = ({ user, setUser }) => {
     }
   }, [user?.id]);
 
+  const refreshDashboard = useCallback(() => {
+    if (!user || !user.id) return;
+    getManagerDashboard(user.id).then(setDashboard).catch(error => console.error('Error refreshing dashboard:', error));
+  }, [user?.id]);
+
+  // Apply other users' changes as live deltas instead of reloading the lists
+  useEffect(() => {
+    if (!user || !user.id) return;
+    const employeeOf = (employeeId) => teamRef.current.find(member => member.id === employeeId);
+    return subscribeToEvents({
+      'feedback.created': (payload) => {
+        setFeedbacks(prev => upsertById(prev, feedbackFromEvent(payload, tagsRef.current, {
+          employee: employeeOf(payload.employee_id),
+          ...prev.find(fb => fb.id === payload.id),
+        })));
+        refreshDashboard();
+      },
+      'feedback.updated': (payload) => {
+        setFeedbacks(prev => prev.map(fb => (fb.id === payload.id ? feedbackFromEvent(payload, tagsRef.current, fb) : fb)));
+        refreshDashboard();
+      },
+      'feedback.acknowledged': (payload) => {
+        setFeedbacks(prev => prev.map(fb => (
+          fb.id === payload.feedback_id
+            ? { ...fb, acknowledgment: { acknowledged: true, comment: payload.comment, acknowledged_at: payload.acknowledged_at } }
+            : fb
+        )));
+        refreshDashboard();
+      },
+      'feedback_request.created': (payload) => {
+        const employee = employeeOf(payload.employee_id);
+        if (employee) {
+          setFeedbackRequests(prev => upsertById(prev, { ...payload, employee }));
+        } else {
+          getFeedbackRequests().then(setFeedbackRequests).catch(error => console.error('Error fetching requests:', error));
+        }
+      },
+      'feedback_request.closed': (payload) => {
+        setFeedbackRequests(prev => prev.filter(req => req.id !== payload.id));
+      },
+      // Too much was missed to replay
+      reset: () => fetchData(),
+    });
+  }, [user?.id, fetchData, refreshDashboard]);
+
   const handleRefreshAvailable = async () => {
     await fetchData(); 
     alert("Refreshed all dashboard data.");
@@ -114,12 +168,17 @@ const ManagerDashboard = ({ user, setUser }) => {
         tag_ids: selectedTags,
       };
       
-      await submitFeedback(feedbackData, form.request_id);
+      const created = await submitFeedback(feedbackData, form.request_id);
+      // Shown straight away, whether or not the event stream is connected
+      setFeedbacks(prev => upsertById(prev, created));
+      if (form.request_id) {
+        setFeedbackRequests(prev => prev.filter(req => req.id !== form.request_id));
+      }
+      refreshDashboard();
 
       alert('Feedback submitted successfully!');
       setForm({ employee_id: '', strengths: '', improvements: '', sentiment: 'positive', request_id: null });
       setSelectedTags([]);
-      fetchData(); // Refresh all dashboard data
     } catch (error) {
       console.error("Submission Error:", error);
       alert(error.message || 'Failed to submit feedback. Please try again.');
@@ -161,11 +220,12 @@ const ManagerDashboard = ({ user, setUser }) => {
     setUpdating(true);
     
     try {
-      await updateFeedback(editingFeedback, editForm, user.id);
+      const updated = await updateFeedback(editingFeedback, editForm, user.id);
+      setFeedbacks(prev => upsertById(prev, updated));
+      refreshDashboard();
       alert('Feedback updated successfully!');
       setEditingFeedback(null);
       setEditForm({ strengths: '', improvements: '', sentiment: 'positive' });
-      fetchData(); // Refresh data
     } catch (error) {
       console.error('Error updating feedback:', error);
       alert('Failed to update feedback. Please try again.');
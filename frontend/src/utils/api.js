@@ -104,6 +104,82 @@ export const denyRequest = (requestId) => api.post(`/feedback-requests/${request
 export const getTags = () => api.get('/tags/');
 export const createTag = (tagData) => api.post('/tags/', tagData);
 
+// --- Live updates ---
+// Short-lived ticket that opens the event stream. EventSource cannot send the
+// Authorization header, and a ticket in the URL is harmless once it expires.
+export const getStreamTicket = () => api.post('/events/ticket');
+
+// Opens the server-sent event stream. `handlers` maps event types
+// ('feedback.created', 'feedback.updated', 'feedback.acknowledged',
+// 'feedback_request.created', 'feedback_request.closed', 'reset') to callbacks
+// receiving the parsed payload. The browser reconnects and resumes on its own;
+// once the ticket has expired and the stream is refused, a new ticket is fetched
+// and the stream resumes after the last event seen. Events may be delivered
+// twice across reconnects, so handlers should upsert by id.
+// Returns a function that closes the stream.
+export const subscribeToEvents = (handlers) => {
+  let source = null;
+  let lastEventId = null;
+  let retry = null;
+  let closed = false;
+
+  const reopen = () => {
+    if (!closed) retry = setTimeout(open, 3000);
+  };
+
+  const open = async () => {
+    let ticket;
+    try {
+      ({ ticket } = await getStreamTicket());
+    } catch (error) {
+      reopen();
+      return;
+    }
+    if (closed) return;
+    const params = new URLSearchParams({ ticket });
+    if (lastEventId) params.set('last_event_id', lastEventId);
+    source = new EventSource(`${API_URL}/events/stream?${params}`);
+    Object.entries(handlers).forEach(([type, handler]) => {
+      source.addEventListener(type, (event) => {
+        if (event.lastEventId) lastEventId = event.lastEventId;
+        handler(JSON.parse(event.data));
+      });
+    });
+    source.onerror = () => {
+      if (source.readyState === EventSource.CLOSED) {
+        source = null;
+        reopen();
+      }
+    };
+  };
+
+  open();
+  return () => {
+    closed = true;
+    clearTimeout(retry);
+    if (source) source.close();
+  };
+};
+
+// Feedback event payload in the shape of the feedback lists' items, keeping
+// what the event does not carry (employee, acknowledgment) from `previous`.
+export const feedbackFromEvent = (payload, tags, previous = {}) => {
+  const { tag_ids, ...fields } = payload;
+  return {
+    acknowledgment: null,
+    ...previous,
+    ...fields,
+    tags: tags.filter(tag => tag_ids.includes(tag.id)),
+  };
+};
+
+// Inserts `item` at the top of `items`, or replaces the item with the same id.
+export const upsertById = (items, item) => (
+  items.some(existing => existing.id === item.id)
+    ? items.map(existing => (existing.id === item.id ? item : existing))
+    : [item, ...items]
+);
+
 // --- Misc ---
 export const addComment = (feedbackId, comment) => api.post(`/feedback/${feedbackId}/comments/`, { comment });
 